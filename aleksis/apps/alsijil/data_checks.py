@@ -1,12 +1,44 @@
 import logging
-
-from django.db.models import F
+from datetime import datetime
+from hashlib import sha256
+from typing import Iterable, Optional, Set, Type
+from uuid import uuid4
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, Max, Model, OuterRef
 from django.db.models.query_utils import Q
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
+from reversion.models import Version
+
 from aleksis.core.data_checks import DataCheck, IgnoreSolveOption, SolveOption
 
 
+def _get_unrevisioned_changes_key(model: Type[Model]) -> str:
+    return f"alsijil_unrevisioned_changes_{model._meta.label_lower}"
+
+
+def get_unrevisioned_changes(model: Type[Model]) -> Optional[str]:
+    """Get a token which changes with every change of a model outside of revisions."""
+    return cache.get(_get_unrevisioned_changes_key(model))
+
+
+def register_unrevisioned_changes(model: Type[Model], using: Optional[str] = None):
+    """Record that objects of a model have been changed without a revision.
+
+    Incremental data checks can only find changed objects through their revisions,
+    so they check all objects again after such changes (e. g. bulk writes).
+    The change is recorded after the commit, so checks can't miss uncommitted data.
+    """
+    transaction.on_commit(
+        lambda: cache.set(_get_unrevisioned_changes_key(model), uuid4().hex, None), using=using
+    )
+
+
 class DeleteRelatedObjectSolveOption(SolveOption):
     name = "delete"
     verbose_name = _("Delete object")
@@ -23,8 +55,13 @@ class SetGroupsWithCurrentGroupsSolveOption(SolveOption):
 
     @classmethod
     def solve(cls, check_result: "DataCheckResult"):
-        person = check_result.related_object.person
-        check_result.related_object.groups_of_person.set(person.member_of.all())
+        from .models import GroupMembershipSnapshot
+
+        note = check_result.related_object
+        note.groups_of_person_snapshot = GroupMembershipSnapshot.objects.get_for_groups(
+            note.person.member_of.all()
+        )
+        note.save()
         check_result.delete()
 
 
@@ -82,14 +119,153 @@ class NoGroupsOfPersonsSetInPersonalNotesDataCheck(DataCheck):
     def check_data(cls):
         from .models import PersonalNote
 
-        personal_notes = PersonalNote.objects.filter(groups_of_person__isnull=True)
+        personal_notes = PersonalNote.objects.filter(groups_of_person_snapshot__groups__isnull=True)
 
         for note in personal_notes:
             logging.info(f"Check personal note {note}")
             cls.register_result(note)
 
 
-class LessonDocumentationOnHolidaysDataCheck(DataCheck):
+class RegisterObjectOnHolidaysDataCheck(DataCheck):
+    """Base class for checks for filled out register data on holidays.
+
+    The affected objects are found with one ``EXISTS`` subquery against the holidays
+    using the stored date ranges of the objects and their results are registered in bulk.
+
+    If run incrementally, only objects which have been created or changed in a revision
+    since the last run are checked again. Every change of the holidays, changes of the
+    objects outside of revisions (cf. ``register_unrevisioned_changes``) and a missing
+    state of the last run lead to a full run.
+    """
+
+    model_name = None
+
+    @classmethod
+    def get_model(cls):
+        return apps.get_model("alsijil", cls.model_name)
+
+    @classmethod
+    def get_state_key(cls) -> str:
+        return f"alsijil_data_check_state_{cls.name}"
+
+    @classmethod
+    def get_holidays_fingerprint(cls) -> str:
+        """Get a fingerprint of all holidays to detect changes since the last run."""
+        from aleksis.apps.chronos.models import Holiday
+
+        holidays = Holiday.objects.order_by("pk").values_list("pk", "date_start", "date_end")
+        return sha256(repr(list(holidays)).encode()).hexdigest()
+
+    @classmethod
+    def get_changed_pks(cls, since: datetime) -> Set[int]:
+        """Get the primary keys of all objects which have been changed in a revision."""
+        object_ids = (
+            Version.objects.get_for_model(cls.get_model())
+            .filter(revision__date_created__gte=since)
+            .values_list("object_id", flat=True)
+            .distinct()
+        )
+        return {int(object_id) for object_id in object_ids}
+
+    @classmethod
+    def register_results(cls, pks: Iterable[int]):
+        """Register the objects with the given primary keys with as few queries as possible."""
+        from aleksis.core.models import DataCheckResult
+
+        ct = ContentType.objects.get_for_model(cls.get_model())
+        object_ids = {str(pk) for pk in pks}
+        results = DataCheckResult.objects.filter(check=cls.name, content_type=ct)
+
+        existing_ids = set(
+            results.filter(object_id__in=object_ids).values_list("object_id", flat=True)
+        )
+        DataCheckResult.objects.bulk_create(
+            [
+                DataCheckResult(check=cls.name, content_type=ct, object_id=object_id)
+                for object_id in object_ids - existing_ids
+            ]
+        )
+
+        # Track all existing problems (for deleting old results)
+        cls._current_results = cls._current_results + list(
+            results.filter(object_id__in=object_ids).only("pk")
+        )
+
+    @classmethod
+    def keep_results(cls, exclude_pks: Set[int]):
+        """Keep the existing results of all objects not checked again.
+
+        Results of deleted objects are not kept, so they are deleted with the old results.
+        """
+        from aleksis.core.models import DataCheckResult
+
+        results = DataCheckResult.objects.filter(check=cls.name).exclude(
+            object_id__in={str(pk) for pk in exclude_pks}
+        )
+        object_ids = {int(object_id) for object_id in results.values_list("object_id", flat=True)}
+        existing_ids = (
+            cls.get_model().objects.filter(pk__in=object_ids).values_list("pk", flat=True)
+        )
+        results = results.filter(object_id__in={str(pk) for pk in existing_ids})
+        cls._current_results = cls._current_results + list(results.only("pk"))
+
+    @classmethod
+    def check_data(cls, incremental: bool = False):
+        from aleksis.apps.chronos.models import Holiday
+
+        now = timezone.now()
+        state = cache.get(cls.get_state_key()) if incremental else None
+        holidays_fingerprint = cls.get_holidays_fingerprint()
+        unrevisioned_changes = get_unrevisioned_changes(cls.get_model())
+        max_pk = cls.get_model().objects.aggregate(max_pk=Max("pk"))["max_pk"] or 0
+
+        objects = (
+            cls.get_model()
+            .objects.not_empty()
+            .select_related(None)
+            .prefetch_related(None)
+            .order_by()
+            .filter(
+                Exists(
+                    Holiday.objects.filter(
+                        date_start__lte=OuterRef("date_end"), date_end__gte=OuterRef("date_start")
+                    )
+                )
+            )
+        )
+
+        if (
+            state
+            and state["holidays"] == holidays_fingerprint
+            and state.get("unrevisioned_changes") == unrevisioned_changes
+        ):
+            changed_pks = cls.get_changed_pks(state["time"])
+            objects = objects.filter(Q(pk__gt=state["max_pk"]) | Q(pk__in=changed_pks))
+            # Objects created since the last run can't have any results yet
+            cls.keep_results(changed_pks)
+
+        pks = list(objects.values_list("pk", flat=True))
+        logging.info(f"Found {len(pks)} {cls.model_name} objects on holidays")
+        cls.register_results(pks)
+
+        cache.set(
+            cls.get_state_key(),
+            {
+                "time": now,
+                "max_pk": max_pk,
+                "holidays": holidays_fingerprint,
+                "unrevisioned_changes": unrevisioned_changes,
+            },
+            None,
+        )
+
+    @classmethod
+    def run_check_data(cls, incremental: bool = False):
+        cls.check_data(incremental=incremental)
+        cls.delete_old_results()
+
+
+class LessonDocumentationOnHolidaysDataCheck(RegisterObjectOnHolidaysDataCheck):
     """Checks for lesson documentation objects on holidays.
 
     This ignores empty lesson documentation as they are created by default.
@@ -102,28 +278,10 @@ class LessonDocumentationOnHolidaysDataCheck(DataCheck):
         DeleteRelatedObjectSolveOption.name: DeleteRelatedObjectSolveOption,
         IgnoreSolveOption.name: IgnoreSolveOption,
     }
+    model_name = "LessonDocumentation"
 
-    @classmethod
-    def check_data(cls):
-        from aleksis.apps.chronos.models import Holiday
-
-        from .models import LessonDocumentation
-
-        holidays = Holiday.objects.all()
-
-        documentations = LessonDocumentation.objects.not_empty().annotate_date_range()
-
-        q = Q()
-        for holiday in holidays:
-            q = q | Q(day_end__gte=holiday.date_start, day_start__lte=holiday.date_end)
-        documentations = documentations.filter(q)
 
-        for doc in documentations:
-            logging.info(f"Lesson documentation {doc} is on holidays")
-            cls.register_result(doc)
-
-
-class PersonalNoteOnHolidaysDataCheck(DataCheck):
+class PersonalNoteOnHolidaysDataCheck(RegisterObjectOnHolidaysDataCheck):
     """Checks for personal note objects on holidays.
 
     This ignores empty personal notes as they are created by default.
@@ -136,25 +294,7 @@ class PersonalNoteOnHolidaysDataCheck(DataCheck):
         DeleteRelatedObjectSolveOption.name: DeleteRelatedObjectSolveOption,
         IgnoreSolveOption.name: IgnoreSolveOption,
     }
-
-    @classmethod
-    def check_data(cls):
-        from aleksis.apps.chronos.models import Holiday
-
-        from .models import PersonalNote
-
-        holidays = Holiday.objects.all()
-
-        personal_notes = PersonalNote.objects.not_empty().annotate_date_range()
-
-        q = Q()
-        for holiday in holidays:
-            q = q | Q(day_end__gte=holiday.date_start, day_start__lte=holiday.date_end)
-        personal_notes = personal_notes.filter(q)
-
-        for note in personal_notes:
-            logging.info(f"Personal note {note} is on holidays")
-            cls.register_result(note)
+    model_name = "PersonalNote"
 
 
 class ExcusesWithoutAbsences(DataCheck):
@@ -29,11 +29,13 @@ from .actions import (
 from .models import (
     ExcuseType,
     ExtraMark,
+    GroupMembershipSnapshot,
     GroupRole,
     GroupRoleAssignment,
     LessonDocumentation,
     PersonalNote,
 )
+from .util.registries import get_all_excuse_types, get_all_extra_marks
 
 
 class LessonDocumentationForm(forms.ModelForm):
@@ -53,6 +55,7 @@ class PersonalNoteForm(forms.ModelForm):
         fields = ["absent", "late", "excused", "excuse_type", "extra_marks", "remarks"]
 
     person_name = forms.CharField(disabled=True)
+    person_pk = forms.IntegerField(disabled=True, widget=forms.HiddenInput())
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -61,8 +64,27 @@ class PersonalNoteForm(forms.ModelForm):
         )
         self.fields["person_name"].widget = forms.HiddenInput()
 
+        # Avoid querying the choices for every form of a formset
+        self.fields["excuse_type"].choices = [("", self.fields["excuse_type"].empty_label)] + [
+            (excuse_type.pk, str(excuse_type)) for excuse_type in get_all_excuse_types()
+        ]
+        self.fields["extra_marks"].choices = [
+            (extra_mark.pk, str(extra_mark)) for extra_mark in get_all_extra_marks()
+        ]
+
         if self.instance and getattr(self.instance, "person", None):
             self.fields["person_name"].initial = str(self.instance.person)
+            self.fields["person_pk"].initial = self.instance.person_id
+
+    def is_empty(self) -> bool:
+        """Check whether the personal note contains default values only.
+
+        This uses the same conditions as ``PersonalNoteQuerySet.not_empty``.
+        """
+        note = self.instance
+        return not (
+            note.absent or note.late or note.remarks or self.cleaned_data.get("extra_marks")
+        )
 
 
 class SelectForm(forms.Form):
@@ -131,8 +153,80 @@ class SelectForm(forms.Form):
         self.fields["teacher"].queryset = teacher_qs
 
 
+class BasePersonalNoteFormSet(forms.BaseModelFormSet):
+    """Formset for the personal notes of a register object.
+
+    The formset is backed by a list of personal notes which can contain unsaved
+    personal notes with default values (cf. ``get_personal_notes_sparse``).
+    The forms are matched to the personal notes by their person, so unsaved personal notes
+    are only written to the database if any data have been entered for them.
+    """
+
+    def __init__(self, *args, personal_notes: Sequence[PersonalNote] = (), **kwargs):
+        self.personal_notes = list(personal_notes)
+        self.personal_notes_by_person = {note.person_id: note for note in self.personal_notes}
+        kwargs.setdefault("queryset", PersonalNote.objects.none())
+        super().__init__(*args, **kwargs)
+
+    def get_queryset(self) -> Sequence[PersonalNote]:
+        return self.personal_notes
+
+    def _construct_form(self, i, **kwargs):
+        if i < self.initial_form_count():
+            if self.is_bound:
+                person_pk = self.data.get(f"{self.add_prefix(i)}-person_pk")
+                try:
+                    person_pk = int(person_pk)
+                except (TypeError, ValueError):
+                    person_pk = None
+                # Use an unsaved personal note without person if the person isn't part of
+                # the register object anymore, it will be ignored when saving
+                kwargs["instance"] = self.personal_notes_by_person.get(person_pk, PersonalNote())
+            else:
+                kwargs["instance"] = self.personal_notes[i]
+
+        # Skip the handling of primary keys by model formsets,
+        # unsaved personal notes have no primary key
+        return forms.BaseFormSet._construct_form(self, i, **kwargs)
+
+    def add_fields(self, form, index):
+        # The forms are matched by the person, so no field for the primary key is needed
+        forms.BaseFormSet.add_fields(self, form, index)
+
+    def save_existing_objects(self, commit: bool = True) -> Sequence[PersonalNote]:
+        self.changed_objects = []
+        self.deleted_objects = []
+        saved_instances = []
+
+        changed_forms = []
+        for form in self.initial_forms:
+            note = form.instance
+            if not note.person_id or not form.has_changed():
+                continue
+            if note.pk is None and form.is_empty():
+                continue
+            changed_forms.append(form)
+
+        # Get the group membership snapshots of all new personal notes at once
+        new_notes = [form.instance for form in changed_forms if form.instance.pk is None]
+        snapshots = GroupMembershipSnapshot.objects.get_for_persons(
+            {note.person_id for note in new_notes}
+        )
+        for note in new_notes:
+            note.groups_of_person_snapshot = snapshots[note.person_id]
+
+        for form in changed_forms:
+            note = form.instance
+            self.changed_objects.append((note, form.changed_data))
+            saved_instances.append(self.save_existing(form, note, commit=commit))
+            if not commit:
+                self.saved_forms.append(form)
+
+        return saved_instances
+
+
 PersonalNoteFormSet = forms.modelformset_factory(
-    PersonalNote, form=PersonalNoteForm, max_num=0, extra=0
+    PersonalNote, form=PersonalNoteForm, formset=BasePersonalNoteFormSet, max_num=0, extra=0
 )
 
 
@@ -163,6 +257,9 @@ class RegisterAbsenceForm(forms.Form):
         self.fields["to_period"].choices = period_choices
         self.fields["from_period"].initial = TimePeriod.period_min
         self.fields["to_period"].initial = TimePeriod.period_max
+        self.fields["excuse_type"].choices = [("", self.fields["excuse_type"].empty_label)] + [
+            (excuse_type.pk, str(excuse_type)) for excuse_type in get_all_excuse_types()
+        ]
 
 
 class ExtraMarkForm(forms.ModelForm):
@@ -185,10 +282,7 @@ class PersonOverviewForm(ActionForm):
     def get_actions(self):
         return (
             [mark_as_excused, mark_as_unexcused]
-            + [
-                mark_as_excuse_type_generator(excuse_type)
-                for excuse_type in ExcuseType.objects.all()
-            ]
+            + [mark_as_excuse_type_generator(excuse_type) for excuse_type in get_all_excuse_types()]
             + [delete_personal_note]
         )
 
@@ -316,7 +410,7 @@ class FilterRegisterObjectForm(forms.Form):
         for_person: bool = True,
         default_documentation: Optional[bool] = None,
         groups: Optional[Sequence[Group]] = None,
-        **kwargs
+        **kwargs,
     ):
         self.request = request
         person = self.request.user.person
@@ -348,3 +442,61 @@ class RegisterObjectActionForm(ListActionForm):
     """Action form for managing register objects for use with ``RegisterObjectTable``."""
 
     actions = [send_request_to_check_entry]
+
+
+class FullRegistersExportForm(forms.Form):
+    """Form for selecting the groups of a school term to generate the full registers for."""
+
+    layout = Layout(Row("school_term"), Row("groups"))
+    school_term = forms.ModelChoiceField(
+        queryset=SchoolTerm.objects.all(),
+        label=_("School term"),
+        initial=lambda: SchoolTerm.current,
+    )
+    groups = forms.ModelMultipleChoiceField(
+        label=_("Groups"),
+        queryset=Group.objects.filter(school_term__isnull=False),
+        help_text=_("Leave empty to generate the full registers of all groups of the school term."),
+        required=False,
+        widget=ModelSelect2MultipleWidget(
+            model=Group,
+            search_fields=["name__icontains", "short_name__icontains"],
+            attrs={"data-minimum-input-length": 0, "class": "browser-default"},
+        ),
+    )
+
+    def clean(self):
+        data = super().clean()
+        school_term = data.get("school_term")
+        if school_term and data.get("groups"):
+            if any(group.school_term != school_term for group in data["groups"]):
+                raise ValidationError(_("All groups have to be in the selected school term."))
+        return data
+
+
+class MissingDocumentationsFilterForm(forms.Form):
+    """Form for selecting the date range of the missing lesson documentations report."""
+
+    layout = Layout(Row("school_term", "date_start", "date_end"))
+    school_term = forms.ModelChoiceField(
+        queryset=SchoolTerm.objects.all(),
+        label=_("School term"),
+        initial=lambda: SchoolTerm.current,
+    )
+    date_start = forms.DateField(
+        label=_("Start date"),
+        required=False,
+        help_text=_("Leave empty to start at the beginning of the school term."),
+    )
+    date_end = forms.DateField(
+        label=_("End date"),
+        required=False,
+        help_text=_("Leave empty to end today or at the end of the school term."),
+    )
+
+    def clean(self):
+        data = super().clean()
+        if data.get("date_start") and data.get("date_end"):
+            if data["date_start"] > data["date_end"]:
+                raise ValidationError(_("The start date must be before the end date."))
+        return data
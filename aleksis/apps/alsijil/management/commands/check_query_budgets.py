@@ -0,0 +1,76 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from cachalot.api import cachalot_disabled
+
+from aleksis.core.models import SchoolTerm
+
+from ...util.query_budget import get_view_budgets, record_view_queries
+from ...util.synthetic_data import SCALES, get_grown_scale, get_school_term_dates
+
+
+class Command(BaseCommand):
+    help = "Check that the number of queries of the class register views does not grow with the data"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale", choices=SCALES.keys(), default="small", help="Size of the smaller school"
+        )
+        parser.add_argument(
+            "--factor", type=int, default=2, help="Factor of the data sizes of the larger school"
+        )
+        parser.add_argument(
+            "--date-start",
+            type=date.fromisoformat,
+            help="Start date of the synthetic school terms (YYYY-MM-DD)",
+        )
+
+    def handle(self, *args, **options):
+        small_scale = SCALES[options["scale"]]
+        large_scale = get_grown_scale(small_scale, options["factor"])
+
+        date_start, date_end = get_school_term_dates(large_scale, options["date_start"])
+        if SchoolTerm.objects.filter(date_start__lte=date_end, date_end__gte=date_start).exists():
+            raise CommandError(
+                f"There is already a school term between {date_start} and {date_end}, "
+                "please select another start date."
+            )
+
+        budgets = get_view_budgets()
+
+        setup_test_environment()
+        try:
+            # Count the real queries instead of hits of the query cache
+            with cachalot_disabled():
+                small_recorders, small_size = record_view_queries(small_scale, date_start, budgets)
+                large_recorders, large_size = record_view_queries(large_scale, date_start, budgets)
+        except RuntimeError as e:
+            raise CommandError(str(e)) from e
+        finally:
+            teardown_test_environment()
+
+        failures = 0
+        for url_name, budget in budgets.items():
+            small, large = small_recorders[url_name], large_recorders[url_name]
+            if small is None:
+                self.stdout.write(f"{url_name}: skipped (no URL for synthetic data)")
+                continue
+
+            status = (
+                f"{url_name}: {len(small)} -> {len(large)} queries "
+                f"(budget {budget.get_limit(large_size)})"
+            )
+            violation = budget.get_violation(len(small), small_size, len(large), large_size)
+            if violation:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"{status}: {violation}"))
+                self.stdout.write(
+                    large.get_report(compare_to=small if violation != "over budget" else None)
+                )
+            else:
+                self.stdout.write(self.style.SUCCESS(status))
+
+        if failures:
+            raise CommandError(f"{failures} views exceeded their query budgets.")
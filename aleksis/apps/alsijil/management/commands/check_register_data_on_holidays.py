@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ...data_checks import LessonDocumentationOnHolidaysDataCheck, PersonalNoteOnHolidaysDataCheck
+
+
+class Command(BaseCommand):
+    help = "Check for filled out lesson documentations and personal notes on holidays"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only check objects which have been created or changed since the last run",
+        )
+
+    def handle(self, *args, **options):
+        for check in (LessonDocumentationOnHolidaysDataCheck, PersonalNoteOnHolidaysDataCheck):
+            check.run_check_data(incremental=options["incremental"])
+            self.stdout.write(f"Ran check: {check.verbose_name}")
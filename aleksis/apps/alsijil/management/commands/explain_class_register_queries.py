@@ -0,0 +1,80 @@
+import re
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from calendarweek import CalendarWeek
+
+from ...models import LessonDocumentation, PersonalNote
+
+INDEX_NAMES = (
+    "personal_note_lesson_week",
+    "personal_note_person_week",
+    "personal_note_absent",
+    "personal_note_late",
+    "personal_note_remarks",
+    # Lookups of lesson documentations by lesson and week use the index of this constraint
+    "unique_documentation_per_object",
+    "documentation_with_topic",
+)
+
+
+class Command(BaseCommand):
+    help = "Show the query plans and timings of frequent class register queries"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Execute the queries to get real timings (EXPLAIN ANALYZE)",
+        )
+        parser.add_argument(
+            "--verbose-plans", action="store_true", help="Print the full query plans"
+        )
+
+    def get_queries(self):
+        """Get representative querysets for the access patterns of the class register."""
+        note = PersonalNote.objects.filter(lesson_period__isnull=False).order_by("-pk").first()
+        if not note:
+            raise CommandError("There are no personal notes to build the queries from.")
+
+        week = CalendarWeek(year=note.year, week=note.week)
+        notes = PersonalNote.objects.select_related(None).prefetch_related(None).order_by()
+        documentations = (
+            LessonDocumentation.objects.select_related(None).prefetch_related(None).order_by()
+        )
+
+        return {
+            "Personal notes of a lesson in a week": notes.filter(
+                lesson_period=note.lesson_period_id, year=week.year, week=week.week
+            ),
+            "Personal notes of a person in a week": notes.filter(
+                person=note.person_id, year=week.year, week=week.week
+            ),
+            "Unexcused absences of a person": notes.filter(
+                person=note.person_id, absent=True, excused=False
+            ),
+            "Tardinesses of a person": notes.filter(person=note.person_id, late__gt=0),
+            "Remarks of a person": notes.filter(~Q(remarks=""), person=note.person_id),
+            "Documentation of a lesson in a week": documentations.filter(
+                lesson_period=note.lesson_period_id, year=week.year, week=week.week
+            ),
+            "Documented lessons in a week": documentations.filter(
+                ~Q(topic=""), lesson_period=note.lesson_period_id, year=week.year, week=week.week
+            ),
+        }
+
+    def handle(self, *args, **options):
+        for title, qs in self.get_queries().items():
+            start = perf_counter()
+            plan = qs.explain(analyze=options["analyze"])
+            duration = (perf_counter() - start) * 1000
+
+            used_indexes = [name for name in INDEX_NAMES if re.search(rf"\b{name}\b", plan)]
+            self.stdout.write(
+                f"{title}: {duration:.2f} ms, indexes: {', '.join(used_indexes) or '-'}"
+            )
+            if options["verbose_plans"]:
+                self.stdout.write(plan)
+                self.stdout.write("")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ...models import PersonalNote
+
+
+class Command(BaseCommand):
+    help = "Delete all personal notes which contain default values only"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of personal notes to delete in one transaction",
+        )
+
+    def handle(self, *args, **options):
+        count = PersonalNote.objects.delete_empty(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} empty personal notes."))
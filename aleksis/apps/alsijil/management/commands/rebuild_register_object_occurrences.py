@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from aleksis.core.models import SchoolTerm
+
+from ...util.occurrences import rebuild_occurrences
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized occurrences of lessons, extra lessons and events"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--school-term",
+            type=int,
+            help="Only rebuild the occurrences of the school term with this ID",
+        )
+
+    def handle(self, *args, **options):
+        school_term = None
+        if options["school_term"]:
+            try:
+                school_term = SchoolTerm.objects.get(pk=options["school_term"])
+            except SchoolTerm.DoesNotExist:
+                raise CommandError(f"There is no school term with ID {options['school_term']}.")
+
+        count = rebuild_occurrences(school_term)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} occurrences."))
@@ -0,0 +1,54 @@
+from dataclasses import fields, replace
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from aleksis.core.models import SchoolTerm
+
+from ...util.synthetic_data import SCALES, get_school_term_dates, seed_school
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic school with class register data for benchmarks"  # noqa
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale", choices=SCALES.keys(), default="small", help="Size of the school"
+        )
+        parser.add_argument(
+            "--date-start",
+            type=date.fromisoformat,
+            help="Start date of the school term (YYYY-MM-DD)",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed for the random data")
+        for field in fields(SCALES["small"]):
+            parser.add_argument(
+                f"--{field.name.replace('_', '-')}",
+                type=int,
+                help=f"Override the number of {field.name.replace('_', ' ')} of the scale",
+            )
+
+    def handle(self, *args, **options):
+        scale = replace(
+            SCALES[options["scale"]],
+            **{
+                field.name: options[field.name]
+                for field in fields(SCALES["small"])
+                if options[field.name] is not None
+            },
+        )
+
+        date_start, date_end = get_school_term_dates(scale, options["date_start"])
+        if SchoolTerm.objects.filter(date_start__lte=date_end, date_end__gte=date_start).exists():
+            raise CommandError(
+                f"There is already a school term between {date_start} and {date_end}, "
+                "please select another start date."
+            )
+
+        school = seed_school(scale, date_start, options["seed"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded school term {school.school_term.pk} with {len(school.classes)} classes, "
+                f"{len(school.students)} students and {len(school.lesson_periods)} lessons."
+            )
+        )
@@ -1,15 +1,30 @@
 from datetime import date, datetime
-from typing import Optional, Sequence, Union
-
-from django.db.models import Case, ExpressionWrapper, F, Func, QuerySet, Value, When
+from typing import Dict, FrozenSet, Iterable, Optional, Sequence, Union
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Exists,
+    Expression,
+    ExpressionWrapper,
+    F,
+    Func,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Value,
+    When,
+)
 from django.db.models.fields import DateField
 from django.db.models.functions import Concat
 from django.db.models.query import Prefetch
 from django.db.models.query_utils import Q
 from django.utils.translation import gettext as _
 
+import reversion
 from calendarweek import CalendarWeek
 
+from aleksis.apps.alsijil.data_checks import register_unrevisioned_changes
 from aleksis.apps.chronos.managers import DateRangeQuerySetMixin
 from aleksis.core.managers import CurrentSiteManagerWithoutMigrations
 
@@ -17,7 +32,7 @@ from aleksis.core.managers import CurrentSiteManagerWithoutMigrations
 class RegisterObjectRelatedQuerySet(QuerySet):
     """Common queryset for personal notes and lesson documentations with shared API."""
 
-    def _get_weekday_to_date(self, weekday_name, year_name="year", week_name="week"):
+    def _get_weekday_to_date(self, weekday: Expression, year_name="year", week_name="week"):
         """Get a ORM function which converts a weekday, a week and a year to a date."""
         return ExpressionWrapper(
             Func(
@@ -26,7 +41,7 @@ class RegisterObjectRelatedQuerySet(QuerySet):
                 output_field=DateField(),
                 function="TO_DATE",
             )
-            + F(weekday_name),
+            + weekday,
             output_field=DateField(),
         )
 
@@ -38,20 +53,7 @@ class RegisterObjectRelatedQuerySet(QuerySet):
         .. note::
             For events, this will annotate ``None``.
         """
-        return self.annotate(
-            day=Case(
-                When(
-                    lesson_period__isnull=False,
-                    then=self._get_weekday_to_date("lesson_period__period__weekday"),
-                ),
-                When(
-                    extra_lesson__isnull=False,
-                    then=self._get_weekday_to_date(
-                        "extra_lesson__period__weekday", "extra_lesson__year", "extra_lesson__week"
-                    ),
-                ),
-            )
-        )
+        return self.annotate(day=Case(When(event__isnull=True, then="date_start")))
 
     def annotate_date_range(self) -> QuerySet:
         """Annotate every personal note/lesson documentation with the real date.
@@ -62,15 +64,67 @@ class RegisterObjectRelatedQuerySet(QuerySet):
             For lesson periods and extra lessons,
             this will annotate the same date for start and end day.
         """
-        return self.annotate_day().annotate(
-            day_start=Case(
-                When(day__isnull=False, then="day"),
-                When(day__isnull=True, then="event__date_start"),
+        return self.annotate(day_start=F("date_start"), day_end=F("date_end"))
+
+    def update_date_range(self, created: bool = False) -> int:
+        """Update the stored dates of all objects from their register objects in one query.
+
+        Objects which have just been created (``created``) are not recorded as changed
+        outside of revisions, as incremental data checks find them by their primary keys.
+        """
+        from aleksis.apps.chronos.models import Event, ExtraLesson, LessonPeriod
+
+        lesson_period_weekday = Subquery(
+            LessonPeriod.objects.filter(pk=OuterRef("lesson_period")).values("period__weekday")[:1]
+        )
+        extra_lesson_day = Subquery(
+            ExtraLesson.objects.filter(pk=OuterRef("extra_lesson")).annotate_day().values("day")[:1]
+        )
+        events = Event.objects.filter(pk=OuterRef("event"))
+
+        lesson_period_day = self._get_weekday_to_date(lesson_period_weekday)
+        updates = {
+            "date_start": Case(
+                When(lesson_period__isnull=False, then=lesson_period_day),
+                When(extra_lesson__isnull=False, then=extra_lesson_day),
+                When(event__isnull=False, then=Subquery(events.values("date_start")[:1])),
             ),
-            day_end=Case(
-                When(day__isnull=False, then="day"), When(day__isnull=True, then="event__date_end"),
+            "date_end": Case(
+                When(lesson_period__isnull=False, then=lesson_period_day),
+                When(extra_lesson__isnull=False, then=extra_lesson_day),
+                When(event__isnull=False, then=Subquery(events.values("date_end")[:1])),
             ),
-        )
+        }
+        if created and not reversion.is_active():
+            return QuerySet.update(self, **updates)
+        return self.update(**updates)
+
+    def update(self, **kwargs) -> int:
+        """Update objects and add them to the active revision.
+
+        Outside of revisions, the change is recorded for incremental data checks instead.
+        """
+        if not reversion.is_active():
+            rows = super().update(**kwargs)
+            register_unrevisioned_changes(self.model, using=self.db)
+            return rows
+
+        with transaction.atomic(using=self.db):
+            pks = list(self.prefetch_related(None).values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+
+            # Updates don't trigger the signals of django-reversion
+            for obj in self.model.objects.filter(pk__in=pks):
+                reversion.add_to_revision(obj)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Create objects in bulk and fill their stored dates."""
+        objs = super().bulk_create(objs, *args, **kwargs)
+        pks = [obj.pk for obj in objs if obj.pk]
+        if pks:
+            self.model.objects.filter(pk__in=pks).update_date_range(created=True)
+        return objs
 
     def annotate_subject(self) -> QuerySet:
         """Annotate lesson documentations with the subjects."""
@@ -83,6 +137,84 @@ class RegisterObjectRelatedQuerySet(QuerySet):
         )
 
 
+class GroupMembershipSnapshotManager(CurrentSiteManagerWithoutMigrations):
+    pass
+
+
+class GroupMembershipSnapshotQuerySet(QuerySet):
+    def get_for_group_sets(
+        self, group_sets: Iterable[Iterable[int]]
+    ) -> Dict[FrozenSet[int], Optional["GroupMembershipSnapshot"]]:
+        """Get or create the snapshots for multiple sets of group IDs.
+
+        This needs one query if all snapshots exist and four queries at most.
+        Empty sets are mapped to ``None``.
+        """
+        group_sets = {frozenset(group_set) for group_set in group_sets}
+        group_sets_by_hash = {
+            self.model.get_hash(group_set): group_set for group_set in group_sets if group_set
+        }
+
+        snapshots = {
+            snapshot.groups_hash: snapshot
+            for snapshot in self.filter(groups_hash__in=group_sets_by_hash.keys())
+        }
+        missing_hashes = group_sets_by_hash.keys() - snapshots.keys()
+        if missing_hashes:
+            through_model = self.model.groups.through
+            with transaction.atomic(using=self.db):
+                # Snapshots could have been created concurrently, so conflicts are ignored
+                self.bulk_create(
+                    [self.model(groups_hash=groups_hash) for groups_hash in missing_hashes],
+                    ignore_conflicts=True,
+                )
+                created_snapshots = list(self.filter(groups_hash__in=missing_hashes))
+                through_model.objects.bulk_create(
+                    [
+                        through_model(groupmembershipsnapshot_id=snapshot.pk, group_id=group_pk)
+                        for snapshot in created_snapshots
+                        for group_pk in group_sets_by_hash[snapshot.groups_hash]
+                    ],
+                    ignore_conflicts=True,
+                )
+            snapshots.update({snapshot.groups_hash: snapshot for snapshot in created_snapshots})
+
+        result = {
+            group_set: snapshots[groups_hash]
+            for groups_hash, group_set in group_sets_by_hash.items()
+        }
+        if frozenset() in group_sets:
+            result[frozenset()] = None
+        return result
+
+    def get_for_groups(self, groups: Iterable) -> Optional["GroupMembershipSnapshot"]:
+        """Get or create the snapshot for a set of groups (or their IDs)."""
+        if isinstance(groups, QuerySet):
+            group_pks = frozenset(groups.values_list("pk", flat=True))
+        else:
+            group_pks = frozenset(getattr(group, "pk", group) for group in groups)
+        return self.get_for_group_sets([group_pks])[group_pks]
+
+    def get_for_persons(
+        self, person_pks: Iterable[int]
+    ) -> Dict[int, Optional["GroupMembershipSnapshot"]]:
+        """Get or create the snapshots of the current groups of multiple persons."""
+        from aleksis.core.models import Group
+
+        group_sets = {person_pk: set() for person_pk in person_pks}
+        memberships = Group.members.through.objects.filter(
+            person_id__in=group_sets.keys()
+        ).values_list("person_id", "group_id")
+        for person_pk, group_pk in memberships:
+            group_sets[person_pk].add(group_pk)
+
+        snapshots = self.get_for_group_sets(group_sets.values())
+        return {
+            person_pk: snapshots[frozenset(group_set)]
+            for person_pk, group_set in group_sets.items()
+        }
+
+
 class PersonalNoteManager(CurrentSiteManagerWithoutMigrations):
     """Manager adding specific methods to personal notes."""
 
@@ -109,12 +241,113 @@ class PersonalNoteManager(CurrentSiteManagerWithoutMigrations):
 
 
 class PersonalNoteQuerySet(RegisterObjectRelatedQuerySet, QuerySet):
+    def filter_groups_of_person(self, groups: Iterable[Union["Group", int]]) -> QuerySet:
+        """Filter personal notes of persons who were members of one of the passed groups.
+
+        The groups of the person are taken from the membership snapshot of the personal note.
+        """
+        from aleksis.apps.alsijil.models import GroupMembershipSnapshot
+
+        return self.filter(
+            groups_of_person_snapshot__in=GroupMembershipSnapshot.objects.filter(groups__in=groups)
+        )
+
     def not_empty(self):
         """Get all not empty personal notes."""
         return self.filter(
             ~Q(remarks="") | Q(absent=True) | ~Q(late=0) | Q(extra_marks__isnull=False)
         )
 
+    def empty(self):
+        """Get all empty personal notes which contain default values only."""
+        return self.filter(
+            ~Exists(self.model.extra_marks.through.objects.filter(personalnote_id=OuterRef("pk"))),
+            remarks="",
+            absent=False,
+            late=0,
+            excused=False,
+            excuse_type__isnull=True,
+        )
+
+    def delete_empty(self, batch_size: int = 10000) -> int:
+        """Delete all empty personal notes in batches and return their count."""
+        pks_qs = self.empty().select_related(None).prefetch_related(None).order_by("pk")
+
+        count = 0
+        while True:
+            pks = list(pks_qs.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+
+            self.model.objects.filter(pk__in=pks).delete()
+            count += len(pks)
+
+        return count
+
+    def bulk_create(self, objs, *args, ignore_conflicts: bool = False, **kwargs):
+        """Create personal notes in bulk and add their data to the statistics.
+
+        ``ignore_conflicts`` is not supported as the created objects have to be known
+        in order to update the statistics.
+        """
+        from aleksis.apps.alsijil.util.statistics import (
+            get_note_snapshot,
+            update_statistics_for_notes,
+        )
+
+        if ignore_conflicts:
+            raise ValueError("Personal notes can't be created in bulk with ignore_conflicts.")
+
+        objs = super().bulk_create(objs, *args, **kwargs)
+        update_statistics_for_notes({}, {obj.pk: get_note_snapshot(obj) for obj in objs})
+        return objs
+
+    def update(self, **kwargs):
+        """Update personal notes and apply the changes to the statistics.
+
+        This is also used by ``bulk_update``, which updates the notes through
+        ``update`` in batches.
+        """
+        from aleksis.apps.alsijil.util.statistics import (
+            STATISTICS_RELEVANT_FIELDS,
+            get_note_snapshots,
+            update_statistics_for_notes,
+        )
+
+        if not STATISTICS_RELEVANT_FIELDS.intersection(kwargs.keys()):
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            pks = list(self.prefetch_related(None).values_list("pk", flat=True))
+            old_snapshots = get_note_snapshots(self.model.objects.filter(pk__in=pks))
+            rows = super().update(**kwargs)
+
+            # Extra marks are not changed by updates, so they can be taken from the old data
+            new_snapshots = get_note_snapshots(
+                self.model.objects.filter(pk__in=pks), with_extra_marks=False
+            )
+            for pk, snapshot in new_snapshots.items():
+                snapshot["extra_marks"] = old_snapshots[pk]["extra_marks"]
+            update_statistics_for_notes(old_snapshots, new_snapshots)
+
+        return rows
+
+    def delete(self):
+        """Delete personal notes and remove their data from the statistics at once."""
+        from aleksis.apps.alsijil.util.statistics import (
+            bulk_statistics_update,
+            get_note_snapshots,
+            update_statistics_for_notes,
+        )
+
+        with transaction.atomic(using=self.db):
+            snapshots = get_note_snapshots(self)
+            with bulk_statistics_update():
+                result = super().delete()
+            update_statistics_for_notes(snapshots, {})
+
+        return result
+
 
 class LessonDocumentationManager(CurrentSiteManagerWithoutMigrations):
     pass
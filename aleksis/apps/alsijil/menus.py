@@ -89,6 +89,28 @@ MENUS = {
                         ),
                     ],
                 },
+                {
+                    "name": _("Missing lesson documentations"),
+                    "url": "missing_documentations",
+                    "icon": "assignment_late",
+                    "validators": [
+                        (
+                            "aleksis.core.util.predicates.permission_validator",
+                            "alsijil.view_register_objects_list_rule",
+                        ),
+                    ],
+                },
+                {
+                    "name": _("Print full registers"),
+                    "url": "full_registers_school_term",
+                    "icon": "print",
+                    "validators": [
+                        (
+                            "aleksis.core.util.predicates.permission_validator",
+                            "alsijil.view_full_registers_rule",
+                        ),
+                    ],
+                },
                 {
                     "name": _("Excuse types"),
                     "url": "excuse_types",
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.5 on 2021-07-10 14:12
+
+import django.contrib.sites.managers
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_statistics(apps, schema_editor):
+    # The statistics are built by the same code that keeps them up to date later
+    from aleksis.apps.alsijil.util.statistics import rebuild_statistics
+
+    rebuild_statistics()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_default_dashboard'),
+        ('sites', '0002_alter_domain_unique'),
+        ('alsijil', '0013_fix_uniqueness_per_site'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalNoteStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('extended_data', models.JSONField(default=dict, editable=False)),
+                ('absences_count', models.IntegerField(default=0, verbose_name='Absences')),
+                ('excused', models.IntegerField(default=0, verbose_name='Excused absences')),
+                ('unexcused', models.IntegerField(default=0, verbose_name='Unexcused absences')),
+                ('tardiness', models.IntegerField(default=0, verbose_name='Tardiness')),
+                ('tardiness_count', models.IntegerField(default=0, verbose_name='Count of tardiness')),
+                ('extra_mark_counts', models.JSONField(default=dict, verbose_name='Extra marks')),
+                ('excuse_type_counts', models.JSONField(default=dict, verbose_name='Excuse types')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.group', verbose_name='Group')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_note_statistics', to='core.person', verbose_name='Person')),
+                ('school_term', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.schoolterm', verbose_name='School term')),
+                ('site', models.ForeignKey(default=1, editable=False, on_delete=django.db.models.deletion.CASCADE, to='sites.site')),
+            ],
+            options={
+                'verbose_name': 'Personal note statistics',
+                'verbose_name_plural': 'Personal note statistics',
+            },
+            managers=[
+                ('objects', django.contrib.sites.managers.CurrentSiteManager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='personalnotestatistics',
+            constraint=models.UniqueConstraint(fields=('person', 'school_term', 'group'), name='unique_statistics_per_group'),
+        ),
+        migrations.AddConstraint(
+            model_name='personalnotestatistics',
+            constraint=models.UniqueConstraint(condition=models.Q(('school_term__isnull', True)), fields=('person', 'group'), name='unique_statistics_per_group_without_term'),
+        ),
+        migrations.RunPython(fill_statistics, migrations.RunPython.noop),
+    ]
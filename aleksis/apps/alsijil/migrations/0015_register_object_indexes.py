@@ -0,0 +1,37 @@
+# Generated by Django 3.2.5 on 2021-07-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alsijil', '0014_personal_note_statistics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='personalnote',
+            index=models.Index(fields=['lesson_period', 'year', 'week'], name='personal_note_lesson_week'),
+        ),
+        migrations.AddIndex(
+            model_name='personalnote',
+            index=models.Index(fields=['person', 'year', 'week'], name='personal_note_person_week'),
+        ),
+        migrations.AddIndex(
+            model_name='personalnote',
+            index=models.Index(condition=models.Q(absent=True), fields=['person', 'excused'], name='personal_note_absent'),
+        ),
+        migrations.AddIndex(
+            model_name='personalnote',
+            index=models.Index(condition=models.Q(late__gt=0), fields=['person'], name='personal_note_late'),
+        ),
+        migrations.AddIndex(
+            model_name='personalnote',
+            index=models.Index(condition=models.Q(_negated=True, remarks=''), fields=['person'], name='personal_note_remarks'),
+        ),
+        migrations.AddIndex(
+            model_name='lessondocumentation',
+            index=models.Index(condition=models.Q(_negated=True, topic=''), fields=['lesson_period', 'year', 'week'], name='documentation_with_topic'),
+        ),
+    ]
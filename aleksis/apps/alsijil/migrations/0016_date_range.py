@@ -0,0 +1,109 @@
+# Generated by Django 3.2.5 on 2021-07-18 09:47
+
+from django.db import migrations, models
+from django.db.models import (
+    Case,
+    ExpressionWrapper,
+    F,
+    Func,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Concat
+
+
+def _weekday_to_date(weekday, year="year", week="week"):
+    return ExpressionWrapper(
+        Func(
+            Concat(F(year), F(week)),
+            Value("IYYYIW"),
+            output_field=models.DateField(),
+            function="TO_DATE",
+        )
+        + weekday,
+        output_field=models.DateField(),
+    )
+
+
+def fill_date_range(apps, schema_editor):
+    LessonPeriod = apps.get_model("chronos", "LessonPeriod")
+    ExtraLesson = apps.get_model("chronos", "ExtraLesson")
+    Event = apps.get_model("chronos", "Event")
+
+    db_alias = schema_editor.connection.alias
+
+    lesson_period_day = _weekday_to_date(
+        Subquery(
+            LessonPeriod.objects.using(db_alias)
+            .filter(pk=OuterRef("lesson_period"))
+            .values("period__weekday")[:1]
+        )
+    )
+    extra_lesson_day = Subquery(
+        ExtraLesson.objects.using(db_alias)
+        .filter(pk=OuterRef("extra_lesson"))
+        .annotate(day=_weekday_to_date(F("period__weekday")))
+        .values("day")[:1]
+    )
+    events = Event.objects.using(db_alias).filter(pk=OuterRef("event"))
+
+    for model_name in ("PersonalNote", "LessonDocumentation"):
+        model = apps.get_model("alsijil", model_name)
+        model.objects.using(db_alias).update(
+            date_start=Case(
+                When(lesson_period__isnull=False, then=lesson_period_day),
+                When(extra_lesson__isnull=False, then=extra_lesson_day),
+                When(event__isnull=False, then=Subquery(events.values("date_start")[:1])),
+            ),
+            date_end=Case(
+                When(lesson_period__isnull=False, then=lesson_period_day),
+                When(extra_lesson__isnull=False, then=extra_lesson_day),
+                When(event__isnull=False, then=Subquery(events.values("date_end")[:1])),
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chronos', '0004_substitution_extra_lesson_year'),
+        ('alsijil', '0015_register_object_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessondocumentation',
+            name='date_end',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='End date'),
+        ),
+        migrations.AddField(
+            model_name='lessondocumentation',
+            name='date_start',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Start date'),
+        ),
+        migrations.AddField(
+            model_name='personalnote',
+            name='date_end',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='End date'),
+        ),
+        migrations.AddField(
+            model_name='personalnote',
+            name='date_start',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Start date'),
+        ),
+        migrations.AddIndex(
+            model_name='lessondocumentation',
+            index=models.Index(fields=['date_start', 'date_end'], name='documentation_date_range'),
+        ),
+        migrations.AddIndex(
+            model_name='personalnote',
+            index=models.Index(fields=['person', 'date_start'], name='personal_note_person_date'),
+        ),
+        migrations.AddIndex(
+            model_name='personalnote',
+            index=models.Index(fields=['date_start', 'date_end'], name='personal_note_date_range'),
+        ),
+        migrations.RunPython(fill_date_range, migrations.RunPython.noop),
+    ]
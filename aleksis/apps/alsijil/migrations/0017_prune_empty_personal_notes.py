@@ -0,0 +1,48 @@
+# Generated by Django 3.2.5 on 2021-07-25 11:12
+
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+
+def prune_empty_personal_notes(apps, schema_editor):
+    PersonalNote = apps.get_model("alsijil", "PersonalNote")
+    through_model = PersonalNote.groups_of_person.through
+    extra_marks_through_model = PersonalNote.extra_marks.through
+
+    db_alias = schema_editor.connection.alias
+
+    pks_qs = (
+        PersonalNote.objects.using(db_alias)
+        .filter(
+            ~Exists(
+                extra_marks_through_model.objects.using(db_alias).filter(
+                    personalnote_id=OuterRef("pk")
+                )
+            ),
+            remarks="",
+            absent=False,
+            late=0,
+            excused=False,
+            excuse_type__isnull=True,
+        )
+        .order_by("pk")
+    )
+
+    while True:
+        pks = list(pks_qs.values_list("pk", flat=True)[:10000])
+        if not pks:
+            break
+
+        through_model.objects.using(db_alias).filter(personalnote_id__in=pks).delete()
+        PersonalNote.objects.using(db_alias).filter(pk__in=pks).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alsijil', '0016_date_range'),
+    ]
+
+    operations = [
+        migrations.RunPython(prune_empty_personal_notes, migrations.RunPython.noop),
+    ]
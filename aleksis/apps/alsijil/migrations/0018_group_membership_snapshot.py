@@ -0,0 +1,117 @@
+# Generated by Django 3.2.5 on 2021-07-31 10:26
+
+from hashlib import sha256
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.db import migrations, models
+from django.db.models import CharField, Max
+from django.db.models.functions import Cast
+import django.db.models.deletion
+
+
+def _get_hash(group_pks):
+    return sha256(",".join(str(pk) for pk in sorted(set(group_pks))).encode()).hexdigest()
+
+
+def create_group_membership_snapshots(apps, schema_editor):
+    PersonalNote = apps.get_model("alsijil", "PersonalNote")
+    GroupMembershipSnapshot = apps.get_model("alsijil", "GroupMembershipSnapshot")
+    through_model = PersonalNote.groups_of_person.through
+
+    db_alias = schema_editor.connection.alias
+    batch_size = 10000
+
+    snapshot_pks = {}
+    max_pk = PersonalNote.objects.using(db_alias).aggregate(max_pk=Max("pk"))["max_pk"] or 0
+    for start in range(0, max_pk + 1, batch_size):
+        rows = (
+            through_model.objects.using(db_alias)
+            .filter(personalnote_id__gte=start, personalnote_id__lt=start + batch_size)
+            .order_by()
+            .values("personalnote_id")
+            .annotate(
+                group_pks=StringAgg(Cast("group_id", CharField()), ",", ordering="group_id")
+            )
+            .values_list("personalnote_id", "group_pks")
+        )
+
+        note_pks_by_hash = {}
+        for note_pk, group_pks in rows:
+            group_pks = [int(pk) for pk in group_pks.split(",")]
+            groups_hash = _get_hash(group_pks)
+            if groups_hash not in snapshot_pks:
+                snapshot = GroupMembershipSnapshot.objects.using(db_alias).create(
+                    groups_hash=groups_hash
+                )
+                snapshot.groups.set(group_pks)
+                snapshot_pks[groups_hash] = snapshot.pk
+            note_pks_by_hash.setdefault(groups_hash, []).append(note_pk)
+
+        for groups_hash, note_pks in note_pks_by_hash.items():
+            PersonalNote.objects.using(db_alias).filter(pk__in=note_pks).update(
+                groups_of_person_snapshot_id=snapshot_pks[groups_hash]
+            )
+
+
+def restore_groups_of_person(apps, schema_editor):
+    PersonalNote = apps.get_model("alsijil", "PersonalNote")
+    GroupMembershipSnapshot = apps.get_model("alsijil", "GroupMembershipSnapshot")
+    through_model = PersonalNote.groups_of_person.through
+
+    db_alias = schema_editor.connection.alias
+
+    for snapshot in GroupMembershipSnapshot.objects.using(db_alias).prefetch_related("groups"):
+        group_pks = [group.pk for group in snapshot.groups.all()]
+        note_pks = (
+            PersonalNote.objects.using(db_alias)
+            .filter(groups_of_person_snapshot=snapshot)
+            .values_list("pk", flat=True)
+        )
+        through_model.objects.using(db_alias).bulk_create(
+            (
+                through_model(personalnote_id=note_pk, group_id=group_pk)
+                for note_pk in note_pks.iterator()
+                for group_pk in group_pks
+            ),
+            batch_size=10000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_default_dashboard'),
+        ('sites', '0002_alter_domain_unique'),
+        ('alsijil', '0017_prune_empty_personal_notes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupMembershipSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('extended_data', models.JSONField(default=dict, editable=False)),
+                ('groups_hash', models.CharField(editable=False, max_length=64, verbose_name='Hash of groups')),
+                ('groups', models.ManyToManyField(related_name='_alsijil_groupmembershipsnapshot_groups_+', to='core.Group', verbose_name='Groups')),
+                ('site', models.ForeignKey(default=1, editable=False, on_delete=django.db.models.deletion.CASCADE, to='sites.site')),
+            ],
+            options={
+                'verbose_name': 'Group membership snapshot',
+                'verbose_name_plural': 'Group membership snapshots',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='groupmembershipsnapshot',
+            constraint=models.UniqueConstraint(fields=('site_id', 'groups_hash'), name='unique_group_membership_snapshot'),
+        ),
+        migrations.AddField(
+            model_name='personalnote',
+            name='groups_of_person_snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='personal_notes', to='alsijil.groupmembershipsnapshot', verbose_name='Groups of person'),
+        ),
+        migrations.RunPython(create_group_membership_snapshots, restore_groups_of_person),
+        migrations.RemoveField(
+            model_name='personalnote',
+            name='groups_of_person',
+        ),
+    ]
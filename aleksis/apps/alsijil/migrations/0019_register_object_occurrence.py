@@ -0,0 +1,70 @@
+# Generated by Django 3.2.5 on 2021-08-07 11:48
+
+import django.contrib.sites.managers
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_occurrences(apps, schema_editor):
+    # The occurrences are built by the same code that keeps them up to date later
+    from aleksis.apps.alsijil.util.occurrences import rebuild_occurrences
+
+    rebuild_occurrences()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chronos', '0004_substitution_extra_lesson_year'),
+        ('sites', '0002_alter_domain_unique'),
+        ('alsijil', '0018_group_membership_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegisterObjectOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('extended_data', models.JSONField(default=dict, editable=False)),
+                ('year', models.IntegerField(verbose_name='Year')),
+                ('week', models.IntegerField(verbose_name='Week')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('cancelled', models.BooleanField(default=False, verbose_name='Cancelled')),
+                ('event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='register_object_occurrences', to='chronos.event', verbose_name='Event')),
+                ('extra_lesson', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='register_object_occurrences', to='chronos.extralesson', verbose_name='Extra lesson')),
+                ('holiday', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chronos.holiday', verbose_name='Holiday')),
+                ('lesson_period', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='register_object_occurrences', to='chronos.lessonperiod', verbose_name='Lesson period')),
+                ('site', models.ForeignKey(default=1, editable=False, on_delete=django.db.models.deletion.CASCADE, to='sites.site')),
+                ('substitution', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chronos.lessonsubstitution', verbose_name='Substitution')),
+            ],
+            options={
+                'verbose_name': 'Register object occurrence',
+                'verbose_name_plural': 'Register object occurrences',
+                'ordering': ['date'],
+            },
+            managers=[
+                ('objects', django.contrib.sites.managers.CurrentSiteManager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='registerobjectoccurrence',
+            index=models.Index(fields=['lesson_period', 'year', 'week'], name='occurrence_lesson_week'),
+        ),
+        migrations.AddIndex(
+            model_name='registerobjectoccurrence',
+            index=models.Index(fields=['event', 'date'], name='occurrence_event_date'),
+        ),
+        migrations.AddIndex(
+            model_name='registerobjectoccurrence',
+            index=models.Index(fields=['extra_lesson'], name='occurrence_extra_lesson'),
+        ),
+        migrations.AddIndex(
+            model_name='registerobjectoccurrence',
+            index=models.Index(fields=['date'], name='occurrence_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='registerobjectoccurrence',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('event__isnull', True), ('extra_lesson__isnull', True), ('lesson_period__isnull', False)), models.Q(('event__isnull', False), ('extra_lesson__isnull', True), ('lesson_period__isnull', True)), models.Q(('event__isnull', True), ('extra_lesson__isnull', False), ('lesson_period__isnull', True)), _connector='OR'), name='one_relation_only_occurrence'),
+        ),
+        migrations.RunPython(fill_occurrences, migrations.RunPython.noop),
+    ]
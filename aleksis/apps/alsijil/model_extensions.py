@@ -1,18 +1,36 @@
 from datetime import date
-from typing import Dict, Iterable, Iterator, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
-from django.db.models import Exists, FilteredRelation, OuterRef, Q, QuerySet
-from django.db.models.aggregates import Count, Sum
+from django.db import transaction
+from django.db.models import Exists, FilteredRelation, IntegerField, OuterRef, Q, QuerySet
+from django.db.models.aggregates import Count
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce
 from django.urls import reverse
 from django.utils.translation import gettext as _
 
 from calendarweek import CalendarWeek
 
 from aleksis.apps.alsijil.managers import PersonalNoteQuerySet
-from aleksis.apps.chronos.models import Event, ExtraLesson, LessonPeriod
+from aleksis.apps.chronos.models import (
+    Event,
+    ExtraLesson,
+    Holiday,
+    LessonPeriod,
+    LessonSubstitution,
+)
 from aleksis.core.models import Group, Person
-
-from .models import ExcuseType, ExtraMark, LessonDocumentation, PersonalNote
+from aleksis.core.util.core_helpers import get_site_preferences
+
+from .models import (
+    ExcuseType,
+    ExtraMark,
+    GroupMembershipSnapshot,
+    LessonDocumentation,
+    PersonalNote,
+)
+from .util.instrumentation import increment
+from .util.registries import get_all_excuse_types, get_all_extra_marks
 
 
 def alsijil_url(
@@ -70,10 +88,8 @@ def mark_absent(
     wanted_week = CalendarWeek.from_date(day)
 
     # Get all lessons of this person on the specified day
-    lesson_periods = (
-        self.lesson_periods_as_participant.on_day(day)
-        .filter(period__period__gte=from_period)
-        .annotate_week(wanted_week)
+    lesson_periods = self.lesson_periods_as_participant.on_day(day).filter(
+        period__period__gte=from_period
     )
     extra_lessons = (
         ExtraLesson.objects.filter(groups__members=self)
@@ -85,40 +101,321 @@ def mark_absent(
         lesson_periods = lesson_periods.filter(period__period__lte=to_period)
         extra_lessons = extra_lessons.filter(period__period__lte=to_period)
 
+    lesson_period_pks = set(
+        lesson_periods.select_related(None).prefetch_related(None).values_list("pk", flat=True)
+    )
+    extra_lesson_pks = set(
+        extra_lessons.select_related(None).prefetch_related(None).values_list("pk", flat=True)
+    )
+
     # Create and update all personal notes for the discovered lesson periods
     if not dry_run:
-        for register_object in list(lesson_periods) + list(extra_lessons):
-            if isinstance(register_object, LessonPeriod):
-                sub = register_object.get_substitution()
-                q_attrs = dict(
-                    week=wanted_week.week, year=wanted_week.year, lesson_period=register_object
-                )
+        cancelled_lesson_period_pks = set(
+            LessonSubstitution.objects.filter(
+                lesson_period__in=lesson_period_pks,
+                week=wanted_week.week,
+                year=wanted_week.year,
+                cancelled=True,
+            )
+            .select_related(None)
+            .values_list("lesson_period_id", flat=True)
+        )
+        register_objects = {
+            ("lesson_period", pk, wanted_week.year, wanted_week.week)
+            for pk in lesson_period_pks - cancelled_lesson_period_pks
+        } | {("extra_lesson", pk) for pk in extra_lesson_pks}
+
+        _mark_absent_in_register_objects(
+            {self.pk: register_objects}, {self.pk: (absent, excused, excuse_type, remarks)}
+        )
+
+    return len(lesson_period_pks) + len(extra_lesson_pks)
+
+
+@Person.method
+def mark_absent_range(
+    self,
+    date_start: date,
+    date_end: date,
+    from_period: int = 0,
+    to_period: Optional[int] = None,
+    absent: bool = True,
+    excused: bool = False,
+    excuse_type: Optional[ExcuseType] = None,
+    remarks: str = "",
+    dry_run: bool = False,
+) -> int:
+    """Mark a person absent for all lessons in a date range.
+
+    The range starts with the selected period on the first day
+    and ends with the selected period on the last day.
+
+    Lessons in holidays are skipped if entries in holidays aren't allowed;
+    cancelled lessons are always skipped. All affected lessons are resolved
+    using a constant number of queries, independent from the length of the range.
+
+    :param dry_run: With this activated, the function won't change any data
+        and just return the count of affected lessons
+
+    :return: Count of affected lesson periods and extra lessons
+
+    ..note:: Only available when AlekSIS-App-Alsijil is installed.
+    """
+    if get_site_preferences()["alsijil__allow_entries_in_holidays"]:
+        holiday_days = set()
+    else:
+        holiday_days = set(Holiday.objects.within_dates(date_start, date_end).get_all_days())
+
+    def _is_affected(day: date, period: int) -> bool:
+        if not date_start <= day <= date_end or day in holiday_days:
+            return False
+        if day == date_start and period < from_period:
+            return False
+        if to_period and day == date_end and period > to_period:
+            return False
+        return True
+
+    register_objects = set()
+
+    # Get all lessons of this person in the range and expand them to the single weeks
+    lesson_periods = (
+        self.lesson_periods_as_participant.filter(
+            lesson__validity__date_start__lte=date_end, lesson__validity__date_end__gte=date_start
+        )
+        .select_related(None)
+        .prefetch_related(None)
+        .values_list(
+            "pk",
+            "period__weekday",
+            "period__period",
+            "lesson__validity__date_start",
+            "lesson__validity__date_end",
+        )
+        .distinct()
+    )
+    for pk, weekday, period, validity_start, validity_end in lesson_periods:
+        weeks = CalendarWeek.weeks_within(
+            max(date_start, validity_start), min(date_end, validity_end)
+        )
+        for week in weeks:
+            day = week[weekday]
+            if validity_start <= day <= validity_end and _is_affected(day, period):
+                register_objects.add(("lesson_period", pk, week.year, week.week))
+
+    # Skip cancelled lessons
+    lesson_period_keys = [key for key in register_objects if key[0] == "lesson_period"]
+    if lesson_period_keys:
+        cancelled = (
+            LessonSubstitution.objects.filter(
+                lesson_period__in={key[1] for key in lesson_period_keys},
+                year__in={key[2] for key in lesson_period_keys},
+                week__in={key[3] for key in lesson_period_keys},
+                cancelled=True,
+            )
+            .select_related(None)
+            .values_list("lesson_period_id", "year", "week")
+        )
+        register_objects -= {("lesson_period",) + tuple(row) for row in cancelled}
+
+    extra_lessons = (
+        ExtraLesson.objects.filter(groups__members=self)
+        .annotate_day()
+        .filter(day__gte=date_start, day__lte=date_end)
+        .select_related(None)
+        .prefetch_related(None)
+        .values_list("pk", "day", "period__period")
+        .distinct()
+    )
+    for pk, day, period in extra_lessons:
+        if _is_affected(day, period):
+            register_objects.add(("extra_lesson", pk))
+
+    if not dry_run:
+        _mark_absent_in_register_objects(
+            {self.pk: register_objects}, {self.pk: (absent, excused, excuse_type, remarks)}
+        )
+
+    return len(register_objects)
+
+
+def _mark_absent_in_register_objects(
+    register_objects_by_person: Dict[int, Set[Tuple]],
+    values_by_person: Dict[int, Tuple[bool, bool, Optional[ExcuseType], str]],
+):
+    """Create or update the personal notes of persons for multiple register objects in bulk.
+
+    Register objects are passed per person as ``("lesson_period", pk, year, week)``
+    or ``("extra_lesson", pk)`` tuples, the new values are passed per person
+    as ``(absent, excused, excuse_type, remarks)`` tuples.
+    """
+    register_objects = {
+        (person_pk,) + key for person_pk, keys in register_objects_by_person.items() for key in keys
+    }
+    if not register_objects:
+        return
+
+    lesson_period_keys = [key for key in register_objects if key[1] == "lesson_period"]
+    extra_lesson_pks = [key[2] for key in register_objects if key[1] == "extra_lesson"]
+
+    # Get all existing personal notes in one query
+    existing_notes = (
+        PersonalNote.objects.select_related(None)
+        .prefetch_related(None)
+        .filter(person__in={key[0] for key in register_objects})
+        .filter(
+            Q(
+                lesson_period__in={key[2] for key in lesson_period_keys},
+                year__in={key[3] for key in lesson_period_keys},
+                week__in={key[4] for key in lesson_period_keys},
+            )
+            | Q(extra_lesson__in=extra_lesson_pks)
+        )
+    )
+    notes_by_key = {}
+    for note in existing_notes:
+        if note.lesson_period_id:
+            key = (note.person_id, "lesson_period", note.lesson_period_id, note.year, note.week)
+        else:
+            key = (note.person_id, "extra_lesson", note.extra_lesson_id)
+        if key in register_objects:
+            notes_by_key[key] = note
+
+    # All notes of a person share the snapshot of the current groups of the person
+    snapshots = GroupMembershipSnapshot.objects.get_for_persons(register_objects_by_person.keys())
+
+    new_notes = []
+    changed_notes = []
+    for key in register_objects:
+        person_pk = key[0]
+        if key in notes_by_key:
+            note = notes_by_key[key]
+            changed_notes.append(note)
+        elif key[1] == "lesson_period":
+            note = PersonalNote(
+                person_id=person_pk, lesson_period_id=key[2], year=key[3], week=key[4]
+            )
+            new_notes.append(note)
+        else:
+            note = PersonalNote(person_id=person_pk, extra_lesson_id=key[2])
+            new_notes.append(note)
+
+        absent, excused, excuse_type, remarks = values_by_person[person_pk]
+        note.absent = absent
+        note.excused = excused
+        note.excuse_type = excuse_type
+        note.normalize_absence()
+        if remarks:
+            if note.remarks:
+                note.remarks += "; %s" % remarks
             else:
-                sub = None
-                q_attrs = dict(extra_lesson=register_object)
-
-            if sub and sub.cancelled:
-                continue
-
-            personal_note, created = (
-                PersonalNote.objects.select_related(None)
-                .prefetch_related(None)
-                .update_or_create(
-                    person=self,
-                    defaults={"absent": absent, "excused": excused, "excuse_type": excuse_type,},
-                    **q_attrs,
-                )
+                note.remarks = remarks
+        note.groups_of_person_snapshot = snapshots[person_pk]
+
+    with transaction.atomic():
+        PersonalNote.objects.bulk_create(new_notes)
+        PersonalNote.objects.bulk_update(
+            changed_notes,
+            ["absent", "excused", "excuse_type", "remarks", "groups_of_person_snapshot"],
+        )
+
+
+def carry_over_personal_notes(
+    self, personal_notes: Iterable[PersonalNote], wanted_week: Optional[CalendarWeek] = None
+) -> int:
+    """Carry over the absences of personal notes to all following lessons on the same day.
+
+    Works like ``Person.mark_absent`` for the persons of all passed personal notes at once:
+    The following lesson periods and extra lessons of all persons, their substitutions and
+    their existing personal notes are resolved with a constant number of queries
+    and the absence status of the passed personal notes is written in bulk.
+
+    The week is optional for extra lessons as they have own date information.
+
+    :return: Count of affected lesson periods and extra lessons
+
+    ..note:: Only available when AlekSIS-App-Alsijil is installed.
+    """
+    values_by_person = {
+        note.person_id: (note.absent, note.excused, note.excuse_type, "") for note in personal_notes
+    }
+    if not values_by_person:
+        return 0
+    person_pks = list(values_by_person.keys())
+
+    if isinstance(self, LessonPeriod):
+        day = wanted_week[self.period.weekday]
+    else:
+        day = self.date
+    wanted_week = CalendarWeek.from_date(day)
+    from_period = self.period.period + 1
+
+    # Get all following lessons of all persons on this day
+    lesson_periods = (
+        LessonPeriod.objects.on_day(day)
+        .filter(period__period__gte=from_period, lesson__groups__members__in=person_pks)
+        .select_related(None)
+        .prefetch_related(None)
+        .values_list("pk", "lesson__groups__members")
+        .distinct()
+    )
+    extra_lessons = (
+        ExtraLesson.objects.on_day(day)
+        .filter(period__period__gte=from_period, groups__members__in=person_pks)
+        .select_related(None)
+        .prefetch_related(None)
+        .values_list("pk", "groups__members")
+        .distinct()
+    )
+
+    lesson_periods = list(lesson_periods)
+    cancelled_lesson_period_pks = set(
+        LessonSubstitution.objects.filter(
+            lesson_period__in={pk for pk, __ in lesson_periods},
+            week=wanted_week.week,
+            year=wanted_week.year,
+            cancelled=True,
+        )
+        .select_related(None)
+        .values_list("lesson_period_id", flat=True)
+    )
+
+    register_objects_by_person = {person_pk: set() for person_pk in person_pks}
+    for pk, person_pk in lesson_periods:
+        if pk not in cancelled_lesson_period_pks:
+            register_objects_by_person[person_pk].add(
+                ("lesson_period", pk, wanted_week.year, wanted_week.week)
             )
-            personal_note.groups_of_person.set(self.member_of.all())
+    for pk, person_pk in extra_lessons:
+        register_objects_by_person[person_pk].add(("extra_lesson", pk))
+
+    _mark_absent_in_register_objects(register_objects_by_person, values_by_person)
+
+    return sum(len(keys) for keys in register_objects_by_person.values())
+
+
+LessonPeriod.method(carry_over_personal_notes)
+ExtraLesson.method(carry_over_personal_notes)
+
 
-            if remarks:
-                if personal_note.remarks:
-                    personal_note.remarks += "; %s" % remarks
-                else:
-                    personal_note.remarks = remarks
-                personal_note.save()
+def _get_personal_note_attrs(self, wanted_week: Optional[CalendarWeek] = None) -> dict:
+    """Get the attributes which link a personal note to this register object."""
+    if isinstance(self, LessonPeriod):
+        return dict(week=wanted_week.week, year=wanted_week.year, lesson_period=self)
+    elif isinstance(self, Event):
+        return dict(event=self)
+    else:
+        return dict(extra_lesson=self)
 
-    return lesson_periods.count() + extra_lessons.count()
+
+def _get_persons_without_personal_notes(self, persons: QuerySet, q_attrs: dict) -> QuerySet:
+    """Get all persons in the associated groups that do not yet have a personal note."""
+    return persons.annotate(
+        no_personal_notes=~Exists(PersonalNote.objects.filter(person__pk=OuterRef("pk"), **q_attrs))
+    ).filter(
+        member_of__in=Group.objects.filter(pk__in=self.get_groups().all()),
+        is_active=True,
+        no_personal_notes=True,
+    )
 
 
 def get_personal_notes(
@@ -138,28 +435,18 @@ def get_personal_notes(
     :Authors:
         - Dominik George <dominik.george@teckids.org>
     """
-    # Find all persons in the associated groups that do not yet have a personal note for this lesson
-    if isinstance(self, LessonPeriod):
-        q_attrs = dict(week=wanted_week.week, year=wanted_week.year, lesson_period=self)
-    elif isinstance(self, Event):
-        q_attrs = dict(event=self)
-    else:
-        q_attrs = dict(extra_lesson=self)
-
-    missing_persons = persons.annotate(
-        no_personal_notes=~Exists(PersonalNote.objects.filter(person__pk=OuterRef("pk"), **q_attrs))
-    ).filter(
-        member_of__in=Group.objects.filter(pk__in=self.get_groups().all()),
-        is_active=True,
-        no_personal_notes=True,
-    )
+    q_attrs = _get_personal_note_attrs(self, wanted_week)
+    missing_persons = _get_persons_without_personal_notes(self, persons, q_attrs)
 
     # Create all missing personal notes
-    new_personal_notes = [PersonalNote(person=person, **q_attrs,) for person in missing_persons]
+    missing_person_pks = set(missing_persons.values_list("pk", flat=True))
+    snapshots = GroupMembershipSnapshot.objects.get_for_persons(missing_person_pks)
+    new_personal_notes = [
+        PersonalNote(person_id=person_pk, groups_of_person_snapshot=snapshot, **q_attrs)
+        for person_pk, snapshot in snapshots.items()
+    ]
     PersonalNote.objects.bulk_create(new_personal_notes)
-
-    for personal_note in new_personal_notes:
-        personal_note.groups_of_person.set(personal_note.person.member_of.all())
+    increment("personal_notes_created", len(new_personal_notes))
 
     return (
         PersonalNote.objects.filter(**q_attrs, person__in=persons)
@@ -170,9 +457,38 @@ def get_personal_notes(
     )
 
 
+def get_personal_notes_sparse(
+    self, persons: QuerySet, wanted_week: Optional[CalendarWeek] = None
+) -> List[PersonalNote]:
+    """Get personal notes for all persons in that register object without creating them.
+
+    Works like ``get_personal_notes``, but persons without a personal note
+    get an unsaved personal note with default values instead of a new database row.
+    The personal notes are sorted by the names of the persons.
+
+    ..note:: Only available when AlekSIS-App-Alsijil is installed.
+    """
+    q_attrs = _get_personal_note_attrs(self, wanted_week)
+
+    personal_notes = list(
+        PersonalNote.objects.filter(**q_attrs, person__in=persons)
+        .select_related(None)
+        .prefetch_related(None)
+        .select_related("person", "excuse_type")
+        .prefetch_related("extra_marks")
+    )
+    missing_persons = _get_persons_without_personal_notes(self, persons, q_attrs).distinct()
+    personal_notes += [PersonalNote(person=person, **q_attrs) for person in missing_persons]
+
+    return sorted(personal_notes, key=lambda note: (note.person.last_name, note.person.first_name))
+
+
 LessonPeriod.method(get_personal_notes)
 Event.method(get_personal_notes)
 ExtraLesson.method(get_personal_notes)
+LessonPeriod.method(get_personal_notes_sparse)
+Event.method(get_personal_notes_sparse)
+ExtraLesson.method(get_personal_notes_sparse)
 
 # Dynamically add extra permissions to Group and Person models in core
 # Note: requires migrate afterwards
@@ -252,25 +568,84 @@ Event.method(get_or_create_lesson_documentation_single, "get_or_create_lesson_do
 ExtraLesson.method(get_or_create_lesson_documentation_single, "get_or_create_lesson_documentation")
 
 
+def _build_personal_note_summary(personal_notes: QuerySet) -> Dict[str, Any]:
+    """Build the summary of absences, tardinesses and extra marks of some personal notes.
+
+    Only personal notes with an absence, a tardiness or extra marks are loaded,
+    the extra marks are loaded with a single prefetch.
+    """
+    notes = list(
+        personal_notes.filter(
+            Exists(PersonalNote.extra_marks.through.objects.filter(personalnote=OuterRef("pk")))
+            | Q(absent=True)
+            | Q(late__gt=0)
+        )
+    )
+
+    absences = []
+    tardinesses = []
+    notes_by_extra_mark = {}
+    for note in notes:
+        if note.absent:
+            absences.append(note)
+        if note.late:
+            tardinesses.append(note)
+        for extra_mark in note.extra_marks.all():
+            notes_by_extra_mark.setdefault(extra_mark, []).append(note)
+
+    return {
+        "notes": notes,
+        "absences": absences,
+        "tardinesses": tardinesses,
+        "extra_marks": {
+            extra_mark: notes_by_extra_mark[extra_mark]
+            for extra_mark in sorted(notes_by_extra_mark, key=lambda m: m.short_name)
+        },
+    }
+
+
 @LessonPeriod.method
-def get_absences(self, week: Optional[CalendarWeek] = None) -> Iterator:
-    """Get all personal notes of absent persons for this lesson."""
+def get_personal_note_summary(self, week: Optional[CalendarWeek] = None) -> Dict[str, Any]:
+    """Get absences, tardinesses and extra marks of this lesson in one query.
+
+    The summary is cached on the lesson period per week.
+    """
     if not week:
         week = self.week
 
-    return filter(
-        lambda p: p.week == week.week and p.year == week.year and p.absent,
-        self.personal_notes.all(),
-    )
+    if not hasattr(self, "_personal_note_summaries"):
+        self._personal_note_summaries = {}
+    if (week.year, week.week) not in self._personal_note_summaries:
+        self._personal_note_summaries[(week.year, week.week)] = _build_personal_note_summary(
+            self.personal_notes.filter(week=week.week, year=week.year)
+        )
+    return self._personal_note_summaries[(week.year, week.week)]
 
 
-def get_absences_simple(self, week: Optional[CalendarWeek] = None) -> Iterator:
-    """Get all personal notes of absent persons for this event/extra lesson."""
-    return filter(lambda p: p.absent, self.personal_notes.all())
+def get_personal_note_summary_simple(self, week: Optional[CalendarWeek] = None) -> Dict[str, Any]:
+    """Get absences, tardinesses and extra marks of this event/extra lesson in one query.
+
+    The summary is cached on the event/extra lesson.
+    """
+    if not hasattr(self, "_personal_note_summary"):
+        self._personal_note_summary = _build_personal_note_summary(self.personal_notes.all())
+    return self._personal_note_summary
 
 
-Event.method(get_absences_simple, "get_absences")
-ExtraLesson.method(get_absences_simple, "get_absences")
+Event.method(get_personal_note_summary_simple, "get_personal_note_summary")
+ExtraLesson.method(get_personal_note_summary_simple, "get_personal_note_summary")
+
+
+def get_absences(
+    self: Union[LessonPeriod, Event, ExtraLesson], week: Optional[CalendarWeek] = None
+) -> List[PersonalNote]:
+    """Get all personal notes of absent persons for this register object."""
+    return self.get_personal_note_summary(week)["absences"]
+
+
+LessonPeriod.method(get_absences)
+Event.method(get_absences)
+ExtraLesson.method(get_absences)
 
 
 @LessonPeriod.method
@@ -307,51 +682,28 @@ Event.method(get_unexcused_absences_simple, "get_unexcused_absences")
 ExtraLesson.method(get_unexcused_absences_simple, "get_unexcused_absences")
 
 
-@LessonPeriod.method
-def get_tardinesses(self, week: Optional[CalendarWeek] = None) -> QuerySet:
-    """Get all personal notes of late persons for this lesson."""
-    if not week:
-        week = self.week
-    return self.personal_notes.filter(week=week.week, year=week.year, late__gt=0)
-
-
-def get_tardinesses_simple(self, week: Optional[CalendarWeek] = None) -> QuerySet:
-    """Get all personal notes of late persons for this event/extra lesson."""
-    return self.personal_notes.filter(late__gt=0)
-
-
-Event.method(get_tardinesses_simple, "get_tardinesses")
-ExtraLesson.method(get_tardinesses_simple, "get_tardinesses")
-
-
-@LessonPeriod.method
-def get_extra_marks(self, week: Optional[CalendarWeek] = None) -> Dict[ExtraMark, QuerySet]:
-    """Get all statistics on extra marks for this lesson."""
-    if not week:
-        week = self.week
-
-    stats = {}
-    for extra_mark in ExtraMark.objects.all():
-        qs = self.personal_notes.filter(week=week.week, year=week.year, extra_marks=extra_mark)
-        if qs:
-            stats[extra_mark] = qs
+def get_tardinesses(
+    self: Union[LessonPeriod, Event, ExtraLesson], week: Optional[CalendarWeek] = None
+) -> List[PersonalNote]:
+    """Get all personal notes of late persons for this register object."""
+    return self.get_personal_note_summary(week)["tardinesses"]
 
-    return stats
 
+LessonPeriod.method(get_tardinesses)
+Event.method(get_tardinesses)
+ExtraLesson.method(get_tardinesses)
 
-def get_extra_marks_simple(self, week: Optional[CalendarWeek] = None) -> Dict[ExtraMark, QuerySet]:
-    """Get all statistics on extra marks for this event/extra lesson."""
-    stats = {}
-    for extra_mark in ExtraMark.objects.all():
-        qs = self.personal_notes.filter(extra_marks=extra_mark)
-        if qs:
-            stats[extra_mark] = qs
 
-    return stats
+def get_extra_marks(
+    self: Union[LessonPeriod, Event, ExtraLesson], week: Optional[CalendarWeek] = None
+) -> Dict[ExtraMark, List[PersonalNote]]:
+    """Get all statistics on extra marks for this register object."""
+    return self.get_personal_note_summary(week)["extra_marks"]
 
 
-Event.method(get_extra_marks_simple, "get_extra_marks")
-ExtraLesson.method(get_extra_marks_simple, "get_extra_marks")
+LessonPeriod.method(get_extra_marks)
+Event.method(get_extra_marks)
+ExtraLesson.method(get_extra_marks)
 
 
 @Group.class_method
@@ -381,75 +733,53 @@ def get_owner_groups_with_lessons(self: Person):
 def generate_person_list_with_class_register_statistics(
     self: Group, persons: Optional[Iterable] = None
 ) -> QuerySet:
-    """Get with class register statistics annotated list of all members."""
+    """Get with class register statistics annotated list of all members.
+
+    The statistics are read from the materialized statistics table (``PersonalNoteStatistics``).
+    """
     if persons is None:
         persons = self.members.all()
 
-    lesson_periods = LessonPeriod.objects.filter(
-        lesson__validity__school_term=self.school_term
-    ).filter(Q(lesson__groups=self) | Q(lesson__groups__parent_groups=self))
-    extra_lessons = ExtraLesson.objects.filter(school_term=self.school_term).filter(
-        Q(groups=self) | Q(groups__parent_groups=self)
-    )
-    events = Event.objects.filter(school_term=self.school_term).filter(
-        Q(groups=self) | Q(groups__parent_groups=self)
-    )
-
     persons = persons.select_related("primary_group", "primary_group__school_term").order_by(
         "last_name", "first_name"
     )
     persons = persons.annotate(
-        filtered_personal_notes=FilteredRelation(
-            "personal_notes",
-            condition=(
-                Q(personal_notes__event__in=events)
-                | Q(personal_notes__lesson_period__in=lesson_periods)
-                | Q(personal_notes__extra_lesson__in=extra_lessons)
+        filtered_statistics=FilteredRelation(
+            "personal_note_statistics",
+            condition=Q(
+                personal_note_statistics__group=self,
+                personal_note_statistics__school_term=self.school_term,
             ),
         )
     ).annotate(
-        absences_count=Count(
-            "filtered_personal_notes", filter=Q(filtered_personal_notes__absent=True),
-        ),
-        excused=Count(
-            "filtered_personal_notes",
-            filter=Q(
-                filtered_personal_notes__absent=True,
-                filtered_personal_notes__excused=True,
-                filtered_personal_notes__excuse_type__isnull=True,
-            ),
-        ),
-        unexcused=Count(
-            "filtered_personal_notes",
-            filter=Q(filtered_personal_notes__absent=True, filtered_personal_notes__excused=False),
-        ),
-        tardiness=Sum("filtered_personal_notes__late"),
-        tardiness_count=Count(
-            "filtered_personal_notes", filter=Q(filtered_personal_notes__late__gt=0),
-        ),
+        absences_count=Coalesce("filtered_statistics__absences_count", 0),
+        excused=Coalesce("filtered_statistics__excused", 0),
+        unexcused=Coalesce("filtered_statistics__unexcused", 0),
+        tardiness=Coalesce("filtered_statistics__tardiness", 0),
+        tardiness_count=Coalesce("filtered_statistics__tardiness_count", 0),
     )
 
-    for extra_mark in ExtraMark.objects.all():
+    for extra_mark in get_all_extra_marks():
         persons = persons.annotate(
             **{
-                extra_mark.count_label: Count(
-                    "filtered_personal_notes",
-                    filter=Q(filtered_personal_notes__extra_marks=extra_mark),
+                extra_mark.count_label: _get_statistics_count(
+                    "filtered_statistics__extra_mark_counts", extra_mark.pk
                 )
             }
         )
 
-    for excuse_type in ExcuseType.objects.all():
+    for excuse_type in get_all_excuse_types():
         persons = persons.annotate(
             **{
-                excuse_type.count_label: Count(
-                    "filtered_personal_notes__absent",
-                    filter=Q(
-                        filtered_personal_notes__absent=True,
-                        filtered_personal_notes__excuse_type=excuse_type,
-                    ),
+                excuse_type.count_label: _get_statistics_count(
+                    "filtered_statistics__excuse_type_counts", excuse_type.pk
                 )
             }
         )
 
     return persons
+
+
+def _get_statistics_count(field_name: str, pk: int) -> Coalesce:
+    """Get an expression for a count stored in a mapping of the statistics table."""
+    return Coalesce(Cast(KeyTextTransform(str(pk), field_name), IntegerField()), 0)
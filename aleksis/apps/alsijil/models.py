@@ -1,13 +1,17 @@
 from datetime import date
-from typing import Optional, Union
+from hashlib import sha256
+from typing import Iterable, Optional, Union
 from urllib.parse import urlparse
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import QuerySet
 from django.db.models.constraints import CheckConstraint
 from django.db.models.query_utils import Q
+from django.dispatch import receiver
 from django.utils.formats import date_format
 from django.utils.translation import gettext_lazy as _
 
+import reversion
 from calendarweek import CalendarWeek
 from colorfield.fields import ColorField
 
@@ -17,8 +21,11 @@ from aleksis.apps.alsijil.data_checks import (
     NoGroupsOfPersonsSetInPersonalNotesDataCheck,
     NoPersonalNotesInCancelledLessonsDataCheck,
     PersonalNoteOnHolidaysDataCheck,
+    register_unrevisioned_changes,
 )
 from aleksis.apps.alsijil.managers import (
+    GroupMembershipSnapshotManager,
+    GroupMembershipSnapshotQuerySet,
     GroupRoleAssignmentManager,
     GroupRoleAssignmentQuerySet,
     GroupRoleManager,
@@ -28,11 +35,33 @@ from aleksis.apps.alsijil.managers import (
     PersonalNoteManager,
     PersonalNoteQuerySet,
 )
+from aleksis.apps.alsijil.util.occurrences import (
+    schedule_rebuild_of_occurrences,
+    update_holidays_of_occurrences,
+    update_occurrences_for_substitution,
+)
+from aleksis.apps.alsijil.util.registries import excuse_types_registry, extra_marks_registry
+from aleksis.apps.alsijil.util.statistics import (
+    get_note_snapshot,
+    get_note_snapshots,
+    is_bulk_statistics_update,
+    schedule_rebuild_of_statistics,
+    update_statistics_for_notes,
+)
 from aleksis.apps.chronos.managers import GroupPropertiesMixin
 from aleksis.apps.chronos.mixins import WeekRelatedMixin
-from aleksis.apps.chronos.models import Event, ExtraLesson, LessonPeriod, TimePeriod
+from aleksis.apps.chronos.models import (
+    Event,
+    ExtraLesson,
+    Holiday,
+    Lesson,
+    LessonPeriod,
+    LessonSubstitution,
+    TimePeriod,
+    ValidityRange,
+)
 from aleksis.core.mixins import ExtensibleModel, GlobalPermissionModel
-from aleksis.core.models import SchoolTerm
+from aleksis.core.models import Group, SchoolTerm
 from aleksis.core.util.core_helpers import get_site_preferences
 from aleksis.core.util.model_helpers import ICONS
 
@@ -192,6 +221,77 @@ class RegisterObjectRelatedMixin(WeekRelatedMixin):
         """Get the absolute url of the detail view for the related register object."""
         return self.register_object.get_alsijil_url(self.calendar_week)
 
+    def update_date_range(self: Union["LessonDocumentation", "PersonalNote"]):
+        """Update the stored start and end date from the related register object.
+
+        .. warning ::
+
+            This won't save the data, please execute ``save`` extra.
+        """
+        if self.event:
+            self.date_start = self.event.date_start
+            self.date_end = self.event.date_end
+        else:
+            self.date_start = self.date_end = self.date
+
+    def save(self: Union["LessonDocumentation", "PersonalNote"], *args, **kwargs):
+        self.update_date_range()
+        super().save(*args, **kwargs)
+
+
+class GroupMembershipSnapshot(ExtensibleModel):
+    """A deduplicated set of groups a person has been member of.
+
+    Snapshots are addressed by a hash of the sorted group IDs,
+    so all personal notes of persons with the same groups share one snapshot.
+    """
+
+    objects = GroupMembershipSnapshotManager.from_queryset(GroupMembershipSnapshotQuerySet)()
+
+    groups_hash = models.CharField(max_length=64, editable=False, verbose_name=_("Hash of groups"))
+    groups = models.ManyToManyField("core.Group", related_name="+", verbose_name=_("Groups"))
+
+    @staticmethod
+    def get_hash(group_pks: Iterable[int]) -> str:
+        """Get the hash of a set of group IDs."""
+        return sha256(",".join(str(pk) for pk in sorted(set(group_pks))).encode()).hexdigest()
+
+    def __str__(self) -> str:
+        return self.groups_hash
+
+    class Meta:
+        verbose_name = _("Group membership snapshot")
+        verbose_name_plural = _("Group membership snapshots")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("site_id", "groups_hash"), name="unique_group_membership_snapshot"
+            ),
+        ]
+
+
+class GroupsOfPerson:
+    """Access the groups of the membership snapshot of a personal note like a relation."""
+
+    def __init__(self, personal_note: "PersonalNote"):
+        self.personal_note = personal_note
+
+    def all(self) -> QuerySet:
+        snapshot = self.personal_note.groups_of_person_snapshot
+        if not snapshot:
+            return Group.objects.none()
+        return snapshot.groups.all()
+
+    def set(self, groups: Iterable):
+        """Set the groups by replacing the snapshot and save it directly."""
+        snapshot = GroupMembershipSnapshot.objects.get_for_groups(groups)
+        self.personal_note.groups_of_person_snapshot = snapshot
+        PersonalNote.objects.filter(pk=self.personal_note.pk).update(
+            groups_of_person_snapshot=snapshot
+        )
+
+    def clear(self):
+        self.set([])
+
 
 class PersonalNote(RegisterObjectRelatedMixin, ExtensibleModel):
     """A personal note about a single person.
@@ -210,7 +310,14 @@ class PersonalNote(RegisterObjectRelatedMixin, ExtensibleModel):
     objects = PersonalNoteManager.from_queryset(PersonalNoteQuerySet)()
 
     person = models.ForeignKey("core.Person", models.CASCADE, related_name="personal_notes")
-    groups_of_person = models.ManyToManyField("core.Group", related_name="+")
+    groups_of_person_snapshot = models.ForeignKey(
+        GroupMembershipSnapshot,
+        models.SET_NULL,
+        related_name="personal_notes",
+        blank=True,
+        null=True,
+        verbose_name=_("Groups of person"),
+    )
 
     week = models.IntegerField(blank=True, null=True)
     year = models.IntegerField(verbose_name=_("Year"), blank=True, null=True)
@@ -225,6 +332,11 @@ class PersonalNote(RegisterObjectRelatedMixin, ExtensibleModel):
         "chronos.ExtraLesson", models.CASCADE, related_name="personal_notes", blank=True, null=True
     )
 
+    date_start = models.DateField(
+        verbose_name=_("Start date"), blank=True, null=True, editable=False
+    )
+    date_end = models.DateField(verbose_name=_("End date"), blank=True, null=True, editable=False)
+
     absent = models.BooleanField(default=False)
     late = models.PositiveSmallIntegerField(default=0)
     excused = models.BooleanField(default=False)
@@ -236,14 +348,37 @@ class PersonalNote(RegisterObjectRelatedMixin, ExtensibleModel):
 
     extra_marks = models.ManyToManyField("ExtraMark", blank=True, verbose_name=_("Extra marks"))
 
-    def save(self, *args, **kwargs):
+    def normalize_absence(self):
+        """Make the excuse consistent with the absence.
+
+        Notes with an excuse type are excused, notes without an absence have no excuse.
+        Bulk writes, which skip ``save``, have to call this themselves.
+        """
         if self.excuse_type:
             self.excused = True
         if not self.absent:
             self.excused = False
             self.excuse_type = None
+
+    def save(self, *args, **kwargs):
+        self.normalize_absence()
+
+        old_snapshots = (
+            get_note_snapshots(PersonalNote.objects.filter(pk=self.pk)) if self.pk else {}
+        )
         super().save(*args, **kwargs)
 
+        # Extra marks are not changed by saving, so they can be taken from the old data
+        extra_mark_ids = old_snapshots.get(self.pk, {}).get("extra_marks", [])
+        update_statistics_for_notes(
+            old_snapshots, {self.pk: get_note_snapshot(self, extra_mark_ids)}
+        )
+
+    @property
+    def groups_of_person(self) -> GroupsOfPerson:
+        """Get the groups of the person at the time of the personal note."""
+        return GroupsOfPerson(self)
+
     def reset_values(self):
         """Reset all saved data to default values.
 
@@ -287,6 +422,207 @@ class PersonalNote(RegisterObjectRelatedMixin, ExtensibleModel):
                 name="unique_personal_note_per_object",
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=["lesson_period", "year", "week"], name="personal_note_lesson_week"
+            ),
+            models.Index(fields=["person", "year", "week"], name="personal_note_person_week"),
+            models.Index(
+                fields=["person", "excused"], condition=Q(absent=True), name="personal_note_absent"
+            ),
+            models.Index(fields=["person"], condition=Q(late__gt=0), name="personal_note_late"),
+            models.Index(fields=["person"], condition=~Q(remarks=""), name="personal_note_remarks"),
+            models.Index(fields=["person", "date_start"], name="personal_note_person_date"),
+            models.Index(fields=["date_start", "date_end"], name="personal_note_date_range"),
+        ]
+
+
+@receiver(models.signals.pre_delete, sender=PersonalNote)
+def remove_personal_note_from_statistics(sender, instance: PersonalNote, **kwargs):
+    """Remove the data of deleted personal notes from the materialized statistics."""
+    if is_bulk_statistics_update():
+        return
+
+    snapshots = get_note_snapshots(PersonalNote.objects.filter(pk=instance.pk))
+    update_statistics_for_notes(snapshots, {})
+
+
+@receiver(models.signals.m2m_changed, sender=PersonalNote.extra_marks.through)
+def update_statistics_on_extra_marks_changed(
+    sender, instance: models.Model, action: str, reverse: bool, pk_set: Optional[set], **kwargs
+):
+    """Keep the materialized statistics in sync with extra marks of personal notes."""
+    if action not in ("pre_clear", "pre_remove", "post_add"):
+        return
+
+    # Removals are handled before the relations are deleted, as ``pk_set`` may contain
+    # extra marks which aren't attached, only the attached ones must be removed
+    if reverse:
+        # The instance is an extra mark and the primary keys belong to personal notes
+        personal_notes = PersonalNote.objects.all()
+        if action != "pre_clear":
+            personal_notes = personal_notes.filter(pk__in=pk_set)
+        if action != "post_add":
+            personal_notes = personal_notes.filter(extra_marks=instance)
+        extra_mark_pks = {instance.pk}
+    else:
+        personal_notes = PersonalNote.objects.filter(pk=instance.pk)
+        if action == "post_add":
+            extra_mark_pks = pk_set
+        else:
+            extra_marks = instance.extra_marks.all()
+            if action == "pre_remove":
+                extra_marks = extra_marks.filter(pk__in=pk_set)
+            extra_mark_pks = set(extra_marks.values_list("pk", flat=True))
+        if not extra_mark_pks:
+            return
+    snapshots = get_note_snapshots(personal_notes, with_extra_marks=False)
+
+    # Only the changed extra marks have to be added to or removed from the statistics
+    changes = {
+        pk: dict(snapshot, absent=False, late=0, extra_marks=extra_mark_pks)
+        for pk, snapshot in snapshots.items()
+    }
+    if action == "post_add":
+        update_statistics_for_notes({}, changes)
+    else:
+        update_statistics_for_notes(changes, {})
+
+
+class PersonalNoteStatistics(ExtensibleModel):
+    """Materialized class register statistics of a person.
+
+    Holds the summed up personal notes of a person in all register objects
+    of a group (and its child groups) in a school term. The data are kept up to date
+    incrementally by the personal notes and can be rebuilt using the management command
+    ``rebuild_personal_note_statistics``.
+    """
+
+    person = models.ForeignKey(
+        "core.Person",
+        models.CASCADE,
+        related_name="personal_note_statistics",
+        verbose_name=_("Person"),
+    )
+    school_term = models.ForeignKey(
+        "core.SchoolTerm",
+        models.CASCADE,
+        related_name="+",
+        blank=True,
+        null=True,
+        verbose_name=_("School term"),
+    )
+    group = models.ForeignKey(
+        "core.Group", models.CASCADE, related_name="+", verbose_name=_("Group")
+    )
+
+    absences_count = models.IntegerField(default=0, verbose_name=_("Absences"))
+    excused = models.IntegerField(default=0, verbose_name=_("Excused absences"))
+    unexcused = models.IntegerField(default=0, verbose_name=_("Unexcused absences"))
+    tardiness = models.IntegerField(default=0, verbose_name=_("Tardiness"))
+    tardiness_count = models.IntegerField(default=0, verbose_name=_("Count of tardiness"))
+    extra_mark_counts = models.JSONField(default=dict, verbose_name=_("Extra marks"))
+    excuse_type_counts = models.JSONField(default=dict, verbose_name=_("Excuse types"))
+
+    def __str__(self) -> str:
+        return f"{self.person}, {self.group}, {self.school_term}"
+
+    class Meta:
+        verbose_name = _("Personal note statistics")
+        verbose_name_plural = _("Personal note statistics")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("person", "school_term", "group"), name="unique_statistics_per_group"
+            ),
+            models.UniqueConstraint(
+                fields=("person", "group"),
+                condition=Q(school_term__isnull=True),
+                name="unique_statistics_per_group_without_term",
+            ),
+        ]
+
+
+class RegisterObjectOccurrence(ExtensibleModel):
+    """Materialized occurrence of a register object on a single day.
+
+    There is one occurrence per lesson period and week of the validity range of its lesson,
+    one per extra lesson and one per day of an event. The occurrences are kept up to date
+    when lessons, substitutions or holidays change and can be rebuilt using the management
+    command ``rebuild_register_object_occurrences``.
+    """
+
+    lesson_period = models.ForeignKey(
+        "chronos.LessonPeriod",
+        models.CASCADE,
+        related_name="register_object_occurrences",
+        blank=True,
+        null=True,
+        verbose_name=_("Lesson period"),
+    )
+    event = models.ForeignKey(
+        "chronos.Event",
+        models.CASCADE,
+        related_name="register_object_occurrences",
+        blank=True,
+        null=True,
+        verbose_name=_("Event"),
+    )
+    extra_lesson = models.ForeignKey(
+        "chronos.ExtraLesson",
+        models.CASCADE,
+        related_name="register_object_occurrences",
+        blank=True,
+        null=True,
+        verbose_name=_("Extra lesson"),
+    )
+
+    year = models.IntegerField(verbose_name=_("Year"))
+    week = models.IntegerField(verbose_name=_("Week"))
+    date = models.DateField(verbose_name=_("Date"))
+
+    cancelled = models.BooleanField(default=False, verbose_name=_("Cancelled"))
+    substitution = models.ForeignKey(
+        "chronos.LessonSubstitution",
+        models.SET_NULL,
+        related_name="+",
+        blank=True,
+        null=True,
+        verbose_name=_("Substitution"),
+    )
+    holiday = models.ForeignKey(
+        "chronos.Holiday",
+        models.SET_NULL,
+        related_name="+",
+        blank=True,
+        null=True,
+        verbose_name=_("Holiday"),
+    )
+
+    @property
+    def register_object(self) -> Union[LessonPeriod, Event, ExtraLesson]:
+        return self.lesson_period or self.event or self.extra_lesson
+
+    def __str__(self) -> str:
+        return f"{self.register_object}, {date_format(self.date)}"
+
+    class Meta:
+        verbose_name = _("Register object occurrence")
+        verbose_name_plural = _("Register object occurrences")
+        ordering = ["date"]
+        indexes = [
+            models.Index(fields=["lesson_period", "year", "week"], name="occurrence_lesson_week"),
+            models.Index(fields=["event", "date"], name="occurrence_event_date"),
+            models.Index(fields=["extra_lesson"], name="occurrence_extra_lesson"),
+            models.Index(fields=["date"], name="occurrence_date"),
+        ]
+        constraints = [
+            CheckConstraint(
+                check=Q(lesson_period__isnull=False, event__isnull=True, extra_lesson__isnull=True)
+                | Q(lesson_period__isnull=True, event__isnull=False, extra_lesson__isnull=True)
+                | Q(lesson_period__isnull=True, event__isnull=True, extra_lesson__isnull=False),
+                name="one_relation_only_occurrence",
+            ),
+        ]
 
 
 class LessonDocumentation(RegisterObjectRelatedMixin, ExtensibleModel):
@@ -312,49 +648,76 @@ class LessonDocumentation(RegisterObjectRelatedMixin, ExtensibleModel):
         "chronos.ExtraLesson", models.CASCADE, related_name="documentations", blank=True, null=True
     )
 
+    date_start = models.DateField(
+        verbose_name=_("Start date"), blank=True, null=True, editable=False
+    )
+    date_end = models.DateField(verbose_name=_("End date"), blank=True, null=True, editable=False)
+
     topic = models.CharField(verbose_name=_("Lesson topic"), max_length=200, blank=True)
     homework = models.CharField(verbose_name=_("Homework"), max_length=200, blank=True)
     group_note = models.CharField(verbose_name=_("Group note"), max_length=200, blank=True)
 
     def _carry_over_data(self):
-        """Carry over data to directly adjacent periods in this lesson if data is not already set.
+        """Carry over data to all other periods of this lesson on the same day.
+
+        Data are only carried over to fields which are not already set.
+        All documentations of these periods are loaded in one query,
+        missing ones are created and changed ones are updated in bulk.
 
         Can be deactivated using site preference ``alsijil__carry_over``.
         """
-        all_periods_of_lesson = LessonPeriod.objects.filter(
-            lesson=self.lesson_period.lesson, period__weekday=self.lesson_period.period.weekday,
+        fields = ["topic", "homework", "group_note"]
+
+        period_pks = set(
+            LessonPeriod.objects.filter(
+                lesson_id=self.lesson_period.lesson_id,
+                period__weekday=self.lesson_period.period.weekday,
+            )
+            .exclude(pk=self.lesson_period_id)
+            .select_related(None)
+            .prefetch_related(None)
+            .values_list("pk", flat=True)
         )
-        for period in all_periods_of_lesson:
-            lesson_documentation = period.get_or_create_lesson_documentation(
-                CalendarWeek(week=self.week, year=self.year)
+        documentations = {
+            documentation.lesson_period_id: documentation
+            for documentation in LessonDocumentation.objects.filter(
+                lesson_period__in=period_pks, week=self.week, year=self.year
             )
+        }
+
+        new_documentations = []
+        changed_documentations = []
+        for period_pk in period_pks:
+            lesson_documentation = documentations.get(period_pk)
+            if not lesson_documentation:
+                lesson_documentation = LessonDocumentation(
+                    lesson_period_id=period_pk, week=self.week, year=self.year
+                )
+                new_documentations.append(lesson_documentation)
 
             changed = False
+            for field in fields:
+                if not getattr(lesson_documentation, field) and getattr(self, field):
+                    setattr(lesson_documentation, field, getattr(self, field))
+                    changed = True
 
-            if not lesson_documentation.topic:
-                lesson_documentation.topic = self.topic
-                changed = True
-
-            if not lesson_documentation.homework:
-                lesson_documentation.homework = self.homework
-                changed = True
-
-            if not lesson_documentation.group_note:
-                lesson_documentation.group_note = self.group_note
-                changed = True
+            if changed and lesson_documentation.pk:
+                changed_documentations.append(lesson_documentation)
 
-            if changed:
-                lesson_documentation.save(carry_over=False)
+        with transaction.atomic():
+            LessonDocumentation.objects.bulk_create(new_documentations)
+            # The documentations are added to an active revision by the queryset updates
+            LessonDocumentation.objects.bulk_update(changed_documentations, fields)
 
     def __str__(self) -> str:
         return f"{self.lesson_period}, {self.date_formatted}"
 
     def save(self, carry_over=True, *args, **kwargs):
         if (
-            get_site_preferences()["alsijil__carry_over"]
-            and (self.topic or self.homework or self.group_note)
+            carry_over
             and self.lesson_period
-            and carry_over
+            and (self.topic or self.homework or self.group_note)
+            and get_site_preferences()["alsijil__carry_over"]
         ):
             self._carry_over_data()
         super().save(*args, **kwargs)
@@ -377,6 +740,32 @@ class LessonDocumentation(RegisterObjectRelatedMixin, ExtensibleModel):
                 name="unique_documentation_per_object",
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=["lesson_period", "year", "week"],
+                condition=~Q(topic=""),
+                name="documentation_with_topic",
+            ),
+            models.Index(fields=["date_start", "date_end"], name="documentation_date_range"),
+        ]
+
+
+@receiver(models.signals.post_save, sender=PersonalNote)
+@receiver(models.signals.post_save, sender=LessonDocumentation)
+def register_saves_outside_of_revisions(sender, created: bool, **kwargs):
+    """Record saves of register data which can't be found through their revisions.
+
+    Created objects are found by incremental data checks by their primary keys.
+    """
+    if not created and not reversion.is_active():
+        register_unrevisioned_changes(sender)
+
+
+@receiver(models.signals.m2m_changed, sender=PersonalNote.extra_marks.through)
+def register_extra_marks_changes_outside_of_revisions(sender, action: str, **kwargs):
+    """Record changed extra marks of personal notes which can't be found through revisions."""
+    if action.startswith("post_") and not reversion.is_active():
+        register_unrevisioned_changes(PersonalNote)
 
 
 class ExtraMark(ExtensibleModel):
@@ -407,6 +796,26 @@ class ExtraMark(ExtensibleModel):
         ]
 
 
+@receiver(models.signals.pre_delete, sender=ExcuseType)
+def unset_excuse_type_in_statistics(sender, instance: ExcuseType, **kwargs):
+    """Unset the excuse type of personal notes before deletion to keep the statistics intact."""
+    PersonalNote.objects.filter(excuse_type=instance).update(excuse_type=None)
+
+
+@receiver(models.signals.post_save, sender=ExtraMark)
+@receiver(models.signals.post_delete, sender=ExtraMark)
+def invalidate_extra_marks_registry(sender, instance: ExtraMark, **kwargs):
+    """Reload the cached extra marks in all processes after a change."""
+    extra_marks_registry.invalidate(instance.site_id)
+
+
+@receiver(models.signals.post_save, sender=ExcuseType)
+@receiver(models.signals.post_delete, sender=ExcuseType)
+def invalidate_excuse_types_registry(sender, instance: ExcuseType, **kwargs):
+    """Reload the cached excuse types in all processes after a change."""
+    excuse_types_registry.invalidate(instance.site_id)
+
+
 class GroupRole(ExtensibleModel):
     objects = GroupRoleManager.from_queryset(GroupRoleQuerySet)()
 
@@ -475,3 +884,214 @@ class AlsijilGlobalPermissions(GlobalPermissionModel):
             ("register_absence", _("Can register absence")),
             ("list_personal_note_filters", _("Can list all personal note filters")),
         )
+
+
+@receiver(models.signals.post_save, sender=LessonPeriod)
+@receiver(models.signals.post_save, sender=ExtraLesson)
+@receiver(models.signals.post_save, sender=Event)
+def update_date_range_of_register_data(
+    sender, instance: models.Model, created: bool, raw: bool = False, **kwargs
+):
+    """Keep the stored dates of personal notes and documentations in sync with moved lessons."""
+    if created or raw:
+        return
+
+    for model in (PersonalNote, LessonDocumentation):
+        model.objects.filter(**{instance.label_: instance}).update_date_range()
+
+
+@receiver(models.signals.post_save, sender=TimePeriod)
+def update_date_range_of_register_data_by_period(
+    sender, instance: TimePeriod, created: bool, raw: bool = False, **kwargs
+):
+    """Keep the stored dates of personal notes and documentations in sync with moved periods."""
+    if created or raw:
+        return
+
+    for model in (PersonalNote, LessonDocumentation):
+        model.objects.filter(
+            Q(lesson_period__period=instance) | Q(extra_lesson__period=instance)
+        ).update_date_range()
+
+
+@receiver(models.signals.post_save, sender=LessonPeriod)
+@receiver(models.signals.post_save, sender=ExtraLesson)
+@receiver(models.signals.post_save, sender=Event)
+def update_occurrences_of_register_object(
+    sender, instance: models.Model, raw: bool = False, **kwargs
+):
+    """Rebuild the occurrences of a created or changed register object."""
+    if raw:
+        return
+
+    schedule_rebuild_of_occurrences(**{f"{instance.label_}s": [instance.pk]})
+
+
+@receiver(models.signals.post_save, sender=Lesson)
+def update_occurrences_of_lesson(
+    sender, instance: Lesson, created: bool, raw: bool = False, **kwargs
+):
+    """Rebuild the occurrences of all periods of a lesson with a possibly changed validity."""
+    if created or raw:
+        return
+
+    schedule_rebuild_of_occurrences(
+        lesson_periods=LessonPeriod.objects.filter(lesson=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(models.signals.post_save, sender=ValidityRange)
+def update_occurrences_of_validity_range(
+    sender, instance: ValidityRange, created: bool, raw: bool = False, **kwargs
+):
+    """Rebuild the occurrences of all lesson periods in a changed validity range."""
+    if created or raw:
+        return
+
+    schedule_rebuild_of_occurrences(
+        lesson_periods=LessonPeriod.objects.filter(lesson__validity=instance).values_list(
+            "pk", flat=True
+        )
+    )
+
+
+@receiver(models.signals.post_save, sender=TimePeriod)
+def update_occurrences_by_period(
+    sender, instance: TimePeriod, created: bool, raw: bool = False, **kwargs
+):
+    """Rebuild the occurrences of all lessons in a possibly moved period."""
+    if created or raw:
+        return
+
+    schedule_rebuild_of_occurrences(
+        lesson_periods=LessonPeriod.objects.filter(period=instance).values_list("pk", flat=True),
+        extra_lessons=ExtraLesson.objects.filter(period=instance).values_list("pk", flat=True),
+    )
+
+
+@receiver(models.signals.post_save, sender=LessonSubstitution)
+def update_occurrence_of_substitution(sender, instance: LessonSubstitution, **kwargs):
+    """Store the substitution and cancellation state of a lesson in its occurrence."""
+    update_occurrences_for_substitution(instance)
+
+
+@receiver(models.signals.post_delete, sender=LessonSubstitution)
+def reset_occurrence_of_substitution(sender, instance: LessonSubstitution, **kwargs):
+    """Reset the cancellation state of a lesson if its substitution was deleted."""
+    update_occurrences_for_substitution(instance, deleted=True)
+
+
+@receiver(models.signals.post_save, sender=Holiday)
+@receiver(models.signals.post_delete, sender=Holiday)
+def update_occurrences_on_holiday(sender, instance: Holiday, **kwargs):
+    """Assign the holidays to all occurrences in the date range of a changed holiday."""
+    update_holidays_of_occurrences(instance.date_start, instance.date_end, instance)
+
+
+# Fields deciding about the school term and the groups of personal notes in the statistics
+# and the lookups of the affected personal notes, per model
+_statistics_source_fields = {
+    LessonPeriod: ("lesson_id", "lesson_period"),
+    Lesson: ("validity_id", "lesson_period__lesson"),
+    ValidityRange: ("school_term_id", "lesson_period__lesson__validity"),
+    Event: ("school_term_id", "event"),
+    ExtraLesson: ("school_term_id", "extra_lesson"),
+}
+
+
+@receiver(models.signals.pre_save, sender=LessonPeriod)
+@receiver(models.signals.pre_save, sender=Lesson)
+@receiver(models.signals.pre_save, sender=ValidityRange)
+@receiver(models.signals.pre_save, sender=Event)
+@receiver(models.signals.pre_save, sender=ExtraLesson)
+def remember_statistics_source_of_register_object(
+    sender, instance: models.Model, raw: bool = False, **kwargs
+):
+    """Remember the stored school term or lesson of an object to detect changes after saving."""
+    if raw or instance._state.adding:
+        return
+
+    field, __ = _statistics_source_fields[sender]
+    instance._statistics_source = (
+        sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    )
+
+
+@receiver(models.signals.post_save, sender=LessonPeriod)
+@receiver(models.signals.post_save, sender=Lesson)
+@receiver(models.signals.post_save, sender=ValidityRange)
+@receiver(models.signals.post_save, sender=Event)
+@receiver(models.signals.post_save, sender=ExtraLesson)
+def update_statistics_on_changed_statistics_source(
+    sender, instance: models.Model, created: bool, raw: bool = False, **kwargs
+):
+    """Rebuild the statistics of persons in register objects moved to another school term."""
+    if created or raw or not hasattr(instance, "_statistics_source"):
+        return
+
+    field, lookup = _statistics_source_fields[sender]
+    if instance.__dict__.pop("_statistics_source") != getattr(instance, field):
+        schedule_rebuild_of_statistics(PersonalNote.objects.filter(**{lookup: instance}))
+
+
+@receiver(models.signals.m2m_changed, sender=Lesson.groups.through)
+@receiver(models.signals.m2m_changed, sender=Event.groups.through)
+@receiver(models.signals.m2m_changed, sender=ExtraLesson.groups.through)
+def update_statistics_on_groups_changed(
+    sender,
+    instance: models.Model,
+    action: str,
+    reverse: bool,
+    model: type,
+    pk_set: Optional[set],
+    **kwargs,
+):
+    """Rebuild the statistics of persons in register objects with changed groups."""
+    # Changes of many-to-many relations are wrapped in a transaction,
+    # so the rebuild scheduled before the change will run after it
+    if action not in ("pre_add", "pre_remove", "pre_clear"):
+        return
+
+    if reverse:
+        # Register objects were added to or removed from a group
+        register_objects = (
+            model.objects.filter(groups=instance)
+            if pk_set is None
+            else model.objects.filter(pk__in=pk_set)
+        )
+        register_model = model
+    else:
+        register_objects = [instance]
+        register_model = type(instance)
+
+    __, lookup = _statistics_source_fields[register_model]
+    schedule_rebuild_of_statistics(
+        PersonalNote.objects.filter(**{f"{lookup}__in": register_objects})
+    )
+
+
+@receiver(models.signals.m2m_changed, sender=Group.parent_groups.through)
+def update_statistics_on_parent_groups_changed(
+    sender, instance: Group, action: str, reverse: bool, pk_set: Optional[set], **kwargs,
+):
+    """Rebuild the statistics of persons in register objects of groups with changed parents."""
+    # Changes of many-to-many relations are wrapped in a transaction,
+    # so the rebuild scheduled before the change will run after it
+    if action not in ("pre_add", "pre_remove", "pre_clear"):
+        return
+
+    if reverse:
+        # Child groups were added to or removed from a group
+        groups = (
+            Group.objects.filter(parent_groups=instance).values("pk") if pk_set is None else pk_set
+        )
+    else:
+        groups = [instance.pk]
+
+    schedule_rebuild_of_statistics(
+        PersonalNote.objects.filter(
+            Q(lesson_period__lesson__groups__in=groups)
+            | Q(event__groups__in=groups)
+            | Q(extra_lesson__groups__in=groups)
+        )
+    )
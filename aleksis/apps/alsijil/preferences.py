@@ -1,11 +1,19 @@
 from django.core.exceptions import ValidationError
+from django.forms import SelectMultiple
 from django.utils.translation import gettext_lazy as _
 
 from dynamic_preferences.preferences import Section
-from dynamic_preferences.types import BooleanPreference, IntegerPreference
+from dynamic_preferences.types import (
+    BooleanPreference,
+    IntegerPreference,
+    MultipleChoicePreference,
+    StringPreference,
+)
 
 from aleksis.core.registries import person_preferences_registry, site_preferences_registry
 
+from .util.instrumentation import sinks
+
 alsijil = Section("alsijil", verbose_name=_("Class register"))
 
 
@@ -63,6 +71,18 @@ class CarryOverPersonalNotesToNextPeriods(BooleanPreference):
     verbose_name = _("Carry over personal notes to all following lesson periods on the same day.")
 
 
+@site_preferences_registry.register
+class SparsePersonalNotes(BooleanPreference):
+    section = alsijil
+    name = "sparse_personal_notes"
+    default = True
+    verbose_name = _("Only save personal notes which contain data")
+    help_text = _(
+        "If disabled, an empty personal note is saved for every person "
+        "when a lesson is opened for the first time."
+    )
+
+
 @site_preferences_registry.register
 class AllowOpenPeriodsOnSameDay(BooleanPreference):
     section = alsijil
@@ -132,3 +152,38 @@ class DefaultLessonDocumentationFilter(BooleanPreference):
     name = "default_lesson_documentation_filter"
     default = True
     verbose_name = _("Filter lessons by existence of their lesson documentation on default")
+
+
+@site_preferences_registry.register
+class Instrumentation(BooleanPreference):
+    section = alsijil
+    name = "instrumentation"
+    default = False
+    verbose_name = _("Measure the durations and queries of the class register views")
+    help_text = _("The data are sent to the selected instrumentation sinks.")
+
+
+@site_preferences_registry.register
+class InstrumentationSinks(MultipleChoicePreference):
+    section = alsijil
+    name = "instrumentation_sinks"
+    default = ["memory"]
+    widget = SelectMultiple
+    verbose_name = _("Instrumentation sinks")
+    field_attribute = {"initial": []}
+
+    def get_choices(self):
+        return [(name, sink.verbose_name) for name, sink in sinks.items()]
+
+
+@site_preferences_registry.register
+class InstrumentationMetricsToken(StringPreference):
+    section = alsijil
+    name = "instrumentation_metrics_token"
+    default = ""
+    required = False
+    verbose_name = _("Bearer token for the instrumentation metrics")
+    help_text = _(
+        "Scrapers can fetch the metrics of the memory sink with this token. "
+        "Leave empty to allow only users with the permission to view the system status."
+    )
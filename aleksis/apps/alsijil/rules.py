@@ -150,6 +150,10 @@ view_full_register_predicate = has_person & (
 )
 add_perm("alsijil.view_full_register_rule", view_full_register_predicate)
 
+# View full registers for all groups of a school term
+view_full_registers_predicate = has_person & has_global_perm("core.view_full_register")
+add_perm("alsijil.view_full_registers_rule", view_full_registers_predicate)
+
 # View students list
 view_my_students_predicate = has_person & is_teacher
 add_perm("alsijil.view_my_students_rule", view_my_students_predicate)
@@ -308,3 +312,6 @@ view_register_objects_list_predicate = has_person & (
     | has_global_perm("core.view_full_register")
 )
 add_perm("alsijil.view_register_objects_list_rule", view_register_objects_list_predicate)
+
+view_instrumentation_metrics_predicate = has_person & has_global_perm("core.view_system_status")
+add_perm("alsijil.view_instrumentation_metrics_rule", view_instrumentation_metrics_predicate)
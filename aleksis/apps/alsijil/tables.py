@@ -1,14 +1,17 @@
 from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
 import django_tables2 as tables
-from django_tables2.utils import A
+from django_tables2.data import TableListData
+from django_tables2.utils import A, OrderBy
 
 from aleksis.apps.chronos.models import Event, LessonPeriod
 from aleksis.core.util.tables import SelectColumn
 
 from .models import PersonalNote
+from .util.alsijil_helpers import RegisterObjectList
 
 
 class ExtraMarkTable(tables.Table):
@@ -167,6 +170,27 @@ class PersonalNoteTable(tables.Table):
         fields = ()
 
 
+class RegisterObjectTableData(TableListData):
+    """Table data which keep a ``RegisterObjectList`` lazy.
+
+    The list is passed as it is instead of being converted to a list.
+    Ordering by a column which needs data that are not available before materialization
+    loads the data of all entries first.
+    """
+
+    def order_by(self, aliases):
+        if isinstance(self.data, RegisterObjectList):
+            for alias in aliases:
+                bound_column = self.table.columns[OrderBy(alias).bare]
+                if any(
+                    A(order_by.bare).bits[0] not in RegisterObjectList.SORT_KEYS
+                    for order_by in bound_column.order_by
+                ):
+                    self.data.materialize_all()
+                    break
+        super().order_by(aliases)
+
+
 def _get_link(value, record):
     return record["register_object"].get_alsijil_url(record.get("week"))
 
@@ -191,6 +215,9 @@ class RegisterObjectTable(tables.Table):
     homework = tables.Column(linkify=_get_link)
     group_note = tables.Column(linkify=_get_link)
 
+    def __init__(self, data, *args, **kwargs):
+        super().__init__(RegisterObjectTableData(data), *args, **kwargs)
+
     def render_status(self, value, record):
         return render_to_string(
             "alsijil/partials/lesson_status_icon.html",
@@ -213,3 +240,36 @@ class RegisterObjectSelectTable(RegisterObjectTable):
 
     class Meta(RegisterObjectTable.Meta):
         sequence = ("selected", "...")
+
+
+class MissingDocumentationTable(tables.Table):
+    """Table to show the numbers of missing lesson documentations.
+
+    .. warning::
+        Works only with ``MissingDocumentationReport``.
+    """
+
+    class Meta:
+        attrs = {"class": "highlight"}
+        orderable = False
+
+    object = tables.Column()
+    missing = tables.Column(verbose_name=_("Lessons without documentation"))
+
+    def __init__(self, data, *args, **kwargs):
+        # Keep the report lazy, so only the current page is loaded
+        super().__init__(TableListData(data), *args, **kwargs)
+
+
+class TeacherMissingDocumentationTable(MissingDocumentationTable):
+    object = tables.Column(
+        verbose_name=_("Teacher"),
+        linkify=lambda value: reverse("week_view", args=["teacher", value.pk]),
+    )
+
+
+class GroupMissingDocumentationTable(MissingDocumentationTable):
+    object = tables.Column(
+        verbose_name=_("Group"),
+        linkify=lambda value: reverse("week_view", args=["group", value.pk]),
+    )
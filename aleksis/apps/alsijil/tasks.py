@@ -0,0 +1,108 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tempfile import TemporaryDirectory
+from typing import Optional, Sequence
+from urllib.parse import urljoin
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.text import slugify
+from django.utils.translation import get_language
+from django.utils.translation import gettext as _
+from django.utils.translation import override
+
+from celery_progress.backend import ProgressRecorder
+
+from aleksis.core.models import Group, PDFFile, SchoolTerm
+from aleksis.core.util.celery_progress import recorded_task
+from aleksis.core.util.pdf import generate_pdf
+
+from .util.full_register import get_full_register_context, get_full_register_lookups
+
+
+def _print_html_file(file_pk: int, html_url: str, lang: str) -> None:
+    """Print the HTML file of a PDF file object using the PDF generation of AlekSIS-Core."""
+    try:
+        generate_pdf.apply(args=(file_pk, html_url), kwargs={"lang": lang}, throw=True)
+    finally:
+        # Each thread of the executor opens its own database connection
+        connection.close()
+
+
+@recorded_task
+def generate_full_registers(
+    file_pk: int,
+    school_term_pk: int,
+    group_pks: Sequence[int],
+    recorder: ProgressRecorder,
+    lang: Optional[str] = None,
+    max_workers: Optional[int] = None,
+):
+    """Generate the full registers of multiple groups of a school term as a ZIP file.
+
+    All data which are the same for all groups are only loaded once.
+    The PDF files are printed in parallel using the PDF generation of AlekSIS-Core.
+    """
+    file_object = get_object_or_404(PDFFile, pk=file_pk)
+    school_term = get_object_or_404(SchoolTerm, pk=school_term_pk)
+    groups = list(Group.objects.filter(pk__in=group_pks, school_term=school_term).order_by("name"))
+    lang = lang or get_language()
+
+    # Render the HTML for all groups (first half) and print them to PDF files (second half)
+    total = len(groups) * 2
+    recorder.set_progress(0, total)
+
+    with override(lang):
+        lookups = get_full_register_lookups(school_term)
+        html_files = []
+        for i, group in enumerate(groups):
+            context = get_full_register_context(group, lookups)
+            html_template = render_to_string("alsijil/print/full_register.html", context)
+            html_files.append(
+                PDFFile.objects.create(
+                    person=file_object.person,
+                    html_file=ContentFile(html_template, name="source.html"),
+                )
+            )
+            recorder.set_progress(i + 1)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _print_html_file,
+                html_file.pk,
+                urljoin(settings.BASE_URL, html_file.html_file.url),
+                lang,
+            )
+            for html_file in html_files
+        ]
+        for i, future in enumerate(as_completed(futures)):
+            future.result()
+            recorder.set_progress(len(groups) + i + 1)
+
+    with TemporaryDirectory() as temp_dir:
+        zip_path = os.path.join(temp_dir, "full_registers.zip")
+        with ZipFile(zip_path, "w", ZIP_DEFLATED) as zip_file:
+            for group, html_file in zip(groups, html_files):
+                # The single PDF files were saved to the file objects by the PDF generation
+                html_file.refresh_from_db()
+                pdf_name = f"{slugify(group.short_name or group.name)}-{group.pk}.pdf"
+                with html_file.file.open("rb") as f:
+                    zip_file.writestr(pdf_name, f.read())
+
+        # Upload ZIP file to media storage
+        with open(zip_path, "rb") as f:
+            file_object.file.save(f"full_registers_{slugify(school_term.name)}.zip", File(f))
+            file_object.save()
+
+    recorder.set_progress(total, total)
+    recorder.add_message(
+        messages.SUCCESS,
+        _("The full registers of {} groups have been generated.").format(len(groups)),
+    )
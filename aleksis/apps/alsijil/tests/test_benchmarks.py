@@ -0,0 +1,133 @@
+import os
+from typing import Any, Dict
+
+from django.db import transaction
+from django.forms import BaseForm, BaseFormSet
+from django.urls import reverse
+
+import pytest
+from cachalot.api import cachalot_disabled
+from calendarweek import CalendarWeek
+
+from aleksis.apps.alsijil.util.alsijil_helpers import generate_list_of_all_register_objects
+from aleksis.apps.alsijil.util.full_register import get_full_register_context
+from aleksis.apps.alsijil.util.registries import reset_registries
+from aleksis.apps.alsijil.util.synthetic_data import SCALES, create_benchmark_user, seed_school
+from aleksis.apps.chronos.util.date import week_weekday_to_date
+
+# The benchmarks are deselected by default, run them with ``pytest -m benchmark``
+pytestmark = [pytest.mark.django_db, pytest.mark.benchmark]
+
+SCALE = SCALES[os.environ.get("TEST_BENCHMARK_SCALE", "small")]
+
+
+def _get_form_data(form: BaseForm) -> Dict[str, Any]:
+    """Get the data a browser would submit for an unchanged form."""
+    data = {}
+    for bound_field in form:
+        value = bound_field.value()
+        if value is None or value is False:
+            continue
+        data[bound_field.html_name] = "on" if value is True else value
+    return data
+
+
+def _get_formset_data(formset: BaseFormSet) -> Dict[str, Any]:
+    data = _get_form_data(formset.management_form)
+    for form in formset:
+        data.update(_get_form_data(form))
+    return data
+
+
+@pytest.fixture(scope="module")
+def school(django_db_setup, django_db_blocker):
+    # The synthetic school is shared by all benchmarks and rolled back afterwards,
+    # the real queries are measured instead of hits of the query cache
+    with django_db_blocker.unblock(), cachalot_disabled():
+        with transaction.atomic():
+            yield seed_school(SCALE)
+            transaction.set_rollback(True)
+    reset_registries()
+
+
+@pytest.fixture
+def school_client(client, school):
+    client.force_login(create_benchmark_user(school))
+    return client
+
+
+@pytest.fixture
+def week(school):
+    return CalendarWeek.from_date(school.school_term.date_start)
+
+
+def _get(client, url: str):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response
+
+
+def test_week_view_group(benchmark, school_client, school, week):
+    url = reverse("week_view_by_week", args=[week.year, week.week, "group", school.classes[0].pk])
+    benchmark(_get, school_client, url)
+
+
+def test_week_view_teacher(benchmark, school_client, school, week):
+    teacher = school.lesson_periods[0].lesson.teachers.first()
+    url = reverse("week_view_by_week", args=[week.year, week.week, "teacher", teacher.pk])
+    benchmark(_get, school_client, url)
+
+
+def test_register_object_get(benchmark, school_client, school, week):
+    url = reverse("lesson_period", args=[week.year, week.week, school.lesson_periods[0].pk])
+    benchmark(_get, school_client, url)
+
+
+def test_register_object_post(benchmark, school_client, school, week):
+    url = reverse("lesson_period", args=[week.year, week.week, school.lesson_periods[0].pk])
+
+    # Submit the unchanged forms with one absence to exercise the saving of personal notes
+    response = _get(school_client, url)
+    data = _get_form_data(response.context["lesson_documentation_form"])
+    data["lesson_documentation-topic"] = "Synthetic topic"
+    formset = response.context["personal_note_formset"]
+    data.update(_get_formset_data(formset))
+    if formset.forms:
+        data[formset.forms[0].add_prefix("absent")] = "on"
+
+    def post():
+        response = school_client.post(url, data)
+        assert response.status_code == 200
+
+    benchmark(post)
+
+
+def test_overview_person(benchmark, school_client, school):
+    student = school.classes[0].members.first()
+    benchmark(_get, school_client, reverse("overview_person", args=[student.pk]))
+
+
+def test_full_register_group(benchmark, school):
+    benchmark(get_full_register_context, school.classes[0])
+
+
+def test_generate_list_of_all_register_objects(benchmark, school):
+    school_term = school.school_term
+
+    def list_register_objects():
+        register_objects = generate_list_of_all_register_objects(
+            {
+                "school_term": school_term,
+                "date_start": school_term.date_start,
+                "date_end": school_term.date_end,
+            }
+        )
+        return len(register_objects), register_objects[:50]
+
+    benchmark(list_register_objects)
+
+
+def test_mark_absent(benchmark, school, week):
+    student = school.classes[0].members.first()
+    day = week_weekday_to_date(week, school.lesson_periods[0].period.weekday)
+    benchmark(student.mark_absent, day)
@@ -0,0 +1,34 @@
+import pytest
+from cachalot.api import cachalot_disabled
+
+from aleksis.apps.alsijil.util.query_budget import get_view_budgets, record_view_queries
+from aleksis.apps.alsijil.util.synthetic_data import SCALES, get_grown_scale
+
+pytestmark = pytest.mark.django_db
+
+# The smaller school has to contain data for all code paths of the views,
+# e. g. events in the checked week, so the query counts only differ by growing data
+SCALE = SCALES["small"]
+FACTOR = 2
+
+BUDGETS = get_view_budgets()
+
+
+@pytest.fixture(scope="module")
+def recorded_queries(django_db_setup, django_db_blocker):
+    # The synthetic data are rolled back after recording
+    with django_db_blocker.unblock(), cachalot_disabled():
+        small = record_view_queries(SCALE, None, BUDGETS)
+        large = record_view_queries(get_grown_scale(SCALE, FACTOR), None, BUDGETS)
+    return small, large
+
+
+@pytest.mark.parametrize("url_name", sorted(BUDGETS))
+def test_query_budget(recorded_queries, url_name):
+    (small_recorders, small_size), (large_recorders, large_size) = recorded_queries
+    small, large = small_recorders[url_name], large_recorders[url_name]
+    if small is None or large is None:
+        pytest.skip("No URL for synthetic data")
+
+    violation = BUDGETS[url_name].get_violation(len(small), small_size, len(large), large_size)
+    assert violation is None, f"{violation}\n{large.get_report(compare_to=small)}"
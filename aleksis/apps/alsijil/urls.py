@@ -28,6 +28,9 @@ urlpatterns = [
         name="week_view_by_week",
     ),
     path("print/group/<int:id_>", views.full_register_group, name="full_register_group"),
+    path(
+        "print/school_term/", views.full_registers_school_term, name="full_registers_school_term",
+    ),
     path("groups/", views.my_groups, name="my_groups"),
     path("groups/<int:pk>/", views.StudentsList.as_view(), name="students_list"),
     path("persons/", views.my_students, name="my_students"),
@@ -101,4 +104,8 @@ urlpatterns = [
         name="assign_group_role_multiple",
     ),
     path("all/", views.AllRegisterObjectsView.as_view(), name="all_register_objects"),
+    path(
+        "all/missing_documentations/", views.missing_documentations, name="missing_documentations",
+    ),
+    path("instrumentation/metrics/", views.instrumentation_metrics, name="instrumentation_metrics"),
 ]
@@ -1,9 +1,22 @@
+from copy import copy
 from datetime import date
 from operator import itemgetter
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 from django.db.models.expressions import Exists, OuterRef
-from django.db.models.query import Prefetch, QuerySet
+from django.db.models.query import Prefetch, QuerySet, prefetch_related_objects
 from django.db.models.query_utils import Q
 from django.http import HttpRequest
 from django.utils.formats import date_format
@@ -12,9 +25,16 @@ from django.utils.translation import gettext as _
 from calendarweek import CalendarWeek
 
 from aleksis.apps.alsijil.forms import FilterRegisterObjectForm
-from aleksis.apps.alsijil.models import LessonDocumentation
-from aleksis.apps.chronos.models import Event, ExtraLesson, Holiday, LessonPeriod
+from aleksis.apps.alsijil.models import LessonDocumentation, PersonalNote
+from aleksis.apps.chronos.models import (
+    Event,
+    ExtraLesson,
+    Holiday,
+    LessonPeriod,
+    LessonSubstitution,
+)
 from aleksis.apps.chronos.util.chronos_helpers import get_el_by_pk
+from aleksis.apps.chronos.util.date import week_weekday_to_date
 
 
 def get_register_object_by_pk(
@@ -75,6 +95,10 @@ def annotate_documentations(
         prefetch = Prefetch("documentations")
     instances = klass.objects.prefetch_related(prefetch).filter(pk__in=pks)
 
+    if klass == LessonPeriod:
+        # Load subjects of substitutions together with the substitutions
+        instances = instances.prefetch_related("substitutions__subject")
+
     if klass == LessonPeriod:
         instances = instances.annotate_week(wanted_week)
     elif klass in (LessonPeriod, ExtraLesson):
@@ -93,6 +117,36 @@ def annotate_documentations(
     return instances
 
 
+def annotate_subject(register_object: Union[LessonPeriod, Event, ExtraLesson]) -> None:
+    """Annotate a register object with its (possibly substituted) subject.
+
+    Attribute name: ``annotated_subject``
+
+    This prevents templates from resolving the substitution for every access to the subject.
+
+    .. note::
+        For events, this will annotate ``None``.
+    """
+    if hasattr(register_object, "get_subject"):
+        register_object.annotated_subject = register_object.get_subject()
+    else:
+        register_object.annotated_subject = None
+
+
+def get_register_data_key(
+    obj: Union[LessonDocumentation, PersonalNote]
+) -> Tuple[Union[str, int], ...]:
+    """Get a hashable key for the register object of a lesson documentation or personal note.
+
+    For lesson periods, the key also contains the year and the week.
+    """
+    if obj.lesson_period_id:
+        return ("lesson_period", obj.lesson_period_id, obj.year, obj.week)
+    elif obj.event_id:
+        return ("event", obj.event_id)
+    return ("extra_lesson", obj.extra_lesson_id)
+
+
 def register_objects_sorter(register_object: Union[LessonPeriod, Event, ExtraLesson]) -> int:
     """Sort key for sorted/sort for sorting a list of class register objects.
 
@@ -159,16 +213,222 @@ def _filter_register_objects_by_dict(
     return register_objects
 
 
-def _generate_dicts_for_lesson_periods(
-    filter_dict: Dict[str, Any],
-    lesson_periods: QuerySet[LessonPeriod],
-    documentations: Optional[Iterable[LessonDocumentation]] = None,
-    holiday_days: Optional[Sequence[date]] = None,
-) -> List[Dict[str, Any]]:
-    """Generate a list of dicts for use with ``RegisterObjectTable``."""
-    if not holiday_days:
-        holiday_days = []
-    lesson_periods = list(lesson_periods)
+class RegisterObjectEntry(dict):
+    """Entry of a ``RegisterObjectList`` for use with ``RegisterObjectTable``.
+
+    Initially, an entry only contains the data needed for sorting and filtering.
+    All other data are loaded by the list on first access to a missing key.
+    """
+
+    def __init__(self, register_object_list: "RegisterObjectList", *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.register_object_list = register_object_list
+        self.materialized = False
+
+    def __missing__(self, key: str) -> Any:
+        if not self.materialized:
+            self.register_object_list.materialize([self])
+            if key in self:
+                return self[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class RegisterObjectList(Sequence):
+    """Lazy list of register objects for use with ``RegisterObjectTable``.
+
+    The list knows the number of entries and can be sorted by date and period without
+    loading substitutions, teachers, groups or lesson documentations. These data are only
+    loaded for the entries which are actually accessed, e. g. for the current page of a table.
+    """
+
+    #: Keys which are available without materializing an entry
+    SORT_KEYS = ("pk", "week", "register_object", "has_documentation", "date_sort", "period_sort")
+
+    #: Number of entries which are materialized at once by ``materialize_all``
+    BATCH_SIZE = 500
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, **data) -> None:
+        """Add an entry with the data needed for sorting (see ``SORT_KEYS``)."""
+        self.entries.append(RegisterObjectEntry(self, **data))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(
+        self, key: Union[int, slice]
+    ) -> Union[RegisterObjectEntry, List[RegisterObjectEntry]]:
+        if isinstance(key, slice):
+            entries = self.entries[key]
+            self.materialize(entries)
+            return entries
+        entry = self.entries[key]
+        self.materialize([entry])
+        return entry
+
+    def __iter__(self) -> Iterator[RegisterObjectEntry]:
+        # Iterating does not materialize the entries, so that e. g. collecting all keys is cheap
+        return iter(self.entries)
+
+    def sort(self, key: Optional[Callable] = None, reverse: bool = False) -> None:
+        """Sort the entries in place like ``list.sort``."""
+        self.entries.sort(key=key, reverse=reverse)
+
+    def materialize_all(self) -> None:
+        """Load the data of all entries in batches."""
+        for i in range(0, len(self.entries), self.BATCH_SIZE):
+            self.materialize(self.entries[i : i + self.BATCH_SIZE])
+
+    def materialize(self, entries: Sequence[RegisterObjectEntry]) -> None:
+        """Load substitutions, related data and lesson documentations for some entries."""
+        entries = [entry for entry in entries if not entry.materialized]
+        if not entries:
+            return
+
+        lesson_period_entries = []
+        other_entries = []
+        for entry in entries:
+            if isinstance(entry["register_object"], LessonPeriod):
+                # Use a copy per week so substitutions are resolved for the week of the entry
+                lesson_period = copy(entry["register_object"])
+                lesson_period.annotate_week(entry["week"])
+                entry["register_object"] = lesson_period
+                lesson_period_entries.append(entry)
+            else:
+                other_entries.append(entry)
+
+        # Only load the substitutions in the weeks of the entries
+        prefetch_related_objects(
+            [entry["register_object"] for entry in lesson_period_entries],
+            "lesson__groups",
+            "lesson__teachers",
+            Prefetch(
+                "substitutions",
+                queryset=LessonSubstitution.objects.filter(
+                    _get_weeks_q(entry["week"] for entry in lesson_period_entries)
+                )
+                .select_related("subject")
+                .prefetch_related("teachers"),
+            ),
+        )
+        # Related objects can only be prefetched for instances of the same model
+        for model in (Event, ExtraLesson):
+            prefetch_related_objects(
+                [
+                    entry["register_object"]
+                    for entry in other_entries
+                    if isinstance(entry["register_object"], model)
+                ],
+                "groups",
+                "teachers",
+            )
+
+        documentations = LessonDocumentation.objects.not_empty().filter(
+            (
+                Q(
+                    lesson_period__in={
+                        entry["register_object"].pk for entry in lesson_period_entries
+                    }
+                )
+                & _get_weeks_q(entry["week"] for entry in lesson_period_entries)
+            )
+            | Q(
+                event__in={
+                    entry["register_object"].pk
+                    for entry in other_entries
+                    if isinstance(entry["register_object"], Event)
+                }
+            )
+            | Q(
+                extra_lesson__in={
+                    entry["register_object"].pk
+                    for entry in other_entries
+                    if isinstance(entry["register_object"], ExtraLesson)
+                }
+            )
+        )
+        documentations_by_key = {get_register_data_key(doc): doc for doc in documentations}
+
+        for entry in lesson_period_entries:
+            lesson_period = entry["register_object"]
+            entry.update(
+                {
+                    "substitution": lesson_period.get_substitution(),
+                    "date": date_format(entry["date_sort"]),
+                    "period": f"{lesson_period.period.period}.",
+                    "groups": lesson_period.lesson.group_names,
+                    "teachers": lesson_period.teacher_names,
+                    "subject": lesson_period.get_subject().name,
+                }
+            )
+
+        for entry in other_entries:
+            register_object = entry["register_object"]
+            if isinstance(register_object, ExtraLesson):
+                day = date_format(entry["date_sort"])
+                period = f"{register_object.period.period}."
+            else:
+                register_object.annotate_day(register_object.date_end)
+                day = (
+                    f"{date_format(register_object.date_start)}"
+                    f"–{date_format(register_object.date_end)}"
+                )
+                period = (
+                    f"{register_object.period_from.period}.–{register_object.period_to.period}."
+                )
+            entry.update(
+                {
+                    "date": day,
+                    "period": period,
+                    "groups": register_object.group_names,
+                    "teachers": register_object.teacher_names,
+                    "subject": register_object.subject.name
+                    if isinstance(register_object, ExtraLesson)
+                    else _("Event"),
+                }
+            )
+
+        for entry in entries:
+            doc = documentations_by_key.get(_get_entry_key(entry))
+            if doc and entry["has_documentation"]:
+                entry["topic"] = doc.topic
+                entry["homework"] = doc.homework
+                entry["group_note"] = doc.group_note
+            entry.materialized = True
+
+
+def _get_entry_key(entry: RegisterObjectEntry) -> Tuple[Union[str, int], ...]:
+    """Get the same key for an entry as ``get_register_data_key`` for its data."""
+    register_object = entry["register_object"]
+    if isinstance(register_object, LessonPeriod):
+        return ("lesson_period", register_object.pk, entry["week"].year, entry["week"].week)
+    return (register_object.label_, register_object.pk)
+
+
+def _get_weeks_q(weeks: Iterable[CalendarWeek]) -> Q:
+    """Build a filter for objects with ``year`` and ``week`` fields in some calendar weeks."""
+    week_numbers_by_year = {}
+    for week in weeks:
+        week_numbers_by_year.setdefault(week.year, set()).add(week.week)
+
+    q = Q(pk__in=[])
+    for year, week_numbers in week_numbers_by_year.items():
+        q |= Q(year=year, week__in=week_numbers)
+    return q
+
+
+def _get_weeks_for_lesson_periods(
+    filter_dict: Dict[str, Any], lesson_periods: Sequence[LessonPeriod]
+) -> List[CalendarWeek]:
+    """Get all calendar weeks in the filter range and the validity ranges of the lesson periods."""
     date_start = lesson_periods[0].lesson.validity.date_start
     date_end = lesson_periods[-1].lesson.validity.date_end
     if (
@@ -183,10 +443,43 @@ def _generate_dicts_for_lesson_periods(
         and filter_dict.get("date_end") > date_start
     ):
         date_end = filter_dict.get("date_end")
-    weeks = CalendarWeek.weeks_within(date_start, date_end)
+    return CalendarWeek.weeks_within(date_start, date_end)
+
+
+def _add_lesson_periods(
+    register_objects: RegisterObjectList,
+    filter_dict: Dict[str, Any],
+    lesson_periods: Sequence[LessonPeriod],
+    weeks: Sequence[CalendarWeek],
+    documentation_keys: Set[Tuple[Union[str, int], ...]],
+    holiday_days: Optional[Iterable[date]] = None,
+) -> None:
+    """Add an entry for every lesson period in every week of the filter range."""
+    holiday_days = set(holiday_days or [])
+
+    # Substitutions are only needed for filtering by person or subject,
+    # so only the subjects of the substitutions in the filter range are indexed here
+    substitution_subjects = {}
+    person_lesson_period_pks = set()
+    if filter_dict.get("person") or filter_dict.get("subject"):
+        for lesson_period_id, year, week, subject_id in (
+            LessonSubstitution.objects.filter(lesson_period__in=lesson_periods)
+            .filter(_get_weeks_q(weeks))
+            .values_list("lesson_period_id", "year", "week", "subject_id")
+        ):
+            substitution_subjects[(lesson_period_id, year, week)] = subject_id
+    if filter_dict.get("person"):
+        person_lesson_pks = set(
+            filter_dict["person"].lessons_as_teacher.values_list("pk", flat=True)
+        )
+        person_lesson_period_pks = {
+            lesson_period.pk
+            for lesson_period in lesson_periods
+            if lesson_period.lesson_id in person_lesson_pks
+        }
 
-    register_objects = []
     for lesson_period in lesson_periods:
+        validity = lesson_period.lesson.validity
         for week in weeks:
             day = week[lesson_period.period.weekday]
 
@@ -194,89 +487,60 @@ def _generate_dicts_for_lesson_periods(
             if day in holiday_days:
                 continue
             # Ensure that the lesson period is in filter range and validity range
-            if (
-                lesson_period.lesson.validity.date_start
-                <= day
-                <= lesson_period.lesson.validity.date_end
-            ) and (
-                not filter_dict.get("filter_date")
-                or (filter_dict.get("date_start") <= day <= filter_dict.get("date_end"))
+            if not (validity.date_start <= day <= validity.date_end) or (
+                filter_dict.get("filter_date")
+                and not (filter_dict.get("date_start") <= day <= filter_dict.get("date_end"))
             ):
-                sub = lesson_period.get_substitution()
+                continue
 
-                # Skip lesson period if the person isn't a teacher
-                # or substitution teacher of this lesson period
-                if filter_dict.get("person") and (
-                    filter_dict.get("person") not in lesson_period.lesson.teachers.all() and not sub
-                ):
-                    continue
+            substitution_key = (lesson_period.pk, week.year, week.week)
 
-                teachers = lesson_period.teacher_names
-                if (
-                    filter_dict.get("subject")
-                    and filter_dict.get("subject") != lesson_period.get_subject()
-                ):
-                    continue
+            # Skip lesson period if the person isn't a teacher
+            # or substitution teacher of this lesson period
+            if (
+                filter_dict.get("person")
+                and lesson_period.pk not in person_lesson_period_pks
+                and substitution_key not in substitution_subjects
+            ):
+                continue
 
-                # Filter matching documentations and annotate if they exist
-                filtered_documentations = list(
-                    filter(
-                        lambda d: d.week == week.week
-                        and d.year == week.year
-                        and d.lesson_period_id == lesson_period.pk,
-                        documentations
-                        if documentations is not None
-                        else lesson_period.documentations.all(),
-                    )
+            if filter_dict.get("subject"):
+                subject_id = (
+                    substitution_subjects.get(substitution_key) or lesson_period.lesson.subject_id
                 )
-                has_documentation = bool(filtered_documentations)
-
-                if filter_dict.get(
-                    "has_documentation"
-                ) is not None and has_documentation != filter_dict.get("has_documentation"):
+                if filter_dict.get("subject").pk != subject_id:
                     continue
 
-                # Build table entry
-                entry = {
-                    "pk": f"lesson_period_{lesson_period.pk}_{week.year}_{week.week}",
-                    "week": week,
-                    "has_documentation": has_documentation,
-                    "substitution": sub,
-                    "register_object": lesson_period,
-                    "date": date_format(day),
-                    "date_sort": day,
-                    "period": f"{lesson_period.period.period}.",
-                    "period_sort": lesson_period.period.period,
-                    "groups": lesson_period.lesson.group_names,
-                    "teachers": teachers,
-                    "subject": lesson_period.get_subject().name,
-                }
-                if has_documentation:
-                    doc = filtered_documentations[0]
-                    entry["topic"] = doc.topic
-                    entry["homework"] = doc.homework
-                    entry["group_note"] = doc.group_note
-                register_objects.append(entry)
-    return register_objects
+            has_documentation = (
+                "lesson_period",
+                lesson_period.pk,
+                week.year,
+                week.week,
+            ) in documentation_keys
+            if filter_dict.get(
+                "has_documentation"
+            ) is not None and has_documentation != filter_dict.get("has_documentation"):
+                continue
+
+            register_objects.add(
+                pk=f"lesson_period_{lesson_period.pk}_{week.year}_{week.week}",
+                week=week,
+                has_documentation=has_documentation,
+                register_object=lesson_period,
+                date_sort=day,
+                period_sort=lesson_period.period.period,
+            )
 
 
-def _generate_dicts_for_events_and_extra_lessons(
+def _add_events_and_extra_lessons(
+    register_objects: RegisterObjectList,
     filter_dict: Dict[str, Any],
     register_objects_start: Sequence[Union[Event, ExtraLesson]],
-    documentations: Optional[Iterable[LessonDocumentation]] = None,
-) -> List[Dict[str, Any]]:
-    """Generate a list of dicts for use with ``RegisterObjectTable``."""
-    register_objects = []
+    documentation_keys: Set[Tuple[Union[str, int], ...]],
+) -> None:
+    """Add an entry for every event and extra lesson."""
     for register_object in register_objects_start:
-        filtered_documentations = list(
-            filter(
-                lambda d: getattr(d, f"{register_object.label_}_id") == register_object.pk,
-                documentations
-                if documentations is not None
-                else register_object.documentations.all(),
-            )
-        )
-        has_documentation = bool(filtered_documentations)
+        has_documentation = (register_object.label_, register_object.pk) in documentation_keys
 
         if filter_dict.get(
             "has_documentation"
@@ -284,46 +548,25 @@ def _generate_dicts_for_events_and_extra_lessons(
             continue
 
         if isinstance(register_object, ExtraLesson):
-            day = date_format(register_object.day)
-            day_sort = register_object.day
-            period = f"{register_object.period.period}."
+            # The day is only aliased in the queries of extra lessons
+            day_sort = week_weekday_to_date(
+                register_object.calendar_week, register_object.period.weekday
+            )
             period_sort = register_object.period.period
         else:
-            register_object.annotate_day(register_object.date_end)
-            day = (
-                f"{date_format(register_object.date_start)}"
-                f"–{date_format(register_object.date_end)}"
-            )
             day_sort = register_object.date_start
-            period = f"{register_object.period_from.period}.–{register_object.period_to.period}."
             period_sort = register_object.period_from.period
 
-        # Build table entry
-        entry = {
-            "pk": f"{register_object.label_}_{register_object.pk}",
-            "has_documentation": has_documentation,
-            "register_object": register_object,
-            "date": day,
-            "date_sort": day_sort,
-            "period": period,
-            "period_sort": period_sort,
-            "groups": register_object.group_names,
-            "teachers": register_object.teacher_names,
-            "subject": register_object.subject.name
-            if isinstance(register_object, ExtraLesson)
-            else _("Event"),
-        }
-        if has_documentation:
-            doc = filtered_documentations[0]
-            entry["topic"] = doc.topic
-            entry["homework"] = doc.homework
-            entry["group_note"] = doc.group_note
-        register_objects.append(entry)
-
-    return register_objects
+        register_objects.add(
+            pk=f"{register_object.label_}_{register_object.pk}",
+            has_documentation=has_documentation,
+            register_object=register_object,
+            date_sort=day_sort,
+            period_sort=period_sort,
+        )
 
 
-def generate_list_of_all_register_objects(filter_dict: Dict[str, Any]) -> List[Dict[str, Any]]:
+def generate_list_of_all_register_objects(filter_dict: Dict[str, Any]) -> Sequence[Dict[str, Any]]:
     """Generate a list of all register objects.
 
     This list can be filtered using ``filter_dict``. The following keys are supported:
@@ -332,6 +575,9 @@ def generate_list_of_all_register_objects(filter_dict: Dict[str, Any]) -> List[D
     - ``groups`` and/or ``groups``
     - ``person``
     - ``subject``
+
+    The entries are sorted by date and period. The returned ``RegisterObjectList`` only loads
+    substitutions and lesson documentations for entries which are accessed.
     """
     # Always force a value for school term, start and end date so that queries won't get too big
     initial_filter_data = FilterRegisterObjectForm.get_initial()
@@ -353,35 +599,53 @@ def generate_list_of_all_register_objects(filter_dict: Dict[str, Any]) -> List[D
     )
     holiday_days = holidays.get_all_days()
 
+    # Related data are only prefetched for materialized entries
     lesson_periods = _filter_register_objects_by_dict(
         filter_dict,
-        LessonPeriod.objects.order_by("lesson__validity__date_start"),
+        LessonPeriod.objects.order_by("lesson__validity__date_start").prefetch_related(None),
         LessonPeriod.label_,
     )
     events = _filter_register_objects_by_dict(
-        filter_dict, Event.objects.exclude_holidays(holidays), Event.label_
+        filter_dict, Event.objects.exclude_holidays(holidays).prefetch_related(None), Event.label_
     )
     extra_lessons = _filter_register_objects_by_dict(
-        filter_dict, ExtraLesson.objects.exclude_holidays(holidays), ExtraLesson.label_
-    )
-
-    # Prefetch documentations for all register objects and substitutions for all lesson periods
-    # in order to prevent extra queries
-    documentations = LessonDocumentation.objects.not_empty().filter(
-        Q(event__in=events)
-        | Q(extra_lesson__in=extra_lessons)
-        | Q(lesson_period__in=lesson_periods)
+        filter_dict,
+        ExtraLesson.objects.exclude_holidays(holidays).prefetch_related(None),
+        ExtraLesson.label_,
     )
 
+    lesson_periods = list(lesson_periods)
     if lesson_periods:
-        register_objects = _generate_dicts_for_lesson_periods(
-            filter_dict, lesson_periods, documentations, holiday_days
+        weeks = _get_weeks_for_lesson_periods(filter_dict, lesson_periods)
+
+        # Index the keys of all documentations in the filter range once,
+        # they are enough to filter and annotate the entries
+        documentation_keys = set()
+        for lesson_period_id, event_id, extra_lesson_id, year, week in (
+            LessonDocumentation.objects.not_empty()
+            .filter(
+                Q(event__in=events)
+                | Q(extra_lesson__in=extra_lessons)
+                | (Q(lesson_period__in=lesson_periods) & _get_weeks_q(weeks))
+            )
+            .values_list("lesson_period_id", "event_id", "extra_lesson_id", "year", "week")
+        ):
+            if lesson_period_id:
+                documentation_keys.add(("lesson_period", lesson_period_id, year, week))
+            elif event_id:
+                documentation_keys.add(("event", event_id))
+            else:
+                documentation_keys.add(("extra_lesson", extra_lesson_id))
+
+        register_objects = RegisterObjectList()
+        _add_lesson_periods(
+            register_objects, filter_dict, lesson_periods, weeks, documentation_keys, holiday_days
         )
-        register_objects += _generate_dicts_for_events_and_extra_lessons(
-            filter_dict, list(events) + list(extra_lessons), documentations
+        _add_events_and_extra_lessons(
+            register_objects, filter_dict, list(events) + list(extra_lessons), documentation_keys
         )
 
-        # Sort table entries by date and period and configure table
-        register_objects = sorted(register_objects, key=itemgetter("date_sort", "period_sort"))
+        # Sort table entries by date and period
+        register_objects.sort(key=itemgetter("date_sort", "period_sort"))
         return register_objects
     return []
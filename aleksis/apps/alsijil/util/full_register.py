@@ -0,0 +1,167 @@
+from copy import deepcopy
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from django.db.models import Q
+
+from calendarweek import CalendarWeek
+
+from aleksis.apps.chronos.models import Event, ExtraLesson, LessonPeriod
+from aleksis.core.models import Group, SchoolTerm
+
+from ..models import LessonDocumentation, PersonalNote
+from .alsijil_helpers import annotate_subject, get_register_data_key
+from .registries import get_all_excuse_types, get_all_extra_marks
+
+
+def get_full_register_lookups(school_term: SchoolTerm) -> Dict[str, Any]:
+    """Get all data needed for the full registers of a school term which don't depend on a group.
+
+    The result can be passed to ``get_full_register_context`` in order to reuse it
+    for the full registers of multiple groups.
+    """
+    return {
+        "school_term": school_term,
+        "weeks": CalendarWeek.weeks_within(school_term.date_start, school_term.date_end),
+        "excuse_types": list(get_all_excuse_types()),
+        "extra_marks": list(get_all_extra_marks()),
+        "today": date.today(),
+    }
+
+
+def get_full_register_context(
+    group: Group, lookups: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Build the context for rendering the full register of a group.
+
+    :param lookups: Data shared between groups as returned by ``get_full_register_lookups``
+    """
+    if lookups is None:
+        lookups = get_full_register_lookups(group.school_term)
+
+    context = {}
+
+    groups_q = (
+        Q(lesson_period__lesson__groups=group)
+        | Q(lesson_period__lesson__groups__parent_groups=group)
+        | Q(extra_lesson__groups=group)
+        | Q(extra_lesson__groups__parent_groups=group)
+        | Q(event__groups=group)
+        | Q(event__groups__parent_groups=group)
+    )
+    personal_notes = (
+        PersonalNote.objects.select_related("lesson_period")
+        .prefetch_related(
+            "lesson_period__substitutions__subject",
+            "lesson_period__substitutions__teachers",
+            "lesson_period__lesson__teachers",
+            "groups_of_person_snapshot__groups",
+        )
+        .not_empty()
+        .filter(groups_q)
+    )
+    documentations = (
+        LessonDocumentation.objects.select_related("lesson_period").not_empty().filter(groups_q)
+    )
+
+    # Index documentations and personal notes by register object (and week)
+    # instead of filtering them for every single register object
+    documentations_by_key = {}
+    for documentation in documentations:
+        documentations_by_key.setdefault(get_register_data_key(documentation), []).append(
+            documentation
+        )
+    personal_notes_by_key = {}
+    personal_notes_by_person = {}
+    for personal_note in personal_notes:
+        if personal_note.lesson_period:
+            personal_note.lesson_period.annotate_week(personal_note.calendar_week)
+        annotate_subject(personal_note.register_object)
+        personal_notes_by_key.setdefault(get_register_data_key(personal_note), []).append(
+            personal_note
+        )
+        personal_notes_by_person.setdefault(personal_note.person_id, []).append(personal_note)
+
+    # Get all lesson periods for the selected group
+    lesson_periods = LessonPeriod.objects.filter_group(group).distinct()
+    events = Event.objects.filter_group(group).distinct()
+    extra_lessons = ExtraLesson.objects.filter_group(group).distinct()
+    weeks = lookups["weeks"]
+
+    register_objects_by_day = {}
+    for extra_lesson in extra_lessons:
+        day = extra_lesson.date
+        register_objects_by_day.setdefault(day, []).append(
+            (
+                extra_lesson,
+                documentations_by_key.get(("extra_lesson", extra_lesson.pk), []),
+                personal_notes_by_key.get(("extra_lesson", extra_lesson.pk), []),
+                None,
+            )
+        )
+
+    for event in events:
+        event_documentations = documentations_by_key.get(("event", event.pk), [])
+        event_personal_notes = personal_notes_by_key.get(("event", event.pk), [])
+        day_number = (event.date_end - event.date_start).days + 1
+        for i in range(day_number):
+            day = event.date_start + timedelta(days=i)
+            event_copy = deepcopy(event)
+            event_copy.annotate_day(day)
+            register_objects_by_day.setdefault(day, []).append(
+                (event_copy, event_documentations, event_personal_notes, None)
+            )
+
+    for lesson_period in lesson_periods:
+        # The substitutions of all lesson periods are prefetched in one query,
+        # so index them by week once instead of searching them for every week
+        substitutions_by_week = {}
+        for substitution in lesson_period.substitutions.all():
+            substitutions_by_week.setdefault((substitution.year, substitution.week), substitution)
+
+        validity = lesson_period.lesson.validity
+        for week in weeks:
+            day = week[lesson_period.period.weekday]
+
+            if validity.date_start <= day <= validity.date_end:
+                key = ("lesson_period", lesson_period.pk, week.year, week.week)
+                register_objects_by_day.setdefault(day, []).append(
+                    (
+                        lesson_period,
+                        documentations_by_key.get(key, []),
+                        personal_notes_by_key.get(key, []),
+                        substitutions_by_week.get((week.year, week.week)),
+                    )
+                )
+
+    persons = group.members.prefetch_related(None).select_related(None)
+    persons = group.generate_person_list_with_class_register_statistics(persons)
+
+    prefetched_persons = []
+    for person in persons:
+        person.filtered_notes = personal_notes_by_person.get(person.pk, [])
+        prefetched_persons.append(person)
+
+    context["school_term"] = lookups["school_term"]
+    context["persons"] = prefetched_persons
+    context["excuse_types"] = lookups["excuse_types"]
+    context["extra_marks"] = lookups["extra_marks"]
+    context["group"] = group
+    context["weeks"] = weeks
+    context["register_objects_by_day"] = register_objects_by_day
+    context["register_objects"] = list(lesson_periods) + list(events) + list(extra_lessons)
+    context["today"] = lookups["today"]
+    context["lessons"] = (
+        group.lessons.all()
+        .select_related("validity", "subject")
+        .prefetch_related("teachers", "lesson_periods")
+    )
+    context["child_groups"] = group.child_groups.all().prefetch_related(
+        "lessons",
+        "lessons__validity",
+        "lessons__subject",
+        "lessons__teachers",
+        "lessons__lesson_periods",
+    )
+
+    return context
@@ -0,0 +1,186 @@
+import logging
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Iterator, List, Tuple
+
+from django.db import connection
+from django.utils.translation import gettext_lazy as _
+
+from asgiref.local import Local
+
+from aleksis.core.util.core_helpers import get_site_preferences
+
+logger = logging.getLogger(__name__)
+
+_local = Local()
+
+
+class InstrumentationSink:
+    """Receiver of instrumentation data.
+
+    Sinks are registered with ``register_sink`` and can be enabled
+    in the site preferences.
+    """
+
+    verbose_name = ""
+
+    def record_span(self, name: str, duration: float, queries: int, query_duration: float):
+        """Record one execution of a span (durations in seconds)."""
+        raise NotImplementedError
+
+    def increment(self, name: str, value: int):
+        """Increment a counter."""
+        raise NotImplementedError
+
+
+class MemorySink(InstrumentationSink):
+    """Aggregate spans and counters in the memory of the current process.
+
+    The data are exposed in the Prometheus text format by the view ``instrumentation_metrics``.
+    Every process of the application server has its own data.
+    """
+
+    verbose_name = _("In memory (Prometheus endpoint)")
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.spans: Dict[str, Dict[str, float]] = {}
+            self.counters: Dict[str, int] = {}
+
+    def get_data(self) -> Tuple[Dict[str, Dict[str, float]], Dict[str, int]]:
+        """Get copies of the aggregated spans and counters."""
+        with self._lock:
+            return (
+                {name: dict(span_data) for name, span_data in self.spans.items()},
+                dict(self.counters),
+            )
+
+    def record_span(self, name: str, duration: float, queries: int, query_duration: float):
+        with self._lock:
+            span_data = self.spans.setdefault(
+                name, {"count": 0, "duration": 0.0, "queries": 0, "query_duration": 0.0}
+            )
+            span_data["count"] += 1
+            span_data["duration"] += duration
+            span_data["queries"] += queries
+            span_data["query_duration"] += query_duration
+
+    def increment(self, name: str, value: int):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class LoggingSink(InstrumentationSink):
+    """Write every span and counter increment to the log."""
+
+    verbose_name = _("Log messages")
+
+    def record_span(self, name: str, duration: float, queries: int, query_duration: float):
+        logger.info(
+            "Span %s: %.1f ms, %d queries (%.1f ms)",
+            name,
+            duration * 1000,
+            queries,
+            query_duration * 1000,
+        )
+
+    def increment(self, name: str, value: int):
+        logger.info("Counter %s: +%d", name, value)
+
+
+memory_sink = MemorySink()
+
+sinks: Dict[str, InstrumentationSink] = {"memory": memory_sink, "logging": LoggingSink()}
+
+
+def register_sink(name: str, sink: InstrumentationSink):
+    """Register an additional sink which can be enabled in the site preferences."""
+    sinks[name] = sink
+
+
+def get_active_sinks() -> List[InstrumentationSink]:
+    """Get all sinks enabled in the site preferences (none if instrumentation is disabled)."""
+    preferences = get_site_preferences()
+    if not preferences["alsijil__instrumentation"]:
+        return []
+    return [sinks[name] for name in preferences["alsijil__instrumentation_sinks"] if name in sinks]
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Measure the duration and the queries of a phase of a view.
+
+    Spans can be nested, the name of a nested span is prefixed with the names of
+    the enclosing spans (e. g. ``register_object.formset``). Can also be used as decorator.
+    """
+    active_sinks = get_active_sinks()
+    if not active_sinks:
+        yield
+        return
+
+    parents = getattr(_local, "spans", [])
+    _local.spans = parents + [name]
+    stats = {"queries": 0, "query_duration": 0.0}
+
+    def count_query(execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats["queries"] += 1
+            stats["query_duration"] += perf_counter() - start
+
+    start = perf_counter()
+    try:
+        with connection.execute_wrapper(count_query):
+            yield
+    finally:
+        duration = perf_counter() - start
+        full_name = ".".join(_local.spans)
+        _local.spans = parents
+        for sink in active_sinks:
+            sink.record_span(full_name, duration, stats["queries"], stats["query_duration"])
+
+
+def increment(name: str, value: int = 1):
+    """Increment a counter in all active sinks."""
+    if not value:
+        return
+    for sink in get_active_sinks():
+        sink.increment(name, value)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(sink: MemorySink) -> str:
+    """Render the data of a memory sink in the Prometheus text exposition format."""
+    spans, counters = sink.get_data()
+    metrics = (
+        ("alsijil_span_calls_total", "Number of executions of the span", "count"),
+        ("alsijil_span_duration_seconds_total", "Time spent in the span", "duration"),
+        ("alsijil_span_queries_total", "Number of queries in the span", "queries"),
+        (
+            "alsijil_span_query_duration_seconds_total",
+            "Time spent in queries in the span",
+            "query_duration",
+        ),
+    )
+    lines = []
+    for metric, help_text, key in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for name, span_data in sorted(spans.items()):
+            lines.append(f'{metric}{{span="{_escape_label(name)}"}} {span_data[key]}')
+
+    lines.append("# HELP alsijil_counter_total Counters of the class register")
+    lines.append("# TYPE alsijil_counter_total counter")
+    for name, value in sorted(counters.items()):
+        lines.append(f'alsijil_counter_total{{counter="{_escape_label(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
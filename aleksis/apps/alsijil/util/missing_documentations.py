@@ -0,0 +1,168 @@
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.utils.functional import cached_property
+
+from aleksis.apps.chronos.models import Lesson, LessonPeriod, LessonSubstitution, ValidityRange
+from aleksis.core.models import Group, Person, SchoolTerm
+
+from ..models import LessonDocumentation, RegisterObjectOccurrence
+
+# All lesson occurrences without lesson documentation within the selected date range,
+# without holidays and cancelled lessons
+OCCURRENCES_SQL = """
+    SELECT ro.lesson_period_id, lp.lesson_id, ro.substitution_id
+    FROM {occurrence} ro
+    JOIN {lesson_period} lp ON lp.id = ro.lesson_period_id
+    JOIN {lesson} l ON l.id = lp.lesson_id
+    JOIN {validity_range} v ON v.id = l.validity_id
+    WHERE v.school_term_id = %(school_term)s
+        AND ro.site_id = %(site)s
+        AND ro.date BETWEEN %(date_start)s AND %(date_end)s
+        AND NOT ro.cancelled
+        AND ro.holiday_id IS NULL
+        AND (%(groups)s::int[] IS NULL OR EXISTS (
+            SELECT 1 FROM {lesson_groups} lg
+            WHERE lg.{lesson_groups_lesson} = l.id
+                AND lg.{lesson_groups_group} = ANY(%(groups)s::int[])
+        ))
+        AND NOT EXISTS (
+            SELECT 1 FROM {documentation} d
+            WHERE d.lesson_period_id = ro.lesson_period_id AND d.year = ro.year
+                AND d.week = ro.week
+                AND (d.topic <> '' OR d.homework <> '' OR d.group_note <> '')
+        )
+"""
+
+# Teachers responsible for the occurrences: the substitution teachers if there are any,
+# the teachers of the lesson otherwise
+TEACHERS_SQL = """
+    SELECT st.{substitution_teachers_person} AS pk
+    FROM occurrences o
+    JOIN {substitution_teachers} st
+        ON st.{substitution_teachers_substitution} = o.substitution_id
+    UNION ALL
+    SELECT lt.{lesson_teachers_person} AS pk
+    FROM occurrences o
+    JOIN {lesson_teachers} lt ON lt.{lesson_teachers_lesson} = o.lesson_id
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {substitution_teachers} st
+        WHERE st.{substitution_teachers_substitution} = o.substitution_id
+    )
+"""
+
+GROUPS_SQL = """
+    SELECT lg.{lesson_groups_group} AS pk
+    FROM occurrences o
+    JOIN {lesson_groups} lg ON lg.{lesson_groups_lesson} = o.lesson_id
+    WHERE %(groups)s::int[] IS NULL OR lg.{lesson_groups_group} = ANY(%(groups)s::int[])
+"""
+
+REPORT_SQL = """
+    WITH occurrences AS ({occurrences}), objects AS ({objects})
+    SELECT pk, COUNT(*) AS missing, COUNT(*) OVER () AS total
+    FROM objects
+    GROUP BY pk
+    ORDER BY missing DESC, pk
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+
+def _get_table_names() -> Dict[str, str]:
+    """Get the names of all tables and columns used by the report queries."""
+    lesson_teachers = Lesson.teachers.field
+    lesson_groups = Lesson.groups.field
+    substitution_teachers = LessonSubstitution.teachers.field
+    return {
+        "occurrence": RegisterObjectOccurrence._meta.db_table,
+        "lesson_period": LessonPeriod._meta.db_table,
+        "lesson": Lesson._meta.db_table,
+        "validity_range": ValidityRange._meta.db_table,
+        "documentation": LessonDocumentation._meta.db_table,
+        "lesson_teachers": lesson_teachers.m2m_db_table(),
+        "lesson_teachers_lesson": lesson_teachers.m2m_column_name(),
+        "lesson_teachers_person": lesson_teachers.m2m_reverse_name(),
+        "lesson_groups": lesson_groups.m2m_db_table(),
+        "lesson_groups_lesson": lesson_groups.m2m_column_name(),
+        "lesson_groups_group": lesson_groups.m2m_reverse_name(),
+        "substitution_teachers": substitution_teachers.m2m_db_table(),
+        "substitution_teachers_substitution": substitution_teachers.m2m_column_name(),
+        "substitution_teachers_person": substitution_teachers.m2m_reverse_name(),
+    }
+
+
+class MissingDocumentationReport(Sequence):
+    """Numbers of lessons without lesson documentation per teacher or per group.
+
+    The report is calculated in the database from the materialized register object
+    occurrences, so it scales to all lessons of a school term. The report supports
+    ``len()`` and slicing: every slice runs one query with ``LIMIT`` and ``OFFSET``
+    and returns dictionaries with the object (``Person`` or ``Group``) and its number
+    of missing lesson documentations, ordered by this number.
+
+    Only PostgreSQL is supported.
+    """
+
+    MODELS = {"teacher": Person, "group": Group}
+
+    def __init__(
+        self,
+        by: str,
+        school_term: SchoolTerm,
+        date_start: Optional[date] = None,
+        date_end: Optional[date] = None,
+        groups: Optional[Sequence[Union[Group, int]]] = None,
+    ):
+        if by not in self.MODELS:
+            raise ValueError(f"Unknown grouping {by}")
+        self.by = by
+        self.model = self.MODELS[by]
+        self.params = {
+            "school_term": school_term.pk,
+            "date_start": date_start or school_term.date_start,
+            "date_end": date_end or school_term.date_end,
+            "site": Site.objects.get_current().pk,
+            "groups": [getattr(group, "pk", group) for group in groups]
+            if groups is not None
+            else None,
+        }
+
+    def get_sql(self) -> str:
+        """Get the query for the report with placeholders for limit and offset."""
+        table_names = _get_table_names()
+        objects_sql = TEACHERS_SQL if self.by == "teacher" else GROUPS_SQL
+        return REPORT_SQL.format(
+            occurrences=OCCURRENCES_SQL.format(**table_names),
+            objects=objects_sql.format(**table_names),
+        )
+
+    def _fetch(self, limit: Optional[int], offset: int) -> List[Tuple[int, int, int]]:
+        with connection.cursor() as cursor:
+            cursor.execute(self.get_sql(), dict(self.params, limit=limit, offset=offset))
+            return cursor.fetchall()
+
+    @cached_property
+    def _total(self) -> int:
+        rows = self._fetch(1, 0)
+        return rows[0][2] if rows else 0
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __getitem__(self, key: Union[int, slice]) -> Any:
+        if isinstance(key, int):
+            return self[key : key + 1][0]
+
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            raise ValueError("Slicing with steps is not supported.")
+        rows = self._fetch(max(stop - start, 0), start)
+        objects = self.model.objects.in_bulk([row[0] for row in rows])
+        return [
+            {"object": objects[pk], "missing": missing} for pk, missing, __ in rows if pk in objects
+        ]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self[:])
@@ -0,0 +1,267 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, QuerySet, Subquery
+
+from asgiref.local import Local
+from calendarweek import CalendarWeek
+
+from aleksis.apps.chronos.models import (
+    Event,
+    ExtraLesson,
+    Holiday,
+    LessonPeriod,
+    LessonSubstitution,
+)
+from aleksis.apps.chronos.util.date import week_weekday_to_date
+from aleksis.core.models import SchoolTerm
+
+BULK_CREATE_BATCH_SIZE = 1000
+
+# Holidays as tuples of (start date, end date, ID)
+HolidayRanges = Sequence[Tuple[date, date, int]]
+
+_local = Local()
+
+
+def _get_holiday_ranges() -> HolidayRanges:
+    return list(
+        Holiday.objects.filter(date_start__isnull=False, date_end__isnull=False).values_list(
+            "date_start", "date_end", "pk"
+        )
+    )
+
+
+def _get_holiday_id(holidays: HolidayRanges, day: date) -> Optional[int]:
+    for date_start, date_end, pk in holidays:
+        if date_start <= day <= date_end:
+            return pk
+    return None
+
+
+def _iter_weeks(date_start: date, date_end: date) -> Iterator[CalendarWeek]:
+    week = CalendarWeek.from_date(date_start)
+    while week[0] <= date_end:
+        yield week
+        week += 1
+
+
+def _build_lesson_period_occurrences(
+    lesson_periods: QuerySet, holidays: HolidayRanges
+) -> List["RegisterObjectOccurrence"]:
+    from ..models import RegisterObjectOccurrence
+
+    lesson_periods = list(
+        lesson_periods.select_related(None)
+        .prefetch_related(None)
+        .select_related("lesson__validity", "period")
+    )
+    substitutions = {
+        (substitution.lesson_period_id, substitution.year, substitution.week): substitution
+        for substitution in LessonSubstitution.objects.filter(
+            lesson_period__in=[lesson_period.pk for lesson_period in lesson_periods]
+        )
+        .select_related(None)
+        .prefetch_related(None)
+        .only("pk", "lesson_period_id", "year", "week", "cancelled")
+    }
+
+    occurrences = []
+    for lesson_period in lesson_periods:
+        validity = lesson_period.lesson.validity
+        for week in _iter_weeks(validity.date_start, validity.date_end):
+            day = week_weekday_to_date(week, lesson_period.period.weekday)
+            if not validity.date_start <= day <= validity.date_end:
+                continue
+            substitution = substitutions.get((lesson_period.pk, week.year, week.week))
+            occurrences.append(
+                RegisterObjectOccurrence(
+                    lesson_period=lesson_period,
+                    year=week.year,
+                    week=week.week,
+                    date=day,
+                    cancelled=substitution.cancelled if substitution else False,
+                    substitution=substitution,
+                    holiday_id=_get_holiday_id(holidays, day),
+                )
+            )
+    return occurrences
+
+
+def _build_extra_lesson_occurrences(
+    extra_lessons: QuerySet, holidays: HolidayRanges
+) -> List["RegisterObjectOccurrence"]:
+    from ..models import RegisterObjectOccurrence
+
+    occurrences = []
+    for extra_lesson in (
+        extra_lessons.select_related(None).prefetch_related(None).select_related("period")
+    ):
+        day = week_weekday_to_date(extra_lesson.calendar_week, extra_lesson.period.weekday)
+        occurrences.append(
+            RegisterObjectOccurrence(
+                extra_lesson=extra_lesson,
+                year=extra_lesson.year,
+                week=extra_lesson.week,
+                date=day,
+                holiday_id=_get_holiday_id(holidays, day),
+            )
+        )
+    return occurrences
+
+
+def _build_event_occurrences(
+    events: QuerySet, holidays: HolidayRanges
+) -> List["RegisterObjectOccurrence"]:
+    from ..models import RegisterObjectOccurrence
+
+    occurrences = []
+    for event in (
+        events.select_related(None)
+        .prefetch_related(None)
+        .filter(date_start__isnull=False, date_end__isnull=False)
+    ):
+        day = event.date_start
+        while day <= event.date_end:
+            week = CalendarWeek.from_date(day)
+            occurrences.append(
+                RegisterObjectOccurrence(
+                    event=event,
+                    year=week.year,
+                    week=week.week,
+                    date=day,
+                    holiday_id=_get_holiday_id(holidays, day),
+                )
+            )
+            day += timedelta(days=1)
+    return occurrences
+
+
+def rebuild_occurrences_for(
+    lesson_periods: Optional[QuerySet] = None,
+    extra_lessons: Optional[QuerySet] = None,
+    events: Optional[QuerySet] = None,
+) -> int:
+    """Rebuild the occurrences of the selected register objects.
+
+    All existing occurrences of the register objects are replaced in one transaction.
+    Returns the number of created occurrences.
+    """
+    from ..models import RegisterObjectOccurrence
+
+    holidays = _get_holiday_ranges()
+    occurrences = []
+    to_delete = Q(pk__in=[])
+    if lesson_periods is not None:
+        occurrences += _build_lesson_period_occurrences(lesson_periods, holidays)
+        to_delete |= Q(lesson_period__in=lesson_periods.values("pk"))
+    if extra_lessons is not None:
+        occurrences += _build_extra_lesson_occurrences(extra_lessons, holidays)
+        to_delete |= Q(extra_lesson__in=extra_lessons.values("pk"))
+    if events is not None:
+        occurrences += _build_event_occurrences(events, holidays)
+        to_delete |= Q(event__in=events.values("pk"))
+
+    with transaction.atomic():
+        RegisterObjectOccurrence.objects.filter(to_delete).delete()
+        RegisterObjectOccurrence.objects.bulk_create(occurrences, batch_size=BULK_CREATE_BATCH_SIZE)
+    return len(occurrences)
+
+
+def rebuild_occurrences(school_term: Optional[SchoolTerm] = None) -> int:
+    """Rebuild the occurrences of all register objects, optionally only of one school term.
+
+    Returns the number of created occurrences.
+    """
+    lesson_periods = LessonPeriod.objects.all()
+    extra_lessons = ExtraLesson.objects.all()
+    events = Event.objects.all()
+    if school_term:
+        lesson_periods = lesson_periods.filter(lesson__validity__school_term=school_term)
+        extra_lessons = extra_lessons.filter(school_term=school_term)
+        events = events.filter(school_term=school_term)
+    return rebuild_occurrences_for(lesson_periods, extra_lessons, events)
+
+
+def _rebuild_scheduled_occurrences():
+    scheduled = _local.scheduled_rebuild
+    _local.scheduled_rebuild = None
+    rebuild_occurrences_for(
+        lesson_periods=LessonPeriod.objects.filter(pk__in=scheduled["lesson_periods"]),
+        extra_lessons=ExtraLesson.objects.filter(pk__in=scheduled["extra_lessons"]),
+        events=Event.objects.filter(pk__in=scheduled["events"]),
+    )
+
+
+def schedule_rebuild_of_occurrences(
+    lesson_periods: Iterable[int] = (),
+    extra_lessons: Iterable[int] = (),
+    events: Iterable[int] = (),
+):
+    """Rebuild the occurrences of the register objects with the passed IDs after the commit.
+
+    All register objects scheduled within one transaction are rebuilt together,
+    so saving many lessons at once does not rebuild their occurrences one by one.
+    """
+    scheduled: Optional[Dict[str, Set[int]]] = getattr(_local, "scheduled_rebuild", None)
+    connection = transaction.get_connection()
+    if scheduled is None or not any(
+        func == _rebuild_scheduled_occurrences for __, func in connection.run_on_commit
+    ):
+        # There is no pending rebuild, or it was dropped with a rolled back transaction
+        scheduled = _local.scheduled_rebuild = {
+            "lesson_periods": set(),
+            "extra_lessons": set(),
+            "events": set(),
+        }
+        register_callback = True
+    else:
+        register_callback = False
+
+    scheduled["lesson_periods"].update(lesson_periods)
+    scheduled["extra_lessons"].update(extra_lessons)
+    scheduled["events"].update(events)
+
+    if register_callback:
+        # Runs immediately if there is no transaction
+        transaction.on_commit(_rebuild_scheduled_occurrences)
+
+
+def update_occurrences_for_substitution(
+    substitution: LessonSubstitution, deleted: bool = False
+) -> int:
+    """Update the substitution and cancellation of the occurrence of a substitution."""
+    from ..models import RegisterObjectOccurrence
+
+    return RegisterObjectOccurrence.objects.filter(
+        lesson_period=substitution.lesson_period_id, year=substitution.year, week=substitution.week
+    ).update(
+        substitution=None if deleted else substitution,
+        cancelled=False if deleted else substitution.cancelled,
+    )
+
+
+def update_holidays_of_occurrences(
+    date_start: Optional[date], date_end: Optional[date], holiday: Optional[Holiday] = None
+) -> int:
+    """Assign the holidays to all occurrences in a date range.
+
+    Occurrences which are currently assigned to the passed holiday are updated, too,
+    so moved holidays are handled correctly.
+    """
+    from ..models import RegisterObjectOccurrence
+
+    selection = Q(pk__in=[])
+    if date_start and date_end:
+        selection |= Q(date__gte=date_start, date__lte=date_end)
+    if holiday and holiday.pk:
+        selection |= Q(holiday=holiday.pk)
+
+    return RegisterObjectOccurrence.objects.filter(selection).update(
+        holiday=Subquery(
+            Holiday.objects.filter(
+                date_start__lte=OuterRef("date"), date_end__gte=OuterRef("date")
+            ).values("pk")[:1]
+        )
+    )
@@ -0,0 +1,73 @@
+from typing import Set
+
+from django.contrib.auth.models import User
+from django.core.signals import request_finished, request_started
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+
+from asgiref.local import Local
+
+from aleksis.apps.chronos.models import Lesson
+from aleksis.core.models import Group, Person
+
+_local = Local()
+
+
+class PermissionCache:
+    """Data about the person of a user which are needed by many predicates.
+
+    Every set is loaded with one query on first access. Use ``get_permission_cache``
+    to get a cache which is shared by all permission checks of the current request.
+    """
+
+    def __init__(self, person: Person):
+        self.person = person
+
+    @cached_property
+    def owned_group_pks(self) -> Set[int]:
+        """Get the IDs of all groups owned by the person."""
+        return set(Group.objects.filter(owners=self.person).values_list("pk", flat=True))
+
+    @cached_property
+    def member_group_pks(self) -> Set[int]:
+        """Get the IDs of all groups the person is a member of."""
+        return set(Group.objects.filter(members=self.person).values_list("pk", flat=True))
+
+    @cached_property
+    def parent_owned_group_pks(self) -> Set[int]:
+        """Get the IDs of all groups with a parent group owned by the person."""
+        return set(
+            Group.objects.filter(parent_groups__owners=self.person).values_list("pk", flat=True)
+        )
+
+    @cached_property
+    def lesson_pks_as_teacher(self) -> Set[int]:
+        """Get the IDs of all lessons the person is a teacher of."""
+        return set(Lesson.objects.filter(teachers=self.person).values_list("pk", flat=True))
+
+
+def get_permission_cache(user: User) -> PermissionCache:
+    """Get the permission cache for a user.
+
+    Within a request, the cache is shared by all permission checks for the same user
+    and dropped at the end of the request. Outside of requests, a new cache is returned.
+    """
+    caches = getattr(_local, "permission_caches", None)
+    if caches is None:
+        return PermissionCache(user.person)
+
+    if user.pk not in caches:
+        caches[user.pk] = PermissionCache(user.person)
+    return caches[user.pk]
+
+
+@receiver(request_started)
+def start_permission_cache(sender, **kwargs):
+    """Start a new permission cache for every request."""
+    _local.permission_caches = {}
+
+
+@receiver(request_finished)
+def drop_permission_cache(sender, **kwargs):
+    """Invalidate the permission cache at the end of the request."""
+    _local.permission_caches = None
@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, List
+
+from django.contrib.auth.models import User
+from django.db.models import Model, prefetch_related_objects
+
+from guardian.core import ObjectPermissionChecker
+
+from aleksis.apps.chronos.models import Event, ExtraLesson, LessonPeriod
+from aleksis.core.models import Group, Person
+
+from ..models import PersonalNote
+from .predicates import use_prefetched
+
+REGISTER_OBJECT_LOOKUPS = {
+    LessonPeriod: ["lesson__groups__parent_groups", "lesson__teachers", "substitutions__teachers"],
+    Event: ["groups__parent_groups", "teachers"],
+    ExtraLesson: ["groups__parent_groups", "teachers"],
+}
+
+PERMISSION_MATRIX_LOOKUPS = {
+    **REGISTER_OBJECT_LOOKUPS,
+    Person: ["member_of"],
+    PersonalNote: ["person__member_of"]
+    + [f"lesson_period__{lookup}" for lookup in REGISTER_OBJECT_LOOKUPS[LessonPeriod]]
+    + [f"event__{lookup}" for lookup in REGISTER_OBJECT_LOOKUPS[Event]]
+    + [f"extra_lesson__{lookup}" for lookup in REGISTER_OBJECT_LOOKUPS[ExtraLesson]],
+}
+
+
+def _get_related_objects(obj: Model) -> Iterable[Model]:
+    """Get all objects the object permissions of a rule are checked for."""
+    if isinstance(obj, Person):
+        return [obj] + list(use_prefetched(obj, "member_of"))
+    elif isinstance(obj, PersonalNote):
+        return (
+            [obj.person]
+            + list(obj.person.member_of.all())
+            + list(obj.register_object.get_groups().all())
+        )
+    elif isinstance(obj, (LessonPeriod, Event, ExtraLesson)):
+        return list(obj.get_groups().all())
+    return []
+
+
+def get_permission_matrix(user: User, perm: str, objects: Iterable[Model]) -> Dict[Model, bool]:
+    """Check a permission for many objects at once.
+
+    Instead of checking the permission once per object in the template, all related
+    objects the rule needs are prefetched together and the object permissions of the user
+    are loaded with one query per model. The rule is then evaluated in memory.
+
+    The result maps every object to the result of the permission check and is meant to be
+    used with the ``get_dict`` template filter.
+    """
+    objects = [obj for obj in objects if obj is not None]
+
+    objects_by_model = {}
+    for obj in objects:
+        objects_by_model.setdefault(type(obj), []).append(obj)
+    for model, model_objects in objects_by_model.items():
+        lookups = PERMISSION_MATRIX_LOOKUPS.get(model)
+        if lookups:
+            prefetch_related_objects(model_objects, *lookups)
+
+    # Object permissions are stored per model, so they are prefetched per model as well
+    related_by_model: Dict[type, Dict[int, Model]] = {}
+    for obj in objects:
+        for related_obj in _get_related_objects(obj):
+            related_by_model.setdefault(type(related_obj), {})[related_obj.pk] = related_obj
+
+    checker = ObjectPermissionChecker(user)
+    for model in (Person, Group):
+        related_objects: List[Model] = list(related_by_model.get(model, {}).values())
+        if related_objects:
+            checker.prefetch_perms(related_objects)
+
+    matrix = {}
+    for obj in objects:
+        obj.set_object_permission_checker(checker)
+        if isinstance(obj, PersonalNote):
+            obj.person.set_object_permission_checker(checker)
+        matrix[obj] = user.has_perm(perm, obj)
+    return matrix
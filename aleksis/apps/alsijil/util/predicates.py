@@ -9,6 +9,7 @@ from aleksis.core.models import Group, Person
 from aleksis.core.util.predicates import check_object_permission
 
 from ..models import PersonalNote
+from .permission_cache import get_permission_cache
 
 
 @predicate
@@ -39,7 +40,10 @@ def is_lesson_original_teacher(user: User, obj: Union[LessonPeriod, Event, Extra
     this will **also** check if the person is one of the substitution teachers.
     """
     if obj:
-        if isinstance(obj, LessonPeriod) and user.person in obj.lesson.teachers.all():
+        if (
+            isinstance(obj, LessonPeriod)
+            and obj.lesson_id in get_permission_cache(user).lesson_pks_as_teacher
+        ):
             return True
         return user.person in obj.get_teachers().all()
     return False
@@ -53,8 +57,9 @@ def is_lesson_participant(user: User, obj: LessonPeriod) -> bool:
     the groups linked to the given LessonPeriod.
     """
     if hasattr(obj, "lesson") or hasattr(obj, "groups"):
+        member_group_pks = get_permission_cache(user).member_group_pks
         for group in obj.get_groups().all():
-            if user.person in list(group.members.all()):
+            if group.pk in member_group_pks:
                 return True
     return False
 
@@ -68,10 +73,10 @@ def is_lesson_parent_group_owner(user: User, obj: LessonPeriod) -> bool:
     any parent groups of any groups of the given LessonPeriods lesson.
     """
     if hasattr(obj, "lesson") or hasattr(obj, "groups"):
+        parent_owned_group_pks = get_permission_cache(user).parent_owned_group_pks
         for group in obj.get_groups().all():
-            for parent_group in group.parent_groups.all():
-                if user.person in list(parent_group.owners.all()):
-                    return True
+            if group.pk in parent_owned_group_pks:
+                return True
     return False
 
 
@@ -83,7 +88,7 @@ def is_group_owner(user: User, obj: Union[Group, Person]) -> bool:
     If there isn't provided a group, it will return `False`.
     """
     if isinstance(obj, Group):
-        if user.person in obj.owners.all():
+        if obj.pk in get_permission_cache(user).owned_group_pks:
             return True
 
     return False
@@ -98,8 +103,9 @@ def is_person_group_owner(user: User, obj: Person) -> bool:
     the owner of any group of the given person.
     """
     if obj:
+        owned_group_pks = get_permission_cache(user).owned_group_pks
         for group in use_prefetched(obj, "member_of"):
-            if user.person in use_prefetched(group, "owners"):
+            if group.pk in owned_group_pks:
                 return True
         return False
     return False
@@ -120,8 +126,8 @@ def is_person_primary_group_owner(user: User, obj: Person) -> bool:
     Checks whether the person linked to the user is
     the owner of the primary group of the given person.
     """
-    if obj.primary_group:
-        return user.person in use_prefetched(obj.primary_group, "owners")
+    if obj.primary_group_id:
+        return obj.primary_group_id in get_permission_cache(user).owned_group_pks
     return False
 
 
@@ -151,7 +157,7 @@ def is_group_member(user: User, obj: Union[Group, Person]) -> bool:
     If there isn't provided a group, it will return `False`.
     """
     if isinstance(obj, Group):
-        if user.person in obj.members.all():
+        if obj.pk in get_permission_cache(user).member_group_pks:
             return True
 
     return False
@@ -232,7 +238,7 @@ def is_personal_note_lesson_original_teacher(user: User, obj: PersonalNote) -> b
     if hasattr(obj, "register_object"):
         if (
             isinstance(obj.register_object, LessonPeriod)
-            and user.person in obj.lesson_period.lesson.teachers.all()
+            and obj.lesson_period.lesson_id in get_permission_cache(user).lesson_pks_as_teacher
         ):
             return True
 
@@ -249,10 +255,10 @@ def is_personal_note_lesson_parent_group_owner(user: User, obj: PersonalNote) ->
     any parent groups of any groups of the given LessonPeriod lesson of the given PersonalNote.
     """
     if hasattr(obj, "register_object"):
+        parent_owned_group_pks = get_permission_cache(user).parent_owned_group_pks
         for group in obj.register_object.get_groups().all():
-            for parent_group in group.parent_groups.all():
-                if user.person in list(parent_group.owners.all()):
-                    return True
+            if group.pk in parent_owned_group_pks:
+                return True
     return False
 
 
@@ -271,8 +277,9 @@ def is_group_role_assignment_group_owner(user: User, obj: Union[Group, Person])
     If there isn't provided a group role assignment, it will return `False`.
     """
     if obj:
+        owned_group_pks = get_permission_cache(user).owned_group_pks
         for group in obj.groups.all():
-            if user.person in list(group.owners.all()):
+            if group.pk in owned_group_pks:
                 return True
     return False
 
@@ -280,4 +287,4 @@ def is_group_role_assignment_group_owner(user: User, obj: Union[Group, Person])
 @predicate
 def is_owner_of_any_group(user: User, obj):
     """Predicate which checks if the person is group owner of any group."""
-    return Group.objects.filter(owners=user.person).exists()
+    return bool(get_permission_cache(user).owned_group_pks)
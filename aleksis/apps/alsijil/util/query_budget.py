@@ -0,0 +1,214 @@
+import traceback
+from dataclasses import dataclass
+from datetime import date
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection, transaction
+
+if TYPE_CHECKING:
+    from django.test import Client
+
+    from .synthetic_data import SchoolScale
+
+# Number of queries which may differ between two data sizes without growing with the data,
+# e. g. if a page of the larger school contains extra lessons and events at once
+# and their related objects are prefetched separately
+GROWTH_TOLERANCE = 2
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    """Maximum number of queries of a view.
+
+    The budget is a function of the data size: ``max_queries`` is the constant part,
+    ``per_object`` the number of queries which may be added for every object
+    (e. g. person) in the data set. Most views should not grow with the data size,
+    so ``per_object`` defaults to 0.
+    """
+
+    max_queries: int
+    per_object: int = 0
+
+    def get_limit(self, size: int) -> int:
+        return self.max_queries + self.per_object * size
+
+    def get_violation(
+        self, small_count: int, small_size: int, large_count: int, large_size: int
+    ) -> Optional[str]:
+        """Check the query counts of a view for a smaller and a larger data set.
+
+        Returns a description of the violation or ``None`` if the budget is kept.
+        """
+        if large_count > self.get_limit(large_size):
+            return "over budget"
+        elif (
+            large_count - small_count
+            > self.per_object * (large_size - small_size) + GROWTH_TOLERANCE
+        ):
+            return "grows with the data size"
+        return None
+
+
+def query_budget(max_queries: int, per_object: int = 0) -> Callable:
+    """Declare the query budget of a view function or class.
+
+    The budgets are checked by the tests and the management command ``check_query_budgets``.
+    """
+    budget = QueryBudget(max_queries, per_object)
+
+    def decorator(view):
+        view.query_budget = budget
+        return view
+
+    return decorator
+
+
+def get_query_budget(callback: Callable) -> Optional[QueryBudget]:
+    """Get the query budget of a resolved URL callback."""
+    budget = getattr(callback, "query_budget", None)
+    if budget is None and hasattr(callback, "view_class"):
+        budget = getattr(callback.view_class, "query_budget", None)
+    return budget
+
+
+def get_view_budgets() -> Dict[str, QueryBudget]:
+    """Get the query budgets of all views of the class register by URL name."""
+    from django.urls import URLPattern
+
+    from .. import urls
+
+    return {
+        pattern.name: get_query_budget(pattern.callback)
+        for pattern in urls.urlpatterns
+        if isinstance(pattern, URLPattern) and get_query_budget(pattern.callback)
+    }
+
+
+def _get_stack_location() -> str:
+    """Get the innermost AlekSIS code location which caused a query."""
+    frames = [
+        frame
+        for frame in traceback.extract_stack()[:-1]
+        if "/aleksis/" in frame.filename and frame.filename != __file__
+    ]
+    if not frames:
+        return "<unknown>"
+    frame = frames[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+class QueryRecorder:
+    """Record all executed queries together with the code location which caused them.
+
+    Use as context manager:
+
+    .. code-block:: python
+
+        with QueryRecorder() as recorder:
+            client.get(url)
+        print(recorder.get_report())
+    """
+
+    def __init__(self):
+        self.queries: List[Tuple[str, str]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((_get_stack_location(), sql))
+        return execute(sql, params, many, context)
+
+    def __enter__(self) -> "QueryRecorder":
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def get_queries_by_location(self) -> Dict[str, List[str]]:
+        """Group the recorded queries by the code location which caused them."""
+        queries_by_location = {}
+        for location, sql in self.queries:
+            queries_by_location.setdefault(location, []).append(sql)
+        return queries_by_location
+
+    def get_report(self, compare_to: Optional["QueryRecorder"] = None) -> str:
+        """Get a report of the queries grouped by code location, ordered by count.
+
+        If another recorder is passed, only locations with more queries
+        than in the other recorder are listed.
+        """
+        other_counts = (
+            {
+                location: len(queries)
+                for location, queries in compare_to.get_queries_by_location().items()
+            }
+            if compare_to
+            else {}
+        )
+
+        lines = []
+        for location, queries in sorted(
+            self.get_queries_by_location().items(), key=lambda item: -len(item[1])
+        ):
+            other_count = other_counts.get(location, 0)
+            if compare_to and len(queries) <= other_count:
+                continue
+            count = f"{other_count} -> {len(queries)}" if compare_to else str(len(queries))
+            lines.append(f"{count} queries at {location}")
+            lines.append(f"    {queries[0][:500]}")
+        return "\n".join(lines)
+
+
+def record_view(client: "Client", url: str) -> QueryRecorder:
+    """Record the queries of a GET request to a view."""
+    # The first request fills caches which are not part of the budget
+    client.get(url)
+    with QueryRecorder() as recorder:
+        response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} returned status code {response.status_code}.")
+    return recorder
+
+
+def record_view_queries(
+    scale: "SchoolScale", date_start: Optional[date], url_names: Iterable[str]
+) -> Tuple[Dict[str, Optional[QueryRecorder]], int]:
+    """Record the queries of views for a synthetic school of a scale.
+
+    All synthetic data are rolled back afterwards. Returns the recorders by URL name
+    (``None`` if no URL can be built for the synthetic school) and the number of students.
+    """
+    from django.test import Client
+
+    from .registries import reset_registries
+    from .synthetic_data import (
+        create_benchmark_user,
+        create_management_view_urls,
+        get_view_urls,
+        seed_school,
+    )
+
+    recorders = {}
+    with transaction.atomic():
+        school = seed_school(scale, date_start)
+        client = Client()
+        client.force_login(create_benchmark_user(school))
+        urls_by_name = get_view_urls(school)
+        for url_name in url_names:
+            if url_name in urls_by_name:
+                recorders[url_name] = record_view(client, urls_by_name[url_name])
+
+        urls_by_name = create_management_view_urls(school)
+        for url_name in url_names:
+            if url_name in urls_by_name:
+                recorders[url_name] = record_view(client, urls_by_name[url_name])
+            else:
+                recorders.setdefault(url_name, None)
+
+        size = len(school.students)
+        transaction.set_rollback(True)
+    reset_registries()
+    return recorders, size
@@ -0,0 +1,124 @@
+from threading import Lock
+from typing import Dict, Tuple
+from uuid import uuid4
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import models, transaction
+from django.dispatch import receiver
+
+from asgiref.local import Local
+
+_local = Local()
+
+
+class RegistryCache:
+    """Process-level snapshot of all objects of a rarely changing model, per site.
+
+    The objects are loaded once per process and site and shared by all callers.
+    Changes are detected through a version token in the Django cache which is
+    replaced by ``invalidate`` (called from signal receivers on the model), so
+    all processes reload their snapshot after a change. Within a request, the version
+    is only checked once.
+    """
+
+    def __init__(self, model_label: str):
+        self.model_label = model_label
+        self._lock = Lock()
+        self._snapshots: Dict[int, Tuple[str, Tuple[models.Model, ...]]] = {}
+
+    def get_version_key(self, site_id: int) -> str:
+        return f"alsijil_registry_version_{self.model_label}_{site_id}"
+
+    def _get_version(self, site_id: int) -> str:
+        checked_versions = getattr(_local, "checked_versions", None)
+        if checked_versions is not None and (self.model_label, site_id) in checked_versions:
+            return checked_versions[self.model_label, site_id]
+
+        key = self.get_version_key(site_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid4().hex, None)
+            version = cache.get(key)
+
+        if checked_versions is not None:
+            checked_versions[self.model_label, site_id] = version
+        return version
+
+    def get_all(self) -> Tuple[models.Model, ...]:
+        """Get all objects of the model on the current site."""
+        site_id = settings.SITE_ID
+        objects_query = apps.get_model(self.model_label).objects.all()
+        if (self.model_label, site_id) in getattr(_local, "uncommitted_changes", set()):
+            # Uncommitted changes must not end up in the shared snapshot
+            return tuple(objects_query)
+
+        version = self._get_version(site_id)
+        with self._lock:
+            snapshot = self._snapshots.get(site_id)
+        if snapshot and snapshot[0] == version:
+            return snapshot[1]
+
+        objects = tuple(objects_query)
+        with self._lock:
+            self._snapshots[site_id] = (version, objects)
+        return objects
+
+    def invalidate(self, site_id: int):
+        """Drop the snapshots of a site in all processes after the current transaction."""
+        if not hasattr(_local, "uncommitted_changes"):
+            _local.uncommitted_changes = set()
+        _local.uncommitted_changes.add((self.model_label, site_id))
+        transaction.on_commit(lambda: self._bump_version(site_id))
+
+    def _bump_version(self, site_id: int):
+        cache.set(self.get_version_key(site_id), uuid4().hex, None)
+        with self._lock:
+            self._snapshots.pop(site_id, None)
+        _local.uncommitted_changes.discard((self.model_label, site_id))
+        checked_versions = getattr(_local, "checked_versions", None)
+        if checked_versions is not None:
+            checked_versions.pop((self.model_label, site_id), None)
+
+    def reset(self):
+        """Drop all snapshots of this process, e. g. after a rolled back transaction."""
+        with self._lock:
+            self._snapshots = {}
+        _local.uncommitted_changes = {
+            key
+            for key in getattr(_local, "uncommitted_changes", set())
+            if key[0] != self.model_label
+        }
+
+
+extra_marks_registry = RegistryCache("alsijil.ExtraMark")
+excuse_types_registry = RegistryCache("alsijil.ExcuseType")
+
+
+def reset_registries():
+    """Drop the snapshots of all registries in this process."""
+    extra_marks_registry.reset()
+    excuse_types_registry.reset()
+
+
+def get_all_extra_marks() -> Tuple["ExtraMark", ...]:
+    """Get all extra marks of the current site from the registry cache."""
+    return extra_marks_registry.get_all()
+
+
+def get_all_excuse_types() -> Tuple["ExcuseType", ...]:
+    """Get all excuse types of the current site from the registry cache."""
+    return excuse_types_registry.get_all()
+
+
+@receiver(request_started)
+def start_registry_version_checks(sender, **kwargs):
+    """Check the versions of the registries only once per request."""
+    _local.checked_versions = {}
+
+
+@receiver(request_finished)
+def drop_registry_version_checks(sender, **kwargs):
+    _local.checked_versions = None
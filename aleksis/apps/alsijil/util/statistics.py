@@ -0,0 +1,427 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, QuerySet, Sum
+from django.db.models.functions import Coalesce
+
+from asgiref.local import Local
+
+# Key of a row in the materialized statistics table: (person, school term, group)
+StatisticsKey = Tuple[int, Optional[int], int]
+
+STATISTICS_COUNTERS = ("absences_count", "excused", "unexcused", "tardiness", "tardiness_count")
+STATISTICS_MAPPINGS = ("extra_mark_counts", "excuse_type_counts")
+
+_local = Local()
+
+# Fields of personal notes which have an effect on the statistics
+STATISTICS_RELEVANT_FIELDS = {
+    "person",
+    "person_id",
+    "lesson_period",
+    "lesson_period_id",
+    "event",
+    "event_id",
+    "extra_lesson",
+    "extra_lesson_id",
+    "absent",
+    "excused",
+    "excuse_type",
+    "excuse_type_id",
+    "late",
+}
+
+NOTE_SNAPSHOT_FIELDS = (
+    "pk",
+    "person_id",
+    "lesson_period_id",
+    "event_id",
+    "extra_lesson_id",
+    "absent",
+    "excused",
+    "excuse_type_id",
+    "late",
+)
+
+
+@contextmanager
+def bulk_statistics_update() -> Iterator[None]:
+    """Skip the updates of the statistics for single personal notes in signal receivers.
+
+    Use this if the statistics are updated for all changed personal notes at once.
+    """
+    previous = getattr(_local, "bulk_update", False)
+    _local.bulk_update = True
+    try:
+        yield
+    finally:
+        _local.bulk_update = previous
+
+
+def is_bulk_statistics_update() -> bool:
+    """Check whether the statistics are updated for all changed personal notes at once."""
+    return getattr(_local, "bulk_update", False)
+
+
+def get_note_snapshot(note: "PersonalNote", extra_mark_ids: Iterable[int] = ()) -> Dict[str, Any]:
+    """Get a snapshot of all statistics-relevant data of a personal note object."""
+    snapshot = {field: getattr(note, field) for field in NOTE_SNAPSHOT_FIELDS}
+    snapshot["extra_marks"] = list(extra_mark_ids)
+    return snapshot
+
+
+def get_note_snapshots(
+    personal_notes: QuerySet, with_extra_marks: bool = True
+) -> Dict[int, Dict[str, Any]]:
+    """Get snapshots of all statistics-relevant data of the selected personal notes.
+
+    This will use two queries at most, one for the notes and one for their extra marks.
+    """
+    from ..models import PersonalNote
+
+    snapshots = {
+        row["pk"]: dict(row, extra_marks=[])
+        for row in personal_notes.select_related(None)
+        .prefetch_related(None)
+        .values(*NOTE_SNAPSHOT_FIELDS)
+    }
+    if with_extra_marks and snapshots:
+        through_rows = PersonalNote.extra_marks.through.objects.filter(
+            personalnote_id__in=personal_notes.prefetch_related(None).values("pk")
+        ).values_list("personalnote_id", "extramark_id")
+        for note_id, extra_mark_id in through_rows:
+            snapshots[note_id]["extra_marks"].append(extra_mark_id)
+    return snapshots
+
+
+def get_note_contribution(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the values a single personal note adds to the statistics of its person."""
+    absent = snapshot["absent"]
+    excuse_type_id = snapshot["excuse_type_id"]
+    late = snapshot["late"] or 0
+    return {
+        "absences_count": int(absent),
+        "excused": int(absent and snapshot["excused"] and excuse_type_id is None),
+        "unexcused": int(absent and not snapshot["excused"]),
+        "tardiness": late,
+        "tardiness_count": int(late > 0),
+        "extra_mark_counts": {str(pk): 1 for pk in snapshot.get("extra_marks", [])},
+        "excuse_type_counts": {str(excuse_type_id): 1} if absent and excuse_type_id else {},
+    }
+
+
+def _add_contribution(target: Dict[str, Any], contribution: Dict[str, Any], factor: int = 1):
+    """Add a (multiplied) contribution to a statistics delta in place."""
+    for counter in STATISTICS_COUNTERS:
+        target[counter] = target.get(counter, 0) + factor * contribution.get(counter, 0)
+    for mapping in STATISTICS_MAPPINGS:
+        counts = target.setdefault(mapping, {})
+        for pk, count in contribution.get(mapping, {}).items():
+            counts[pk] = counts.get(pk, 0) + factor * count
+
+
+def _is_empty_contribution(contribution: Dict[str, Any]) -> bool:
+    return not any(contribution.get(counter) for counter in STATISTICS_COUNTERS) and not any(
+        any(contribution.get(mapping, {}).values()) for mapping in STATISTICS_MAPPINGS
+    )
+
+
+def _get_register_object_key(snapshot: Dict[str, Any]) -> Tuple[str, Optional[int]]:
+    if snapshot["lesson_period_id"]:
+        return "lesson_period", snapshot["lesson_period_id"]
+    elif snapshot["event_id"]:
+        return "event", snapshot["event_id"]
+    return "extra_lesson", snapshot["extra_lesson_id"]
+
+
+def get_register_object_groups(
+    register_object_keys: Iterable[Tuple[str, int]]
+) -> Dict[Tuple[str, int], Tuple[Optional[int], Set[int]]]:
+    """Resolve the school term and the statistics groups of register objects.
+
+    The statistics groups are the groups of a register object and their parent groups.
+    Register objects are passed as ``(label, pk)`` tuples; one query per model is needed.
+    """
+    from aleksis.apps.chronos.models import Event, ExtraLesson, LessonPeriod
+
+    sources = (
+        (LessonPeriod, "lesson__validity__school_term", "lesson__groups"),
+        (Event, "school_term", "groups"),
+        (ExtraLesson, "school_term", "groups"),
+    )
+    register_object_keys = set(register_object_keys)
+
+    resolved = {}
+    for model, school_term_path, groups_path in sources:
+        pks = {pk for label, pk in register_object_keys if label == model.label_}
+        if not pks:
+            continue
+        rows = (
+            model.objects.filter(pk__in=pks)
+            .select_related(None)
+            .prefetch_related(None)
+            .values_list("pk", school_term_path, groups_path, f"{groups_path}__parent_groups")
+        )
+        for pk, school_term_id, group_id, parent_group_id in rows:
+            __, groups = resolved.setdefault((model.label_, pk), (school_term_id, set()))
+            groups.update(filter(None, (group_id, parent_group_id)))
+    return resolved
+
+
+def build_statistics_deltas(
+    changes: Iterable[Tuple[Dict[str, Any], int]]
+) -> Dict[StatisticsKey, Dict[str, Any]]:
+    """Build statistics deltas from a list of ``(note snapshot, factor)`` tuples.
+
+    Use a factor of ``1`` for added data and ``-1`` for removed data.
+    """
+    changes = [
+        (snapshot, get_note_contribution(snapshot), factor)
+        for snapshot, factor in changes
+        if snapshot["person_id"]
+    ]
+    changes = [change for change in changes if not _is_empty_contribution(change[1])]
+    if not changes:
+        return {}
+
+    register_objects = get_register_object_groups(
+        _get_register_object_key(snapshot) for snapshot, __, __ in changes
+    )
+
+    deltas = {}
+    for snapshot, contribution, factor in changes:
+        school_term_id, group_ids = register_objects.get(
+            _get_register_object_key(snapshot), (None, set())
+        )
+        for group_id in group_ids:
+            key = (snapshot["person_id"], school_term_id, group_id)
+            _add_contribution(deltas.setdefault(key, {}), contribution, factor)
+
+    return {key: delta for key, delta in deltas.items() if not _is_empty_contribution(delta)}
+
+
+def apply_statistics_deltas(deltas: Dict[StatisticsKey, Dict[str, Any]]):
+    """Add statistics deltas to the materialized statistics table."""
+    from ..models import PersonalNoteStatistics
+
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        # Ensure that all needed rows exist, then lock them for the update
+        PersonalNoteStatistics.objects.bulk_create(
+            [
+                PersonalNoteStatistics(
+                    person_id=person_id, school_term_id=school_term_id, group_id=group_id
+                )
+                for person_id, school_term_id, group_id in deltas.keys()
+            ],
+            ignore_conflicts=True,
+        )
+
+        q = Q()
+        for person_id, school_term_id, group_id in deltas.keys():
+            q |= Q(person_id=person_id, school_term_id=school_term_id, group_id=group_id)
+        rows = list(PersonalNoteStatistics.objects.select_for_update().filter(q))
+
+        for row in rows:
+            delta = deltas.get((row.person_id, row.school_term_id, row.group_id))
+            if not delta:
+                continue
+            for counter in STATISTICS_COUNTERS:
+                setattr(row, counter, getattr(row, counter) + delta.get(counter, 0))
+            for mapping in STATISTICS_MAPPINGS:
+                counts = getattr(row, mapping)
+                for pk, count in delta.get(mapping, {}).items():
+                    counts[pk] = counts.get(pk, 0) + count
+                    if not counts[pk]:
+                        del counts[pk]
+
+        PersonalNoteStatistics.objects.bulk_update(rows, STATISTICS_COUNTERS + STATISTICS_MAPPINGS)
+
+
+def update_statistics_for_notes(
+    old_snapshots: Dict[int, Dict[str, Any]], new_snapshots: Dict[int, Dict[str, Any]]
+):
+    """Update the materialized statistics with changes of personal notes.
+
+    Both arguments map primary keys of personal notes to their snapshots
+    (cf. ``get_note_snapshots``) before and after the change.
+    A missing snapshot is interpreted as a created or deleted note.
+    """
+    changes = []
+    for pk in old_snapshots.keys() | new_snapshots.keys():
+        old, new = old_snapshots.get(pk), new_snapshots.get(pk)
+        if (
+            old
+            and new
+            and old["person_id"] == new["person_id"]
+            and _get_register_object_key(old) == _get_register_object_key(new)
+            and get_note_contribution(old) == get_note_contribution(new)
+        ):
+            # Skip unchanged notes to avoid resolving their groups
+            continue
+        if old:
+            changes.append((old, -1))
+        if new:
+            changes.append((new, 1))
+
+    apply_statistics_deltas(build_statistics_deltas(changes))
+
+
+def rebuild_statistics(
+    school_term: Optional["SchoolTerm"] = None, persons: Optional[Iterable[int]] = None
+) -> int:
+    """Rebuild the materialized statistics table from scratch.
+
+    If a school term is passed, only the statistics of this school term are rebuilt.
+    If person IDs are passed, only the statistics of these persons are rebuilt.
+
+    :return: Count of created statistics rows
+    """
+    from ..models import PersonalNote, PersonalNoteStatistics
+
+    personal_notes = PersonalNote.objects.not_empty().distinct()
+    if persons is not None:
+        persons = set(persons)
+        personal_notes = personal_notes.filter(person_id__in=persons)
+    if school_term:
+        personal_notes = personal_notes.filter(
+            Q(lesson_period__lesson__validity__school_term=school_term)
+            | Q(extra_lesson__school_term=school_term)
+            | Q(event__school_term=school_term)
+        )
+
+    snapshots = get_note_snapshots(personal_notes)
+    deltas = build_statistics_deltas((snapshot, 1) for snapshot in snapshots.values())
+
+    with transaction.atomic():
+        existing = PersonalNoteStatistics.objects.all()
+        if persons is not None:
+            existing = existing.filter(person_id__in=persons)
+        if school_term:
+            existing = existing.filter(school_term=school_term)
+        existing.delete()
+
+        rows = [
+            PersonalNoteStatistics(
+                person_id=person_id, school_term_id=school_term_id, group_id=group_id, **delta
+            )
+            for (person_id, school_term_id, group_id), delta in deltas.items()
+        ]
+        PersonalNoteStatistics.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
+
+
+def _rebuild_scheduled_statistics():
+    persons = _local.scheduled_rebuild
+    _local.scheduled_rebuild = None
+    rebuild_statistics(persons=persons)
+
+
+def schedule_rebuild_of_statistics(personal_notes: QuerySet):
+    """Rebuild the statistics of all persons with the passed personal notes after the commit.
+
+    This is needed if the school term or the groups of register objects change, as these
+    decide about the statistics rows the personal notes are counted in.
+    All persons scheduled within one transaction are rebuilt together.
+    """
+    person_ids = set(
+        personal_notes.select_related(None)
+        .prefetch_related(None)
+        .order_by()
+        .values_list("person_id", flat=True)
+        .distinct()
+    )
+    if not person_ids:
+        return
+
+    scheduled: Optional[Set[int]] = getattr(_local, "scheduled_rebuild", None)
+    connection = transaction.get_connection()
+    if scheduled is None or not any(
+        func == _rebuild_scheduled_statistics for __, func in connection.run_on_commit
+    ):
+        # There is no pending rebuild, or it was dropped with a rolled back transaction
+        scheduled = _local.scheduled_rebuild = set()
+        register_callback = True
+    else:
+        register_callback = False
+
+    scheduled.update(person_ids)
+
+    if register_callback:
+        # Runs immediately if there is no transaction
+        transaction.on_commit(_rebuild_scheduled_statistics)
+
+
+def get_statistics_by_school_term(
+    personal_notes: QuerySet,
+    extra_marks: Optional[Iterable["ExtraMark"]] = None,
+    excuse_types: Optional[Iterable["ExcuseType"]] = None,
+) -> List[Tuple["SchoolTerm", Dict[str, int]]]:
+    """Calculate statistics on personal notes per school term.
+
+    All counters for all school terms are calculated in one grouped query
+    using conditional aggregation. School terms without any personal notes are left out.
+
+    :return: List of ``(school_term, stat)`` tuples, ordered by descending start date
+    """
+    from aleksis.core.models import SchoolTerm
+
+    from ..models import PersonalNote
+    from .registries import get_all_excuse_types, get_all_extra_marks
+
+    if extra_marks is None:
+        extra_marks = get_all_extra_marks()
+    if excuse_types is None:
+        excuse_types = get_all_excuse_types()
+
+    aggregates = {
+        "absences_count": Count("pk", filter=Q(absent=True)),
+        "excused": Count("pk", filter=Q(absent=True, excused=True, excuse_type__isnull=True)),
+        "unexcused": Count("pk", filter=Q(absent=True, excused=False)),
+        "tardiness": Sum("late"),
+        "tardiness_count": Count("pk", filter=~Q(late=0)),
+    }
+    for extra_mark in extra_marks:
+        # Use a subquery to prevent the multiplication of rows by joining the extra marks
+        aggregates[extra_mark.count_label] = Count(
+            "pk",
+            filter=Exists(
+                PersonalNote.extra_marks.through.objects.filter(
+                    personalnote_id=OuterRef("pk"), extramark_id=extra_mark.pk
+                )
+            ),
+        )
+    for excuse_type in excuse_types:
+        aggregates[excuse_type.count_label] = Count(
+            "pk", filter=Q(absent=True, excuse_type=excuse_type)
+        )
+
+    rows = (
+        personal_notes.select_related(None)
+        .prefetch_related(None)
+        .order_by()
+        .annotate(
+            resolved_school_term=Coalesce(
+                "lesson_period__lesson__validity__school_term",
+                "extra_lesson__school_term",
+                "event__school_term",
+            )
+        )
+        .filter(resolved_school_term__isnull=False)
+        .values("resolved_school_term")
+        # Prefix the aliases as annotations would shadow fields like ``excused`` in the filters
+        .annotate(**{f"stat_{name}": aggregate for name, aggregate in aggregates.items()})
+    )
+    stats_by_school_term = {
+        row["resolved_school_term"]: {name: row[f"stat_{name}"] for name in aggregates}
+        for row in rows
+    }
+
+    school_terms = SchoolTerm.objects.filter(pk__in=stats_by_school_term.keys()).order_by(
+        "-date_start"
+    )
+    return [(school_term, stats_by_school_term[school_term.pk]) for school_term in school_terms]
@@ -0,0 +1,515 @@
+from dataclasses import dataclass, replace
+from datetime import date, datetime, time, timedelta
+from random import Random
+from typing import Dict, List, Optional, Tuple
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.urls import reverse
+
+from calendarweek import CalendarWeek
+
+from aleksis.apps.chronos.models import (
+    Event,
+    ExtraLesson,
+    Holiday,
+    Lesson,
+    LessonPeriod,
+    LessonSubstitution,
+    Room,
+    Subject,
+    TimePeriod,
+    ValidityRange,
+)
+from aleksis.core.models import Group, Person, SchoolTerm
+
+from ..models import (
+    ExcuseType,
+    ExtraMark,
+    GroupMembershipSnapshot,
+    GroupRole,
+    GroupRoleAssignment,
+    PersonalNote,
+)
+from .occurrences import rebuild_occurrences
+from .statistics import rebuild_statistics
+
+BULK_CREATE_BATCH_SIZE = 1000
+
+WEEKDAYS = 5
+
+
+@dataclass
+class SchoolScale:
+    """Size of a synthetic school."""
+
+    grades: int = 2
+    classes_per_grade: int = 2
+    students_per_class: int = 25
+    teachers: int = 10
+    subjects: int = 10
+    periods_per_day: int = 6
+    lessons_per_class: int = 25
+    weeks: int = 12
+    substitutions: int = 100
+    holidays: int = 1
+    events: int = 10
+    extra_lessons: int = 10
+    personal_notes: int = 2000
+
+
+SCALES = {
+    "small": SchoolScale(),
+    "medium": SchoolScale(
+        grades=6,
+        classes_per_grade=3,
+        students_per_class=28,
+        teachers=50,
+        subjects=15,
+        periods_per_day=8,
+        lessons_per_class=32,
+        weeks=20,
+        substitutions=1000,
+        holidays=2,
+        events=50,
+        extra_lessons=50,
+        personal_notes=20000,
+    ),
+    "large": SchoolScale(
+        grades=8,
+        classes_per_grade=5,
+        students_per_class=30,
+        teachers=120,
+        subjects=20,
+        periods_per_day=10,
+        lessons_per_class=36,
+        weeks=40,
+        substitutions=5000,
+        holidays=4,
+        events=200,
+        extra_lessons=200,
+        personal_notes=200000,
+    ),
+}
+
+# Data sizes which are multiplied to grow a synthetic school
+GROWING_SIZES = (
+    "classes_per_grade",
+    "students_per_class",
+    "substitutions",
+    "events",
+    "extra_lessons",
+    "personal_notes",
+)
+
+
+def get_grown_scale(scale: SchoolScale, factor: int) -> SchoolScale:
+    """Get a scale with the growing data sizes (cf. ``GROWING_SIZES``) multiplied by a factor."""
+    return replace(scale, **{field: getattr(scale, field) * factor for field in GROWING_SIZES})
+
+
+@dataclass
+class SyntheticSchool:
+    """Objects of a seeded synthetic school which are needed to exercise the views."""
+
+    school_term: SchoolTerm
+    grades: List[Group]
+    classes: List[Group]
+    students: List[Person]
+    teachers: List[Person]
+    lesson_periods: List[LessonPeriod]
+    events: List[Event]
+    extra_lessons: List[ExtraLesson]
+
+
+def _get_time(minutes: int) -> time:
+    return (datetime.combine(date.min, time(8)) + timedelta(minutes=minutes)).time()
+
+
+def _create_time_periods(validity: ValidityRange, scale: SchoolScale) -> Dict[tuple, TimePeriod]:
+    time_periods = TimePeriod.objects.bulk_create(
+        [
+            TimePeriod(
+                validity=validity,
+                weekday=weekday,
+                period=period,
+                time_start=_get_time((period - 1) * 50),
+                time_end=_get_time((period - 1) * 50 + 45),
+            )
+            for weekday in range(WEEKDAYS)
+            for period in range(1, scale.periods_per_day + 1)
+        ]
+    )
+    return {(period.weekday, period.period): period for period in time_periods}
+
+
+def _create_groups(
+    school_term: SchoolTerm, scale: SchoolScale, teachers: List[Person], random: Random
+):
+    grades, classes = [], []
+    for grade_number in range(1, scale.grades + 1):
+        grade = Group.objects.create(
+            school_term=school_term, name=f"Grade {grade_number}", short_name=f"{grade_number}"
+        )
+        grades.append(grade)
+        for class_index in range(scale.classes_per_grade):
+            class_name = f"{grade_number}{chr(ord('a') + class_index)}"
+            school_class = Group.objects.create(
+                school_term=school_term, name=f"Class {class_name}", short_name=class_name
+            )
+            school_class.parent_groups.add(grade)
+            school_class.owners.add(random.choice(teachers))
+            classes.append(school_class)
+    return grades, classes
+
+
+def _create_persons(
+    prefix: str, count: int, short_name_prefix: Optional[str] = None
+) -> List[Person]:
+    return Person.objects.bulk_create(
+        [
+            Person(
+                first_name=f"{prefix} {i}",
+                last_name="Synthetic",
+                short_name=f"{short_name_prefix}{i}" if short_name_prefix else None,
+            )
+            for i in range(count)
+        ],
+        batch_size=BULK_CREATE_BATCH_SIZE,
+    )
+
+
+def get_school_term_dates(
+    scale: SchoolScale, date_start: Optional[date] = None
+) -> Tuple[date, date]:
+    """Get the dates of a synthetic school term.
+
+    The school term starts on the Monday of the week of ``date_start``
+    (defaults to the current week minus half of the school term).
+    """
+    if not date_start:
+        date_start = date.today() - timedelta(weeks=scale.weeks // 2)
+    date_start = CalendarWeek.from_date(date_start)[0]
+    return date_start, date_start + timedelta(weeks=scale.weeks, days=-3)
+
+
+def seed_school(
+    scale: SchoolScale, date_start: Optional[date] = None, seed: int = 0
+) -> SyntheticSchool:
+    """Seed a synthetic school with realistic amounts of class register data.
+
+    The school term (see ``get_school_term_dates``) contains groups with parent groups,
+    lessons, substitutions, holidays, events, extra lessons and personal notes.
+    All data are created with bulk queries, so the materialized tables are rebuilt
+    for the new school term at the end.
+
+    The data are random, but the same ``seed`` creates the same school.
+    """
+    random = Random(seed)
+    date_start, date_end = get_school_term_dates(scale, date_start)
+
+    with transaction.atomic():
+        school_term = SchoolTerm.objects.create(
+            name=f"Synthetic school term {date_start}", date_start=date_start, date_end=date_end
+        )
+        validity = ValidityRange.objects.create(
+            school_term=school_term, date_start=date_start, date_end=date_end
+        )
+        time_periods = _create_time_periods(validity, scale)
+
+        subjects = [
+            Subject.objects.get_or_create(
+                short_name=f"S{i:02d}", defaults={"name": f"Synthetic subject {i}"}
+            )[0]
+            for i in range(scale.subjects)
+        ]
+        excuse_types = list(ExcuseType.objects.all())
+
+        # Teachers need short names as they are shown in the timetables,
+        # they have to be unique in all seeded school terms
+        teachers = _create_persons(
+            "Teacher", scale.teachers, short_name_prefix=f"T{school_term.pk}-"
+        )
+        grades, classes = _create_groups(school_term, scale, teachers, random)
+
+        students = []
+        students_by_class = {}
+        for school_class in classes:
+            class_students = _create_persons(
+                f"Student {school_class.short_name}", scale.students_per_class
+            )
+            school_class.members.add(*class_students)
+            students_by_class[school_class] = class_students
+            students += class_students
+
+        # One lesson per class and slot, the slots are filled up day by day
+        lessons, lesson_slots = [], []
+        for school_class in classes:
+            room = Room.objects.get_or_create(
+                short_name=f"R{school_class.short_name}",
+                defaults={"name": f"Room of class {school_class.short_name}"},
+            )[0]
+            for slot in range(min(scale.lessons_per_class, WEEKDAYS * scale.periods_per_day)):
+                lessons.append(Lesson(subject=random.choice(subjects), validity=validity))
+                lesson_slots.append((school_class, room, slot))
+        lessons = Lesson.objects.bulk_create(lessons, batch_size=BULK_CREATE_BATCH_SIZE)
+
+        Lesson.groups.through.objects.bulk_create(
+            [
+                Lesson.groups.through(lesson_id=lesson.pk, group_id=school_class.pk)
+                for lesson, (school_class, __, __) in zip(lessons, lesson_slots)
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        Lesson.teachers.through.objects.bulk_create(
+            [
+                Lesson.teachers.through(lesson_id=lesson.pk, person_id=random.choice(teachers).pk)
+                for lesson in lessons
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        lesson_periods = LessonPeriod.objects.bulk_create(
+            [
+                LessonPeriod(
+                    lesson=lesson,
+                    period=time_periods[(slot % WEEKDAYS, slot // WEEKDAYS + 1)],
+                    room=room,
+                )
+                for lesson, (__, room, slot) in zip(lessons, lesson_slots)
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        class_of_lesson_period = {
+            lesson_period.pk: school_class
+            for lesson_period, (school_class, __, __) in zip(lesson_periods, lesson_slots)
+        }
+
+        weeks = [CalendarWeek.from_date(date_start) + i for i in range(scale.weeks)]
+
+        # Calendar weeks are not hashable, so they are identified by year and week number
+        substitution_keys = set()
+        for __ in range(scale.substitutions):
+            week = random.choice(weeks)
+            substitution_keys.add((random.choice(lesson_periods), week.year, week.week))
+        substitutions = LessonSubstitution.objects.bulk_create(
+            [
+                LessonSubstitution(
+                    lesson_period=lesson_period,
+                    year=year,
+                    week=week,
+                    cancelled=random.random() < 0.3,
+                )
+                for lesson_period, year, week in substitution_keys
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        LessonSubstitution.teachers.through.objects.bulk_create(
+            [
+                LessonSubstitution.teachers.through(
+                    lessonsubstitution_id=substitution.pk, person_id=random.choice(teachers).pk
+                )
+                for substitution in substitutions
+                if not substitution.cancelled
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+
+        # Holidays of a whole week, evenly spread over the school term
+        holiday_weeks = [
+            weeks[(i + 1) * len(weeks) // (scale.holidays + 1)] for i in range(scale.holidays)
+        ]
+        Holiday.objects.bulk_create(
+            [
+                Holiday(
+                    title=f"Synthetic holiday {i}",
+                    date_start=holiday_week[0],
+                    date_end=holiday_week[WEEKDAYS - 1],
+                )
+                for i, holiday_week in enumerate(holiday_weeks)
+            ]
+        )
+
+        events = []
+        for i in range(scale.events):
+            day = random.choice(weeks)[random.randrange(WEEKDAYS)]
+            events.append(
+                Event(
+                    title=f"Synthetic event {i}",
+                    school_term=school_term,
+                    date_start=day,
+                    date_end=day,
+                    period_from=time_periods[(day.weekday(), 1)],
+                    period_to=time_periods[(day.weekday(), min(2, scale.periods_per_day))],
+                )
+            )
+        events = Event.objects.bulk_create(events)
+        extra_lessons = ExtraLesson.objects.bulk_create(
+            [
+                ExtraLesson(
+                    school_term=school_term,
+                    year=week.year,
+                    week=week.week,
+                    period=random.choice(list(time_periods.values())),
+                    subject=random.choice(subjects),
+                )
+                for week in (random.choice(weeks) for __ in range(scale.extra_lessons))
+            ]
+        )
+        Event.groups.through.objects.bulk_create(
+            [
+                Event.groups.through(event_id=event.pk, group_id=random.choice(classes).pk)
+                for event in events
+            ]
+        )
+        ExtraLesson.groups.through.objects.bulk_create(
+            [
+                ExtraLesson.groups.through(
+                    extralesson_id=extra_lesson.pk, group_id=random.choice(classes).pk
+                )
+                for extra_lesson in extra_lessons
+            ]
+        )
+
+        snapshots = GroupMembershipSnapshot.objects.get_for_persons(
+            [student.pk for student in students]
+        )
+        note_keys = set()
+        personal_notes = []
+        for __ in range(scale.personal_notes):
+            lesson_period = random.choice(lesson_periods)
+            person = random.choice(students_by_class[class_of_lesson_period[lesson_period.pk]])
+            week = random.choice(weeks)
+            note_key = (person.pk, lesson_period.pk, week.year, week.week)
+            if note_key in note_keys:
+                continue
+            note_keys.add(note_key)
+
+            absent = random.random() < 0.6
+            excuse_type = (
+                random.choice(excuse_types)
+                if absent and excuse_types and random.random() < 0.2
+                else None
+            )
+            personal_notes.append(
+                PersonalNote(
+                    person=person,
+                    groups_of_person_snapshot=snapshots.get(person.pk),
+                    lesson_period=lesson_period,
+                    year=week.year,
+                    week=week.week,
+                    absent=absent,
+                    excused=absent and (bool(excuse_type) or random.random() < 0.5),
+                    excuse_type=excuse_type,
+                    late=0 if absent else random.choice([0, 5, 10, 15]),
+                    remarks="" if random.random() < 0.9 else "Synthetic remark",
+                )
+            )
+        PersonalNote.objects.bulk_create(personal_notes, batch_size=BULK_CREATE_BATCH_SIZE)
+        PersonalNote.objects.filter(lesson_period__lesson__validity=validity).update_date_range()
+
+        rebuild_occurrences(school_term)
+        rebuild_statistics(school_term)
+
+    return SyntheticSchool(
+        school_term=school_term,
+        grades=grades,
+        classes=classes,
+        students=students,
+        teachers=teachers,
+        lesson_periods=lesson_periods,
+        events=events,
+        extra_lessons=extra_lessons,
+    )
+
+
+def create_benchmark_user(school: SyntheticSchool) -> User:
+    """Create a superuser with a person who owns the first class of a synthetic school."""
+    user = get_user_model().objects.create_superuser(
+        username=f"alsijil-benchmark-{school.school_term.pk}", email="", password=None
+    )
+    person = Person.objects.create(user=user, first_name="Benchmark", last_name="Synthetic")
+    school.classes[0].owners.add(person)
+    return user
+
+
+def get_view_urls(school: SyntheticSchool) -> Dict[str, str]:
+    """Get the URLs to check for all URL names which can be built from a synthetic school."""
+    school_term = school.school_term
+    week = CalendarWeek.from_date(school_term.date_start)
+    school_class = school.classes[0]
+    student = school_class.members.first()
+    lesson_period = school.lesson_periods[0]
+
+    urls_by_name = {
+        "lesson_period": reverse("lesson_period", args=[week.year, week.week, lesson_period.pk]),
+        "week_view": reverse("week_view", args=["group", school_class.pk]),
+        "week_view_by_week": reverse(
+            "week_view_by_week", args=[week.year, week.week, "group", school_class.pk]
+        ),
+        "week_view_placeholders": reverse(
+            "week_view_placeholders", args=["group", school_class.pk]
+        ),
+        "full_register_group": reverse("full_register_group", args=[school_class.pk]),
+        "my_groups": reverse("my_groups"),
+        "my_students": reverse("my_students"),
+        "students_list": reverse("students_list", args=[school_class.pk]),
+        "overview_person": reverse("overview_person", args=[student.pk]),
+        "overview_me": reverse("overview_me"),
+        "register_absence": reverse("register_absence", args=[student.pk]),
+        "full_registers_school_term": reverse("full_registers_school_term"),
+        "extra_marks": reverse("extra_marks"),
+        "excuse_types": reverse("excuse_types"),
+        "group_roles": reverse("group_roles"),
+        "create_extra_mark": reverse("create_extra_mark"),
+        "create_excuse_type": reverse("create_excuse_type"),
+        "create_group_role": reverse("create_group_role"),
+        "assigned_group_roles": reverse("assigned_group_roles", args=[school_class.pk]),
+        "assign_group_role": reverse("assign_group_role", args=[school_class.pk]),
+        "assign_group_role_multiple": reverse("assign_group_role_multiple"),
+        "all_register_objects": reverse("all_register_objects")
+        + f"?school_term={school_term.pk}&date_start={school_term.date_start}"
+        f"&date_end={school_term.date_end}",
+        "missing_documentations": reverse("missing_documentations")
+        + f"?school_term={school_term.pk}",
+    }
+    if school.events:
+        urls_by_name["event"] = reverse("event", args=[school.events[0].pk])
+    if school.extra_lessons:
+        urls_by_name["extra_lesson"] = reverse("extra_lesson", args=[school.extra_lessons[0].pk])
+    personal_note = PersonalNote.objects.filter(person=student).first()
+    if personal_note:
+        urls_by_name["delete_personal_note"] = reverse(
+            "delete_personal_note", args=[personal_note.pk]
+        )
+    return urls_by_name
+
+
+def create_management_view_urls(school: SyntheticSchool) -> Dict[str, str]:
+    """Create extra marks, excuse types and group roles and get the URLs to manage them.
+
+    The objects should be created after the other views have been requested, because
+    the registry caches are bypassed for changes which are not yet committed.
+    """
+    extra_mark = ExtraMark.objects.create(short_name="SYN", name="Synthetic extra mark")
+    excuse_type = ExcuseType.objects.create(short_name="SYN", name="Synthetic excuse type")
+    group_role = GroupRole.objects.create(name="Synthetic group role")
+    assignment = GroupRoleAssignment.objects.create(
+        role=group_role,
+        person=school.classes[0].members.first(),
+        date_start=school.school_term.date_start,
+    )
+    assignment.groups.add(school.classes[0])
+
+    return {
+        "edit_extra_mark": reverse("edit_extra_mark", args=[extra_mark.pk]),
+        "delete_extra_mark": reverse("delete_extra_mark", args=[extra_mark.pk]),
+        "edit_excuse_type": reverse("edit_excuse_type", args=[excuse_type.pk]),
+        "delete_excuse_type": reverse("delete_excuse_type", args=[excuse_type.pk]),
+        "edit_group_role": reverse("edit_group_role", args=[group_role.pk]),
+        "delete_group_role": reverse("delete_group_role", args=[group_role.pk]),
+        "edit_group_role_assignment": reverse("edit_group_role_assignment", args=[assignment.pk]),
+        "delete_group_role_assignment": reverse(
+            "delete_group_role_assignment", args=[assignment.pk]
+        ),
+    }
@@ -1,18 +1,31 @@
 from contextlib import nullcontext
-from copy import deepcopy
-from datetime import date, datetime, timedelta
-from typing import Any, Dict, Optional
+from copy import copy
+from datetime import datetime
+from hmac import compare_digest
+from typing import Any, Dict, List, Optional
 
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count, Exists, FilteredRelation, OuterRef, Prefetch, Q, Sum
+from django.core.files.base import ContentFile
+from django.db.models import (
+    Count,
+    Exists,
+    FilteredRelation,
+    OuterRef,
+    Prefetch,
+    Q,
+    QuerySet,
+    Sum,
+    prefetch_related_objects,
+)
 from django.db.models.expressions import Case, When
-from django.db.models.functions import Extract
 from django.http import Http404, HttpRequest, HttpResponse, HttpResponseNotFound
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.translation import get_language
 from django.utils.translation import ugettext as _
 from django.views import View
 from django.views.decorators.cache import never_cache
@@ -36,8 +49,9 @@ from aleksis.core.mixins import (
     AdvancedEditView,
     SuccessNextMixin,
 )
-from aleksis.core.models import Group, Person, SchoolTerm
+from aleksis.core.models import Group, PDFFile, Person, SchoolTerm
 from aleksis.core.util import messages
+from aleksis.core.util.celery_progress import render_progress_page
 from aleksis.core.util.core_helpers import get_site_preferences, objectgetter_optional
 from aleksis.core.util.pdf import render_pdf
 from aleksis.core.util.predicates import check_global_permission
@@ -48,9 +62,11 @@ from .forms import (
     ExcuseTypeForm,
     ExtraMarkForm,
     FilterRegisterObjectForm,
+    FullRegistersExportForm,
     GroupRoleAssignmentEditForm,
     GroupRoleForm,
     LessonDocumentationForm,
+    MissingDocumentationsFilterForm,
     PersonalNoteFormSet,
     PersonOverviewForm,
     RegisterAbsenceForm,
@@ -62,26 +78,38 @@ from .models import (
     ExtraMark,
     GroupRole,
     GroupRoleAssignment,
-    LessonDocumentation,
     PersonalNote,
 )
 from .tables import (
     ExcuseTypeTable,
     ExtraMarkTable,
+    GroupMissingDocumentationTable,
     GroupRoleTable,
     PersonalNoteTable,
     RegisterObjectSelectTable,
     RegisterObjectTable,
+    TeacherMissingDocumentationTable,
 )
+from .tasks import generate_full_registers
 from .util.alsijil_helpers import (
     annotate_documentations,
+    annotate_subject,
     generate_list_of_all_register_objects,
     get_register_object_by_pk,
     get_timetable_instance_by_pk,
     register_objects_sorter,
 )
+from .util.full_register import get_full_register_context
+from .util.instrumentation import get_active_sinks, memory_sink, render_prometheus, span
+from .util.missing_documentations import MissingDocumentationReport
+from .util.permission_matrix import get_permission_matrix
+from .util.query_budget import query_budget
+from .util.registries import get_all_excuse_types, get_all_extra_marks
+from .util.statistics import get_statistics_by_school_term
 
 
+@query_budget(80)
+@span("register_object")
 @permission_required("alsijil.view_register_object_rule", fn=get_register_object_by_pk)  # FIXME
 def register_object(
     request: HttpRequest,
@@ -177,6 +205,12 @@ def register_object(
     context["prev_lesson"] = (
         register_object.prev if isinstance(register_object, LessonPeriod) else None
     )
+    if context["prev_lesson"]:
+        context["prev_lesson_personal_note_permissions"] = get_permission_matrix(
+            request.user,
+            "alsijil.view_personalnote_rule",
+            context["prev_lesson"].get_personal_note_summary()["notes"],
+        )
     context["next_lesson"] = (
         register_object.next if isinstance(register_object, LessonPeriod) else None
     )
@@ -203,9 +237,10 @@ def register_object(
         # because the object permissions are checked for all groups of the register object
         # That has to be set as an attribute of the register object,
         # so that the permission system can use the prefetched data.
-        checker = ObjectPermissionChecker(request.user)
-        checker.prefetch_perms(register_object.get_groups().all())
-        register_object.set_object_permission_checker(checker)
+        with span("permission_prefetch"):
+            checker = ObjectPermissionChecker(request.user)
+            checker.prefetch_perms(register_object.get_groups().all())
+            register_object.set_object_permission_checker(checker)
 
         # Create a formset that holds all personal notes for all persons in this lesson
         if not request.user.has_perm(
@@ -215,26 +250,37 @@ def register_object(
         else:
             persons = Person.objects.all()
 
-        persons_qs = register_object.get_personal_notes(persons, wanted_week)
+        @span("personal_notes")
+        def get_personal_notes() -> List[PersonalNote]:
+            # In sparse mode, empty personal notes are not saved to the database
+            if get_site_preferences()["alsijil__sparse_personal_notes"]:
+                personal_notes = register_object.get_personal_notes_sparse(persons, wanted_week)
+            else:
+                personal_notes = list(register_object.get_personal_notes(persons, wanted_week))
 
-        # Annotate group roles
-        if show_group_roles:
-            persons_qs = persons_qs.prefetch_related(
-                Prefetch(
-                    "person__group_roles",
-                    queryset=GroupRoleAssignment.objects.on_day(date_of_lesson).for_groups(groups),
-                ),
-            )
+            # Annotate group roles
+            if show_group_roles:
+                prefetch_related_objects(
+                    personal_notes,
+                    Prefetch(
+                        "person__group_roles",
+                        queryset=GroupRoleAssignment.objects.on_day(date_of_lesson).for_groups(
+                            groups
+                        ),
+                    ),
+                )
+            return personal_notes
 
-        personal_note_formset = PersonalNoteFormSet(
-            request.POST or None, queryset=persons_qs, prefix="personal_notes"
-        )
+        with span("formset"):
+            personal_note_formset = PersonalNoteFormSet(
+                request.POST or None, personal_notes=get_personal_notes(), prefix="personal_notes"
+            )
 
         if request.method == "POST":
             if lesson_documentation_form.is_valid() and request.user.has_perm(
                 "alsijil.edit_lessondocumentation_rule", register_object
             ):
-                with reversion.create_revision():
+                with span("save_lesson_documentation"), reversion.create_revision():
                     reversion.set_user(request.user)
                     lesson_documentation_form.save()
 
@@ -252,32 +298,29 @@ def register_object(
                 if personal_note_formset.is_valid() and request.user.has_perm(
                     "alsijil.edit_register_object_personalnote_rule", register_object
                 ):
-                    with reversion.create_revision():
+                    with span("save_personal_notes"), reversion.create_revision():
                         reversion.set_user(request.user)
-                        instances = personal_note_formset.save()
+                        personal_note_formset.save()
 
                     if (not isinstance(register_object, Event)) and get_site_preferences()[
                         "alsijil__carry_over_personal_notes"
                     ]:
-                        # Iterate over personal notes
-                        # and carry changed absences to following lessons
-                        with reversion.create_revision():
+                        # Carry over changed absences to following lessons
+                        changed_notes = [
+                            note
+                            for note, changed_data in personal_note_formset.changed_objects
+                            if {"absent", "excused", "excuse_type"}.intersection(changed_data)
+                        ]
+                        with span("carry_over"), reversion.create_revision():
                             reversion.set_user(request.user)
-                            for instance in instances:
-                                instance.person.mark_absent(
-                                    wanted_week[register_object.period.weekday],
-                                    register_object.period.period + 1,
-                                    instance.absent,
-                                    instance.excused,
-                                    instance.excuse_type,
-                                )
+                            register_object.carry_over_personal_notes(changed_notes, wanted_week)
 
                 messages.success(request, _("The personal notes have been saved."))
 
                 # Regenerate form here to ensure that programmatically
                 # changed data will be shown correctly
                 personal_note_formset = PersonalNoteFormSet(
-                    None, queryset=persons_qs, prefix="personal_notes"
+                    None, personal_notes=get_personal_notes(), prefix="personal_notes"
                 )
 
         back_url = request.GET.get("back", "")
@@ -300,9 +343,12 @@ def register_object(
         context["lesson_documentation_form"] = lesson_documentation_form
         context["personal_note_formset"] = personal_note_formset
 
-    return render(request, "alsijil/class_register/lesson.html", context)
+    with span("render"):
+        return render(request, "alsijil/class_register/lesson.html", context)
 
 
+@query_budget(70)
+@span("week_view")
 @permission_required("alsijil.view_week_rule", fn=get_timetable_instance_by_pk)
 def week_view(
     request: HttpRequest,
@@ -398,17 +444,19 @@ def week_view(
         context["group_roles"] = group_roles
         group_roles_persons = GroupRoleAssignment.objects.in_week(wanted_week).for_group(group)
 
-    extra_marks = ExtraMark.objects.all()
+    extra_marks = get_all_extra_marks()
 
     if query_exists:
-        lesson_periods_pk = list(lesson_periods.values_list("pk", flat=True))
-        lesson_periods = annotate_documentations(LessonPeriod, wanted_week, lesson_periods_pk)
+        with span("register_objects"):
+            lesson_periods_pk = list(lesson_periods.values_list("pk", flat=True))
+            lesson_periods = annotate_documentations(LessonPeriod, wanted_week, lesson_periods_pk)
+
+            events_pk = [event.pk for event in events]
+            events = annotate_documentations(Event, wanted_week, events_pk)
 
-        events_pk = [event.pk for event in events]
-        events = annotate_documentations(Event, wanted_week, events_pk)
+            extra_lessons_pk = list(extra_lessons.values_list("pk", flat=True))
+            extra_lessons = annotate_documentations(ExtraLesson, wanted_week, extra_lessons_pk)
 
-        extra_lessons_pk = list(extra_lessons.values_list("pk", flat=True))
-        extra_lessons = annotate_documentations(ExtraLesson, wanted_week, extra_lessons_pk)
         groups = Group.objects.filter(
             Q(lessons__lesson_periods__in=lesson_periods_pk)
             | Q(events__in=events_pk)
@@ -430,14 +478,10 @@ def week_view(
         else:
             persons_qs = persons_qs.filter(member_of__in=groups)
 
-        # Prefetch object permissions for persons and groups the persons are members of
-        # because the object permissions are checked for both persons and groups
-        checker = ObjectPermissionChecker(request.user)
-        checker.prefetch_perms(persons_qs.prefetch_related(None))
-        checker.prefetch_perms(groups)
-
-        prefetched_personal_notes = list(
-            PersonalNote.objects.filter(  #
+        # Index all personal notes with remarks by person in one pass
+        personal_notes_by_person = {}
+        for note in (
+            PersonalNote.objects.filter(
                 Q(event__in=events_pk)
                 | Q(
                     week=wanted_week.week,
@@ -445,8 +489,16 @@ def week_view(
                     lesson_period__in=lesson_periods_pk,
                 )
                 | Q(extra_lesson__in=extra_lessons_pk)
-            ).filter(~Q(remarks=""))
-        )
+            )
+            .filter(~Q(remarks=""))
+            .select_related("extra_lesson__period")
+            .prefetch_related(None)
+            .prefetch_related("lesson_period__substitutions__subject")
+        ):
+            if note.lesson_period:
+                note.lesson_period.annotate_week(wanted_week)
+            annotate_subject(note.register_object)
+            personal_notes_by_person.setdefault(note.person_id, []).append(note)
         persons_qs = (
             persons_qs.select_related("primary_group")
             .prefetch_related(
@@ -499,20 +551,28 @@ def week_view(
                 }
             )
 
-        persons = []
-        for person in persons_qs:
-            personal_notes = []
-            for note in filter(lambda note: note.person_id == person.pk, prefetched_personal_notes):
-                if note.lesson_period:
-                    note.lesson_period.annotate_week(wanted_week)
-                personal_notes.append(note)
-            person.set_object_permission_checker(checker)
-            person_dict = {"person": person, "personal_notes": personal_notes}
-            if show_group_roles:
-                person_dict["group_roles"] = filter(
-                    lambda role: role.person_id == person.pk, group_roles_persons
-                )
-            persons.append(person_dict)
+        if show_group_roles:
+            group_roles_by_person = {}
+            for assignment in group_roles_persons.select_related("role"):
+                group_roles_by_person.setdefault(assignment.person_id, []).append(assignment)
+
+        with span("persons"):
+            persons = []
+            for person in persons_qs:
+                person_dict = {
+                    "person": person,
+                    "personal_notes": personal_notes_by_person.get(person.pk, []),
+                }
+                if show_group_roles:
+                    person_dict["group_roles"] = group_roles_by_person.get(person.pk, [])
+                persons.append(person_dict)
+
+        with span("permission_prefetch"):
+            context["register_absence_permissions"] = get_permission_matrix(
+                request.user,
+                "alsijil.register_absence_rule",
+                [person_dict["person"] for person_dict in persons],
+            )
     else:
         persons = None
 
@@ -533,6 +593,7 @@ def week_view(
     regrouped_objects = {}
 
     for register_object in list(lesson_periods) + list(extra_lessons):
+        annotate_subject(register_object)
         register_object.weekday = register_object.period.weekday
         regrouped_objects.setdefault(register_object.period.weekday, [])
         regrouped_objects[register_object.period.weekday].append(register_object)
@@ -543,7 +604,7 @@ def week_view(
 
         for weekday in range(weekday_from, weekday_to + 1):
             # Make a copy in order to keep the annotation only on this weekday
-            event_copy = deepcopy(event)
+            event_copy = copy(event)
             event_copy.annotate_day(wanted_week[weekday])
             event_copy.weekday = weekday
 
@@ -556,6 +617,14 @@ def week_view(
         regrouped_objects[weekday] = sorted(to_sort, key=register_objects_sorter)
     context["regrouped_objects"] = regrouped_objects
 
+    if query_exists:
+        with span("permission_prefetch"):
+            context["lesson_documentation_permissions"] = get_permission_matrix(
+                request.user,
+                "alsijil.view_lessondocumentation_rule",
+                list(lesson_periods) + list(events) + list(extra_lessons),
+            )
+
     week_prev = wanted_week - 1
     week_next = wanted_week + 1
     args_prev = [week_prev.year, week_prev.week]
@@ -574,134 +643,65 @@ def week_view(
     context["url_prev"] = reverse("week_view_by_week", args=args_prev)
     context["url_next"] = reverse("week_view_by_week", args=args_next)
 
-    return render(request, "alsijil/class_register/week_view.html", context)
+    with span("render"):
+        return render(request, "alsijil/class_register/week_view.html", context)
 
 
+@query_budget(90)
 @permission_required(
     "alsijil.view_full_register_rule", fn=objectgetter_optional(Group, None, False)
 )
 def full_register_group(request: HttpRequest, id_: int) -> HttpResponse:
-    context = {}
-
     group = get_object_or_404(Group, pk=id_)
-    groups_q = (
-        Q(lesson_period__lesson__groups=group)
-        | Q(lesson_period__lesson__groups__parent_groups=group)
-        | Q(extra_lesson__groups=group)
-        | Q(extra_lesson__groups__parent_groups=group)
-        | Q(event__groups=group)
-        | Q(event__groups__parent_groups=group)
-    )
-    personal_notes = (
-        PersonalNote.objects.select_related("lesson_period")
-        .prefetch_related(
-            "lesson_period__substitutions", "lesson_period__lesson__teachers", "groups_of_person"
-        )
-        .not_empty()
-        .filter(groups_q)
-    )
-    documentations = (
-        LessonDocumentation.objects.select_related("lesson_period").not_empty().filter(groups_q)
-    )
+    context = get_full_register_context(group)
+    return render_pdf(request, "alsijil/print/full_register.html", context)
 
-    # Get all lesson periods for the selected group
-    lesson_periods = LessonPeriod.objects.filter_group(group).distinct()
-    events = Event.objects.filter_group(group).distinct()
-    extra_lessons = ExtraLesson.objects.filter_group(group).distinct()
-    weeks = CalendarWeek.weeks_within(group.school_term.date_start, group.school_term.date_end)
-
-    register_objects_by_day = {}
-    for extra_lesson in extra_lessons:
-        day = extra_lesson.date
-        register_objects_by_day.setdefault(day, []).append(
-            (
-                extra_lesson,
-                list(filter(lambda d: d.extra_lesson == extra_lesson, documentations)),
-                list(filter(lambda d: d.extra_lesson == extra_lesson, personal_notes)),
-                None,
-            )
-        )
 
-    for event in events:
-        day_number = (event.date_end - event.date_start).days + 1
-        for i in range(day_number):
-            day = event.date_start + timedelta(days=i)
-            event_copy = deepcopy(event)
-            event_copy.annotate_day(day)
-            register_objects_by_day.setdefault(day, []).append(
-                (
-                    event_copy,
-                    list(filter(lambda d: d.event == event, documentations)),
-                    list(filter(lambda d: d.event == event, personal_notes)),
-                    None,
-                )
-            )
+@query_budget(15)
+@permission_required("alsijil.view_full_registers_rule")
+def full_registers_school_term(request: HttpRequest) -> HttpResponse:
+    """Generate the full registers of multiple groups of a school term in the background."""
+    context = {}
 
-    weeks = CalendarWeek.weeks_within(group.school_term.date_start, group.school_term.date_end,)
+    form = FullRegistersExportForm(request.POST or None)
+    if request.method == "POST" and form.is_valid():
+        school_term = form.cleaned_data["school_term"]
+        groups = form.cleaned_data["groups"] or Group.objects.filter(school_term=school_term)
 
-    for lesson_period in lesson_periods:
-        for week in weeks:
-            day = week[lesson_period.period.weekday]
+        # The source of the ZIP file is an index of the contained full registers
+        index = render_to_string(
+            "alsijil/print/full_registers_index.html",
+            {"school_term": school_term, "groups": groups},
+            request,
+        )
+        file_object = PDFFile.objects.create(
+            person=request.user.person, html_file=ContentFile(index, name="source.html")
+        )
+        result = generate_full_registers.delay(
+            file_object.pk, school_term.pk, [group.pk for group in groups], lang=get_language()
+        )
 
-            if (
-                lesson_period.lesson.validity.date_start
-                <= day
-                <= lesson_period.lesson.validity.date_end
-            ):
-                filtered_documentations = list(
-                    filter(
-                        lambda d: d.week == week.week
-                        and d.year == week.year
-                        and d.lesson_period == lesson_period,
-                        documentations,
-                    )
-                )
-                filtered_personal_notes = list(
-                    filter(
-                        lambda d: d.week == week.week
-                        and d.year == week.year
-                        and d.lesson_period == lesson_period,
-                        personal_notes,
-                    )
-                )
-                substitution = lesson_period.get_substitution(week)
+        redirect_url = reverse("redirect_to_pdf_file", args=[file_object.pk])
+        return render_progress_page(
+            request,
+            result,
+            title=_("Progress: Generate full registers"),
+            progress_title=_("Generating full registers …"),
+            success_message=_("The full registers have been generated successfully."),
+            error_message=_("There was a problem while generating the full registers."),
+            redirect_on_success_url=redirect_url,
+            back_url=reverse("full_registers_school_term"),
+            button_title=_("Download ZIP file"),
+            button_url=redirect_url,
+            button_icon="archive",
+        )
 
-                register_objects_by_day.setdefault(day, []).append(
-                    (lesson_period, filtered_documentations, filtered_personal_notes, substitution)
-                )
+    context["form"] = form
 
-    persons = group.members.prefetch_related(None).select_related(None)
-    persons = group.generate_person_list_with_class_register_statistics(persons)
-
-    prefetched_persons = []
-    for person in persons:
-        person.filtered_notes = list(filter(lambda d: d.person == person, personal_notes))
-        prefetched_persons.append(person)
-
-    context["school_term"] = group.school_term
-    context["persons"] = prefetched_persons
-    context["excuse_types"] = ExcuseType.objects.all()
-    context["extra_marks"] = ExtraMark.objects.all()
-    context["group"] = group
-    context["weeks"] = weeks
-    context["register_objects_by_day"] = register_objects_by_day
-    context["register_objects"] = list(lesson_periods) + list(events) + list(extra_lessons)
-    context["today"] = date.today()
-    context["lessons"] = (
-        group.lessons.all()
-        .select_related("validity", "subject")
-        .prefetch_related("teachers", "lesson_periods")
-    )
-    context["child_groups"] = group.child_groups.all().prefetch_related(
-        "lessons",
-        "lessons__validity",
-        "lessons__subject",
-        "lessons__teachers",
-        "lessons__lesson_periods",
-    )
-    return render_pdf(request, "alsijil/print/full_register.html", context)
+    return render(request, "alsijil/print/full_registers.html", context)
 
 
+@query_budget(15)
 @permission_required("alsijil.view_my_students_rule")
 def my_students(request: HttpRequest) -> HttpResponse:
     context = {}
@@ -714,13 +714,6 @@ def my_students(request: HttpRequest) -> HttpResponse:
         .distinct()
     )
 
-    # Prefetch object permissions for persons and groups the persons are members of
-    # because the object permissions are checked for both persons and groups
-    all_persons = Person.objects.filter(member_of__in=relevant_groups)
-    checker = ObjectPermissionChecker(request.user)
-    checker.prefetch_perms(relevant_groups)
-    checker.prefetch_perms(all_persons)
-
     new_groups = []
     for group in relevant_groups:
         persons = group.generate_person_list_with_class_register_statistics(
@@ -729,18 +722,22 @@ def my_students(request: HttpRequest) -> HttpResponse:
                 Prefetch("member_of", queryset=relevant_groups, to_attr="member_of_prefetched"),
             )
         )
-        persons_for_group = []
-        for person in persons:
-            person.set_object_permission_checker(checker)
-            persons_for_group.append(person)
-        new_groups.append((group, persons_for_group))
+        new_groups.append((group, list(persons)))
+
+    # Check the permissions for all persons of all groups at once
+    context["register_absence_permissions"] = get_permission_matrix(
+        request.user,
+        "alsijil.register_absence_rule",
+        [person for group, persons in new_groups for person in persons],
+    )
 
     context["groups"] = new_groups
-    context["excuse_types"] = ExcuseType.objects.all()
-    context["extra_marks"] = ExtraMark.objects.all()
+    context["excuse_types"] = get_all_excuse_types()
+    context["extra_marks"] = get_all_extra_marks()
     return render(request, "alsijil/class_register/persons.html", context)
 
 
+@query_budget(15)
 @permission_required("alsijil.view_my_groups_rule",)
 def my_groups(request: HttpRequest) -> HttpResponse:
     context = {}
@@ -750,6 +747,7 @@ def my_groups(request: HttpRequest) -> HttpResponse:
     return render(request, "alsijil/class_register/groups.html", context)
 
 
+@query_budget(20)
 class StudentsList(PermissionRequiredMixin, DetailView):
     model = Group
     template_name = "alsijil/class_register/students_list.html"
@@ -758,12 +756,17 @@ class StudentsList(PermissionRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["group"] = self.object
-        context["persons"] = self.object.generate_person_list_with_class_register_statistics()
-        context["extra_marks"] = ExtraMark.objects.all()
-        context["excuse_types"] = ExcuseType.objects.all()
+        context["persons"] = list(self.object.generate_person_list_with_class_register_statistics())
+        context["register_absence_permissions"] = get_permission_matrix(
+            self.request.user, "alsijil.register_absence_rule", context["persons"]
+        )
+        context["extra_marks"] = get_all_extra_marks()
+        context["excuse_types"] = get_all_excuse_types()
         return context
 
 
+@query_budget(55)
+@span("overview_person")
 @permission_required(
     "alsijil.view_person_overview_rule",
     fn=objectgetter_optional(
@@ -793,9 +796,10 @@ def overview_person(request: HttpRequest, id_: Optional[int] = None) -> HttpResp
     # because the object permissions are checked for all groups the person is a member of
     # That has to be set as an attribute of the register object,
     # so that the permission system can use the prefetched data.
-    checker = ObjectPermissionChecker(request.user)
-    checker.prefetch_perms(Group.objects.filter(members=person))
-    person.set_object_permission_checker(checker)
+    with span("permission_prefetch"):
+        checker = ObjectPermissionChecker(request.user)
+        checker.prefetch_perms(Group.objects.filter(members=person))
+        person.set_object_permission_checker(checker)
 
     if request.user.has_perm("alsijil.view_person_overview_personalnote_rule", person):
         allowed_personal_notes = person_personal_notes.all()
@@ -821,21 +825,6 @@ def overview_person(request: HttpRequest, id_: Optional[int] = None) -> HttpResp
                     then="lesson_period__lesson__validity__school_term__date_start",
                 ),
             ),
-            order_year=Case(
-                When(event__isnull=False, then=Extract("event__date_start", "year")),
-                When(extra_lesson__isnull=False, then="extra_lesson__year"),
-                When(lesson_period__isnull=False, then="year"),
-            ),
-            order_week=Case(
-                When(event__isnull=False, then=Extract("event__date_start", "week")),
-                When(extra_lesson__isnull=False, then="extra_lesson__week"),
-                When(lesson_period__isnull=False, then="week"),
-            ),
-            order_weekday=Case(
-                When(event__isnull=False, then="event__period_from__weekday"),
-                When(extra_lesson__isnull=False, then="extra_lesson__period__weekday"),
-                When(lesson_period__isnull=False, then="lesson_period__period__weekday"),
-            ),
             order_period=Case(
                 When(event__isnull=False, then="event__period_from__period"),
                 When(extra_lesson__isnull=False, then="extra_lesson__period__period"),
@@ -852,9 +841,7 @@ def overview_person(request: HttpRequest, id_: Optional[int] = None) -> HttpResp
                 When(lesson_period__isnull=False, then="lesson_period__lesson__teachers"),
             ),
         )
-        .order_by(
-            "-school_term_start", "-order_year", "-order_week", "-order_weekday", "order_period",
-        )
+        .order_by("-school_term_start", "-date_start", "order_period",)
         .annotate_date_range()
         .annotate_subject()
     )
@@ -868,12 +855,13 @@ def overview_person(request: HttpRequest, id_: Optional[int] = None) -> HttpResp
         len(used_filters) - used_filters.count("") - used_filters.count("unknown")
     )
 
-    personal_notes_list = []
-    for note in personal_notes:
-        note.set_object_permission_checker(checker)
-        personal_notes_list.append(note)
-    context["personal_notes"] = personal_notes_list
-    context["excuse_types"] = ExcuseType.objects.all()
+    with span("personal_notes"):
+        personal_notes_list = []
+        for note in personal_notes:
+            note.set_object_permission_checker(checker)
+            personal_notes_list.append(note)
+        context["personal_notes"] = personal_notes_list
+    context["excuse_types"] = get_all_excuse_types()
 
     form = PersonOverviewForm(request, request.POST or None, queryset=allowed_personal_notes)
     if request.method == "POST":
@@ -888,54 +876,13 @@ def overview_person(request: HttpRequest, id_: Optional[int] = None) -> HttpResp
     RequestConfig(request, paginate={"per_page": 20}).configure(table)
     context["personal_notes_table"] = table
 
-    extra_marks = ExtraMark.objects.all()
-    excuse_types = ExcuseType.objects.all()
+    extra_marks = get_all_extra_marks()
+    excuse_types = get_all_excuse_types()
     if request.user.has_perm("alsijil.view_person_statistics_personalnote_rule", person):
-        school_terms = SchoolTerm.objects.all().order_by("-date_start")
-        stats = []
-        for school_term in school_terms:
-            stat = {}
-            personal_notes = PersonalNote.objects.filter(person=person,).filter(
-                Q(lesson_period__lesson__validity__school_term=school_term)
-                | Q(extra_lesson__school_term=school_term)
-                | Q(event__school_term=school_term)
-            )
-
-            if not personal_notes.exists():
-                continue
-
-            stat.update(
-                personal_notes.filter(absent=True).aggregate(absences_count=Count("absent"))
-            )
-            stat.update(
-                personal_notes.filter(
-                    absent=True, excused=True, excuse_type__isnull=True
-                ).aggregate(excused=Count("absent"))
-            )
-            stat.update(
-                personal_notes.filter(absent=True, excused=False).aggregate(
-                    unexcused=Count("absent")
-                )
+        with span("statistics"):
+            context["stats"] = get_statistics_by_school_term(
+                PersonalNote.objects.filter(person=person), extra_marks, excuse_types
             )
-            stat.update(personal_notes.aggregate(tardiness=Sum("late")))
-            stat.update(personal_notes.filter(~Q(late=0)).aggregate(tardiness_count=Count("late")))
-
-            for extra_mark in extra_marks:
-                stat.update(
-                    personal_notes.filter(extra_marks=extra_mark).aggregate(
-                        **{extra_mark.count_label: Count("pk")}
-                    )
-                )
-
-            for excuse_type in excuse_types:
-                stat.update(
-                    personal_notes.filter(absent=True, excuse_type=excuse_type).aggregate(
-                        **{excuse_type.count_label: Count("absent")}
-                    )
-                )
-
-            stats.append((school_term, stat))
-        context["stats"] = stats
 
     context["excuse_types"] = excuse_types
     context["extra_marks"] = extra_marks
@@ -958,16 +905,20 @@ def overview_person(request: HttpRequest, id_: Optional[int] = None) -> HttpResp
     context["filter_form"] = filter_form
 
     if request.user.person.is_teacher:
-        register_objects = generate_list_of_all_register_objects(filter_dict)
-        table = RegisterObjectTable(register_objects)
-        items_per_page = request.user.person.preferences[
-            "alsijil__register_objects_table_items_per_page"
-        ]
-        RequestConfig(request, paginate={"per_page": items_per_page}).configure(table)
-        context["register_object_table"] = table
-    return render(request, "alsijil/class_register/person.html", context)
+        with span("register_objects"):
+            register_objects = generate_list_of_all_register_objects(filter_dict)
+            table = RegisterObjectTable(register_objects)
+            items_per_page = request.user.person.preferences[
+                "alsijil__register_objects_table_items_per_page"
+            ]
+            RequestConfig(request, paginate={"per_page": items_per_page}).configure(table)
+            context["register_object_table"] = table
 
+    with span("render"):
+        return render(request, "alsijil/class_register/person.html", context)
 
+
+@query_budget(15)
 @never_cache
 @permission_required("alsijil.register_absence_rule", fn=objectgetter_optional(Person))
 def register_absence(request: HttpRequest, id_: int) -> HttpResponse:
@@ -992,30 +943,20 @@ def register_absence(request: HttpRequest, id_: int) -> HttpResponse:
         remarks = register_absence_form.cleaned_data["remarks"]
 
         # Mark person as absent
-        affected_count = 0
-        delta = end_date - start_date
-        for i in range(delta.days + 1):
-            from_period_on_day = from_period if i == 0 else TimePeriod.period_min
-            to_period_on_day = to_period if i == delta.days else TimePeriod.period_max
-            day = start_date + timedelta(days=i)
-
-            # Skip holidays if activated
-            if not get_site_preferences()["alsijil__allow_entries_in_holidays"]:
-                holiday = Holiday.on_day(day)
-                if holiday:
-                    continue
-
-            with reversion.create_revision() if confirmed else nullcontext():
-                affected_count += person.mark_absent(
-                    day,
-                    from_period_on_day,
-                    absent,
-                    excused,
-                    excuse_type,
-                    remarks,
-                    to_period_on_day,
-                    dry_run=not confirmed,
-                )
+        with reversion.create_revision() if confirmed else nullcontext():
+            if confirmed:
+                reversion.set_user(request.user)
+            affected_count = person.mark_absent_range(
+                start_date,
+                end_date,
+                int(from_period),
+                int(to_period),
+                absent,
+                excused,
+                excuse_type,
+                remarks,
+                dry_run=not confirmed,
+            )
 
         if not confirmed:
             # Show confirmation page
@@ -1035,6 +976,7 @@ def register_absence(request: HttpRequest, id_: int) -> HttpResponse:
     return render(request, "alsijil/absences/register.html", context)
 
 
+@query_budget(20)
 @method_decorator(never_cache, name="dispatch")
 class DeletePersonalNoteView(PermissionRequiredMixin, DetailView):
     model = PersonalNote
@@ -1051,6 +993,7 @@ class DeletePersonalNoteView(PermissionRequiredMixin, DetailView):
         return redirect("overview_person", note.person.pk)
 
 
+@query_budget(15)
 class ExtraMarkListView(PermissionRequiredMixin, SingleTableView):
     """Table of all extra marks."""
 
@@ -1060,6 +1003,7 @@ class ExtraMarkListView(PermissionRequiredMixin, SingleTableView):
     template_name = "alsijil/extra_mark/list.html"
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class ExtraMarkCreateView(PermissionRequiredMixin, AdvancedCreateView):
     """Create view for extra marks."""
@@ -1072,6 +1016,7 @@ class ExtraMarkCreateView(PermissionRequiredMixin, AdvancedCreateView):
     success_message = _("The extra mark has been created.")
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class ExtraMarkEditView(PermissionRequiredMixin, AdvancedEditView):
     """Edit view for extra marks."""
@@ -1084,6 +1029,7 @@ class ExtraMarkEditView(PermissionRequiredMixin, AdvancedEditView):
     success_message = _("The extra mark has been saved.")
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class ExtraMarkDeleteView(PermissionRequiredMixin, RevisionMixin, AdvancedDeleteView):
     """Delete view for extra marks."""
@@ -1095,6 +1041,7 @@ class ExtraMarkDeleteView(PermissionRequiredMixin, RevisionMixin, AdvancedDelete
     success_message = _("The extra mark has been deleted.")
 
 
+@query_budget(15)
 class ExcuseTypeListView(PermissionRequiredMixin, SingleTableView):
     """Table of all excuse types."""
 
@@ -1104,6 +1051,7 @@ class ExcuseTypeListView(PermissionRequiredMixin, SingleTableView):
     template_name = "alsijil/excuse_type/list.html"
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class ExcuseTypeCreateView(PermissionRequiredMixin, AdvancedCreateView):
     """Create view for excuse types."""
@@ -1116,6 +1064,7 @@ class ExcuseTypeCreateView(PermissionRequiredMixin, AdvancedCreateView):
     success_message = _("The excuse type has been created.")
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class ExcuseTypeEditView(PermissionRequiredMixin, AdvancedEditView):
     """Edit view for excuse types."""
@@ -1128,6 +1077,7 @@ class ExcuseTypeEditView(PermissionRequiredMixin, AdvancedEditView):
     success_message = _("The excuse type has been saved.")
 
 
+@query_budget(15)
 @method_decorator(never_cache, "dispatch")
 class ExcuseTypeDeleteView(PermissionRequiredMixin, RevisionMixin, AdvancedDeleteView):
     """Delete view for excuse types."""
@@ -1139,6 +1089,7 @@ class ExcuseTypeDeleteView(PermissionRequiredMixin, RevisionMixin, AdvancedDelet
     success_message = _("The excuse type has been deleted.")
 
 
+@query_budget(15)
 class GroupRoleListView(PermissionRequiredMixin, SingleTableView):
     """Table of all group roles."""
 
@@ -1148,6 +1099,7 @@ class GroupRoleListView(PermissionRequiredMixin, SingleTableView):
     template_name = "alsijil/group_role/list.html"
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class GroupRoleCreateView(PermissionRequiredMixin, AdvancedCreateView):
     """Create view for group roles."""
@@ -1160,6 +1112,7 @@ class GroupRoleCreateView(PermissionRequiredMixin, AdvancedCreateView):
     success_message = _("The group role has been created.")
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class GroupRoleEditView(PermissionRequiredMixin, AdvancedEditView):
     """Edit view for group roles."""
@@ -1172,6 +1125,7 @@ class GroupRoleEditView(PermissionRequiredMixin, AdvancedEditView):
     success_message = _("The group role has been saved.")
 
 
+@query_budget(15)
 @method_decorator(never_cache, "dispatch")
 class GroupRoleDeleteView(PermissionRequiredMixin, RevisionMixin, AdvancedDeleteView):
     """Delete view for group roles."""
@@ -1183,6 +1137,7 @@ class GroupRoleDeleteView(PermissionRequiredMixin, RevisionMixin, AdvancedDelete
     success_message = _("The group role has been deleted.")
 
 
+@query_budget(20)
 class AssignedGroupRolesView(PermissionRequiredMixin, DetailView):
     permission_required = "alsijil.view_assigned_grouproles_rule"
     model = Group
@@ -1207,6 +1162,7 @@ class AssignedGroupRolesView(PermissionRequiredMixin, DetailView):
         return context
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class AssignGroupRoleView(PermissionRequiredMixin, SuccessNextMixin, AdvancedCreateView):
     model = GroupRoleAssignment
@@ -1239,6 +1195,7 @@ class AssignGroupRoleView(PermissionRequiredMixin, SuccessNextMixin, AdvancedCre
         return context
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class AssignGroupRoleMultipleView(PermissionRequiredMixin, SuccessNextMixin, AdvancedCreateView):
     model = GroupRoleAssignment
@@ -1256,6 +1213,7 @@ class AssignGroupRoleMultipleView(PermissionRequiredMixin, SuccessNextMixin, Adv
         return kwargs
 
 
+@query_budget(15)
 @method_decorator(never_cache, name="dispatch")
 class GroupRoleAssignmentEditView(PermissionRequiredMixin, SuccessNextMixin, AdvancedEditView):
     """Edit view for group role assignments."""
@@ -1271,6 +1229,7 @@ class GroupRoleAssignmentEditView(PermissionRequiredMixin, SuccessNextMixin, Adv
         return reverse("assigned_group_roles", args=[pk])
 
 
+@query_budget(20)
 @method_decorator(never_cache, "dispatch")
 class GroupRoleAssignmentStopView(PermissionRequiredMixin, SuccessNextMixin, DetailView):
     model = GroupRoleAssignment
@@ -1289,6 +1248,7 @@ class GroupRoleAssignmentStopView(PermissionRequiredMixin, SuccessNextMixin, Det
         return redirect(self.get_success_url())
 
 
+@query_budget(20)
 @method_decorator(never_cache, "dispatch")
 class GroupRoleAssignmentDeleteView(
     PermissionRequiredMixin, RevisionMixin, SuccessNextMixin, AdvancedDeleteView
@@ -1305,6 +1265,18 @@ class GroupRoleAssignmentDeleteView(
         return reverse("assigned_group_roles", args=[pk])
 
 
+def _get_groups_for_register_objects_list(request: HttpRequest) -> QuerySet:
+    """Get all groups whose register objects the user is allowed to see in lists."""
+    groups = Group.objects.all()
+    if not check_global_permission(request.user, "alsijil.view_full_register"):
+        allowed_groups = get_objects_for_user(
+            request.user, "core.view_full_register_group", Group
+        ).values_list("pk", flat=True)
+        groups = groups.filter(Q(parent_groups__in=allowed_groups) | Q(pk__in=allowed_groups))
+    return groups
+
+
+@query_budget(45)
 class AllRegisterObjectsView(PermissionRequiredMixin, View):
     """Provide overview of all register objects for coordinators."""
 
@@ -1313,12 +1285,7 @@ class AllRegisterObjectsView(PermissionRequiredMixin, View):
     def get_context_data(self, request):
         context = {}
         # Filter selectable groups by permissions
-        groups = Group.objects.all()
-        if not check_global_permission(request.user, "alsijil.view_full_register"):
-            allowed_groups = get_objects_for_user(
-                self.request.user, "core.view_full_register_group", Group
-            ).values_list("pk", flat=True)
-            groups = groups.filter(Q(parent_groups__in=allowed_groups) | Q(pk__in=allowed_groups))
+        groups = _get_groups_for_register_objects_list(request)
 
         # Build filter with own form and logic as django-filter can't work with different models
         filter_form = FilterRegisterObjectForm(
@@ -1351,3 +1318,66 @@ class AllRegisterObjectsView(PermissionRequiredMixin, View):
         if self.action_form.is_valid():
             self.action_form.execute()
         return render(request, "alsijil/class_register/all_objects.html", context)
+
+
+@query_budget(30)
+@permission_required("alsijil.view_register_objects_list_rule")
+def missing_documentations(request: HttpRequest) -> HttpResponse:
+    """Show the numbers of lessons without lesson documentation per teacher and group."""
+    context = {}
+
+    filter_form = MissingDocumentationsFilterForm(request.GET or None)
+    context["filter_form"] = filter_form
+
+    if filter_form.is_valid():
+        school_term = filter_form.cleaned_data["school_term"]
+        date_start = filter_form.cleaned_data["date_start"]
+        date_end = filter_form.cleaned_data["date_end"]
+    else:
+        school_term = SchoolTerm.current
+        date_start = None
+        date_end = None
+    context["school_term"] = school_term
+
+    if school_term:
+        # Lessons in the future can't be documented yet
+        date_end = min(date_end or school_term.date_end, timezone.now().date())
+
+        groups = None
+        if not check_global_permission(request.user, "alsijil.view_full_register"):
+            groups = list(
+                _get_groups_for_register_objects_list(request).values_list("pk", flat=True)
+            )
+
+        items_per_page = request.user.person.preferences[
+            "alsijil__register_objects_table_items_per_page"
+        ]
+        for by, table_class in (
+            ("teacher", TeacherMissingDocumentationTable),
+            ("group", GroupMissingDocumentationTable),
+        ):
+            report = MissingDocumentationReport(by, school_term, date_start, date_end, groups)
+            table = table_class(report, prefix=f"{by}-")
+            RequestConfig(request, paginate={"per_page": items_per_page}).configure(table)
+            context[f"{by}_table"] = table
+
+    return render(request, "alsijil/class_register/missing_documentations.html", context)
+
+
+def instrumentation_metrics(request: HttpRequest) -> HttpResponse:
+    """Expose the instrumentation data in the Prometheus text format.
+
+    Only available if the memory sink is enabled. The data can be fetched by users
+    with the permission to view the system status and with the bearer token
+    configured in the site preferences.
+    """
+    if memory_sink not in get_active_sinks():
+        raise Http404()
+
+    token = get_site_preferences()["alsijil__instrumentation_metrics_token"]
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    if not (
+        token and compare_digest(authorization.encode(), f"Bearer {token}".encode())
+    ) and not request.user.has_perm("alsijil.view_instrumentation_metrics_rule"):
+        raise PermissionDenied()
+    return HttpResponse(render_prometheus(memory_sink), content_type="text/plain; version=0.0.4")